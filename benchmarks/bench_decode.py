@@ -0,0 +1,87 @@
+"""
+Decode cost of one uploaded page: time and peak Python-visible allocation.
+
+Compares the previous path (PIL decode, EXIF transpose, `np.array` copy,
+copied regions and the RGB->BGR flip the OCR engine had to materialize) with
+`PageDecoder` plus region views. Pages are synthetic P.Q.7-like JPEGs
+encoded at common phone and scanner sizes, or the files given with --samples.
+
+Usage:
+    python benchmarks/bench_decode.py
+    python benchmarks/bench_decode.py --samples test_image/
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from dt_receipt_ocr.core import pq7_pipeline
+from dt_receipt_ocr.core.decode import PageDecoder
+from dt_receipt_ocr.core.warmup import synthetic_page
+
+SIZES = [(4032, 3024), (3000, 4000), (1240, 1754)]
+
+
+def previous_path(file_bytes: bytes):
+    img_pil = Image.open(io.BytesIO(file_bytes))
+    ImageOps.exif_transpose(img_pil, in_place=True)
+    img_np = np.array(img_pil)
+    regions = pq7_pipeline._extract_regions_from_image(img_np)
+    return [np.ascontiguousarray(region[..., ::-1].copy()) for region, _ in regions.values()]
+
+
+def decoder_path(decoder: PageDecoder):
+    def run(file_bytes: bytes):
+        img_np = decoder.decode(file_bytes)
+        return [region for region, _ in pq7_pipeline._extract_regions_from_image(img_np).values()]
+
+    return run
+
+
+def measure(func, file_bytes: bytes, repeat: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file_bytes)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(file_bytes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings) * 1000, peak / 1024 / 1024
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, help="directory of JPEG documents")
+    parser.add_argument("--target-side", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.samples:
+        pages = {p.name: p.read_bytes() for p in sorted(args.samples.glob("*.jp*g"))}
+    else:
+        pages = {
+            f"synthetic {w}x{h}": cv2.imencode(".jpg", synthetic_page(w, h), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+            for w, h in SIZES
+        }
+
+    paths = {"previous": previous_path, "PageDecoder": decoder_path(PageDecoder(target_side=args.target_side))}
+    print(f"{'page':<28} {'path':<12} {'median':>9} {'peak alloc':>11}")
+    for name, file_bytes in pages.items():
+        for path_name, func in paths.items():
+            ms, mib = measure(func, file_bytes, args.repeat)
+            print(f"{name:<28} {path_name:<12} {ms:>7.1f}ms {mib:>8.1f}MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Import time of the package entry points, each in a fresh interpreter.
+
+Reports the median wall time of `import <module>` over --repeat runs, the
+modules with the largest cumulative import time (`python -X importtime`) and
+which heavy libraries the import dragged in. None of paddleocr, paddle,
+onnxruntime or openai should appear: engines and clients are imported when
+the container first builds them.
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py dt_receipt_ocr.tools.replay --top 20
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "dt_receipt_ocr.models",
+    "dt_receipt_ocr.core.utils",
+    "dt_receipt_ocr.core.pq7_pipeline",
+    "dt_receipt_ocr.main",
+    "dt_receipt_ocr.tools.bulk",
+]
+HEAVY = ["paddleocr", "paddle", "onnxruntime", "openai", "hydra", "sqlalchemy", "pdf2image", "cv2", "fastapi"]
+
+REPORT = "import sys; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+
+
+def wall_time(module: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def profile(module: str) -> tuple[list[tuple[int, str]], list[str]]:
+    """(cumulative microseconds, module) of every import, and the heavy libraries loaded."""
+    code = f"import {module}; " + REPORT.format(heavy=HEAVY)
+    run = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in run.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        if cumulative.strip().isdigit():
+            entries.append((int(cumulative), name.rstrip()))
+    loaded = [name for name in run.stdout.strip().split(",") if name]
+    return entries, loaded
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8, help="slowest imports listed per module")
+    args = parser.parse_args(argv)
+
+    baseline = wall_time("sys", args.repeat)
+    print(f"interpreter startup: {baseline * 1000:.0f}ms (subtracted below)")
+    for module in args.modules:
+        seconds = wall_time(module, args.repeat) - baseline
+        entries, loaded = profile(module)
+        print(f"\n{module}: {seconds * 1000:.0f}ms, heavy: {', '.join(loaded) or 'none'}")
+        for cumulative, name in sorted(entries, reverse=True)[1 : args.top + 1]:
+            print(f"  {cumulative / 1000:>8.1f}ms {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
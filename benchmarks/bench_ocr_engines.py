@@ -0,0 +1,130 @@
+"""
+Compare OCR engines on sample documents: latency, memory, startup and accuracy.
+
+Every engine config (a Hydra `ocr=` option) is measured in a fresh process so
+import time and memory are not shared between engines. Accuracy is the share
+of lines recognized by the first engine that each other engine reproduces
+exactly, per page.
+
+Usage:
+    python benchmarks/bench_ocr_engines.py --samples test_image/
+    python benchmarks/bench_ocr_engines.py --samples test_image/ --engines ocr=default ocr=onnx_int8 --json engines.json
+"""
+
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_ENGINES = ["ocr=default", "ocr=onnx", "ocr=onnx_int8"]
+
+
+def run_engine(override: str, samples: list[str], repeats: int, launched: float) -> dict:
+    from omegaconf import OmegaConf
+
+    from dt_receipt_ocr.core import pq7_pipeline
+    from dt_receipt_ocr.core.memory import process_memory
+    from dt_receipt_ocr.deps.container import init_onnx_ocr, init_paddle_ocr
+    from dt_receipt_ocr.main import load_config
+    from dt_receipt_ocr.tools.autotune import load_page
+
+    params = OmegaConf.to_object(load_config([override]).ocr)
+    if params["engine"] == "paddle":
+        engine = init_paddle_ocr({**params, "use_gpu": False})
+    else:
+        engine = init_onnx_ocr(params)
+    # From process launch, so interpreter start and imports are included
+    startup = time.time() - launched
+
+    regions = [pq7_pipeline._extract_regions_from_image(load_page(Path(p))) for p in samples]
+
+    def read_page(page_regions):
+        lines = [
+            pq7_pipeline._extract_text_from_region(region_img, origin, ocr=engine)
+            for region_img, origin in page_regions.values()
+        ]
+        return sorted({text for part in lines for text in part.texts.tolist()})
+
+    start = time.perf_counter()
+    texts = [read_page(regions[0])]
+    first_page = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeats):
+        texts = []
+        for page_regions in regions:
+            start = time.perf_counter()
+            texts.append(read_page(page_regions))
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "engine": override,
+        "startup_s": startup,
+        "first_page_s": first_page,
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "uss_mib": process_memory()["uss"] / 1024 / 1024,
+        "texts": texts,
+    }
+
+
+def accuracy(reference: list[list[str]], candidate: list[list[str]]) -> float:
+    scores = [len(set(ref) & set(got)) / len(ref) for ref, got in zip(reference, candidate) if ref]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, required=True, help="directory of sample documents")
+    parser.add_argument("--limit", type=int, default=10, help="max sample documents to use")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=DEFAULT_ENGINES, help="Hydra ocr= overrides")
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--launched", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    from dt_receipt_ocr.tools.autotune import IMAGE_SUFFIXES
+
+    samples = sorted(str(p) for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[: args.limit]
+    if args.worker:
+        print(json.dumps(run_engine(args.worker, samples, args.repeats, args.launched)))
+        return 0
+    if not samples:
+        parser.error(f"no sample documents in {args.samples}")
+
+    results = []
+    for override in args.engines:
+        command = [sys.executable, __file__, "--samples", str(args.samples), "--limit", str(args.limit)]
+        command += ["--repeats", str(args.repeats), "--worker", override, "--launched", str(time.time())]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode:
+            print(f"{override}: failed\n{proc.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    if not results:
+        return 1
+    reference = results[0]["texts"]
+    print(f"{'engine':<20} {'startup':>9} {'1st page':>9} {'median':>9} {'p95':>9} {'peak rss':>9} {'uss':>9} {'accuracy':>9}")
+    for result in results:
+        result["accuracy"] = accuracy(reference, result.pop("texts"))
+        print(
+            f"{result['engine']:<20} {result['startup_s']:>8.1f}s {result['first_page_s']:>8.2f}s "
+            f"{result['median_ms']:>7.0f}ms {result['p95_ms']:>7.0f}ms {result['peak_rss_mib']:>6.0f}MiB "
+            f"{result['uss_mib']:>6.0f}MiB {result['accuracy']:>9.3f}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
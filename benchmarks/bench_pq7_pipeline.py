@@ -0,0 +1,167 @@
+"""
+Micro-benchmarks for the pure-Python helpers of `pq7_pipeline`.
+
+The OCR engine is replaced by a replay of PaddleOCR results recorded in
+`benchmarks/fixtures/*.json`, so only the post-processing is timed.
+
+Usage:
+    python benchmarks/bench_pq7_pipeline.py --json bench.json
+    python benchmarks/bench_pq7_pipeline.py --compare bench.json --tolerance 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+from dt_receipt_ocr.core import pq7_pipeline
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.spatial_index import SpatialIndex
+from dt_receipt_ocr.models import PQ7ModelResponse
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+class ReplayOCR:
+    """Stand-in for PaddleOCR that returns a recorded `ocr()` result."""
+
+    def __init__(self, result):
+        self.result = result
+
+    def ocr(self, img, cls=True):
+        return self.result
+
+
+def load_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+
+    regions = {}
+    for region_name, region in fixture["regions"].items():
+        regions[region_name] = (
+            np.zeros(region["shape"], dtype=np.uint8),
+            tuple(region["origin"]),
+            ReplayOCR(region["result"]),
+        )
+    return regions
+
+
+def build_cases(fixture_path):
+    name = fixture_path.stem
+    regions = load_fixture(fixture_path)
+
+    region_texts = {}
+    for region_name, (region_img, origin, replay) in regions.items():
+        region_texts[region_name] = pq7_pipeline._extract_text_from_region(region_img, origin, ocr=replay)
+    flat = pq7_pipeline.flatten_dict_list(region_texts)
+    index = SpatialIndex(flat)
+    texts = flat.texts.tolist()
+    matches = DEFAULT_MATCHER.scan(texts)
+    # Scan every field now, so the extract_* cases time the heuristics only
+    list(matches)
+    ai_response = PQ7ModelResponse(
+        receipt_number="Receipt No. NP60046795",
+        destination_country="Youyiguan CHINA, Quang Binh VIETNAM",
+        transportation_mode="By Truck",
+        total_weight="",
+        number_of_boxes=1250,
+        export_date="",
+    )
+
+    cases = []
+    for region_name, (region_img, origin, replay) in regions.items():
+        cases.append((
+            f"{name}/_extract_text_from_region[{region_name}]",
+            lambda region_img=region_img, origin=origin, replay=replay: (
+                pq7_pipeline._extract_text_from_region(region_img, origin, ocr=replay)
+            ),
+        ))
+    def fresh_lines():
+        # Without the derived columns `flat` has cached by now
+        return OCRLines(boxes=flat.boxes, texts=flat.texts, scores=flat.scores)
+
+    def per_document():
+        # The Python work of read_page and complete_page on the regions' lines:
+        # the prompt text, then the heuristics run before the LLM call
+        "".join(f"{region}: {lines.records_text()}\n" for region, lines in region_texts.items())
+        index = SpatialIndex(pq7_pipeline.flatten_dict_list(region_texts))
+        matches = DEFAULT_MATCHER.scan(index.lines.texts.tolist())
+        return pq7_pipeline.extract_total_weight(index, matches), pq7_pipeline.extract_epxorted_date(index, matches)
+
+    cases += [
+        (f"{name}/flatten_dict_list", lambda: pq7_pipeline.flatten_dict_list(region_texts)),
+        (f"{name}/OCRLines.sort_reading_order", flat.sort_reading_order),
+        (f"{name}/SpatialIndex", lambda: SpatialIndex(fresh_lines())),
+        # Fields are scanned on first use; this scans all of them
+        (f"{name}/FieldMatcher.scan", lambda: list(DEFAULT_MATCHER.scan(texts))),
+        (f"{name}/per_document", per_document),
+        (f"{name}/extract_total_weight", lambda: pq7_pipeline.extract_total_weight(index, matches)),
+        (
+            f"{name}/extract_transportation_mode",
+            lambda: pq7_pipeline.extract_transportation_mode(index, matches),
+        ),
+        (f"{name}/extract_number_of_boxes", lambda: pq7_pipeline.extract_number_of_boxes(index, matches)),
+        (
+            f"{name}/extract_destination_country",
+            lambda: pq7_pipeline.extract_destination_country(index, matches),
+        ),
+        (f"{name}/extract_epxorted_date", lambda: pq7_pipeline.extract_epxorted_date(index, matches)),
+        (
+            f"{name}/post_process_ai_response",
+            lambda: pq7_pipeline.post_process_ai_response(ai_response),
+        ),
+    ]
+    return cases
+
+
+def run_case(func, number, repeat):
+    timer = timeit.Timer(func)
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = timer.repeat(repeat=repeat, number=number)
+    per_call = sorted(t / number * 1e6 for t in timings)
+    return {"best_us": per_call[0], "median_us": per_call[len(per_call) // 2]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--json", type=Path, help="write results to this file")
+    parser.add_argument("--compare", type=Path, help="baseline results written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for fixture_path in sorted(args.fixtures.glob("*.json")):
+        for case_name, func in build_cases(fixture_path):
+            results[case_name] = run_case(func, args.number, args.repeat)
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else {}
+    regressions = []
+    print(f"{'benchmark':<72} {'best (us)':>10} {'median (us)':>12} {'vs base':>8}")
+    for case_name, result in results.items():
+        delta = ""
+        if case_name in baseline:
+            ratio = result["best_us"] / baseline[case_name]["best_us"] - 1
+            delta = f"{ratio:+.0%}"
+            if ratio > args.tolerance:
+                regressions.append(case_name)
+        print(f"{case_name:<72} {result['best_us']:>10.1f} {result['median_us']:>12.1f} {delta:>8}")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -287,12 +287,10 @@ def extract_info(image: str):
 
 # Main execution
 if __name__ == "__main__":
-    # Replace with your image path
-    # image_path = "ocr_test_4_page-0001.jpg"
-    # image_path = 'rotate.jpg'
-    # image_path = 'processed_certificate.jpg'
-    image_path = 'test_image/d2.JPG'
-    
-    # Extract fields by region
-    region_texts = extract_info(image_path)
-    print(region_texts)
+    # Documents are processed with the bulk CLI, which takes the same arguments:
+    #   python -m dt_receipt_ocr.tools.bulk test_image/ --out results.jsonl
+    import sys
+
+    from dt_receipt_ocr.tools import bulk
+
+    sys.exit(bulk.main())
@@ -1,22 +1,41 @@
 import os
 import cv2
 import numpy as np
-from paddleocr import PaddleOCR
 import re
 import concurrent.futures
+import functools
+import threading
 from image_utils import preprocess_overexposed_image
 
-# Initialize PaddleOCR with English language model
-ocr = PaddleOCR(
-    use_angle_cls=True,
-    lang='en',
-    use_gpu=False,
-    det_db_thresh=0.3,
-    det_db_box_thresh=0.5,
-    det_db_unclip_ratio=1.8,
-    rec_batch_num=6,
-    drop_score=0.6
-)
+_ocr_lock = threading.Lock()
+
+
+@functools.cache
+def _build_ocr():
+    # Imported here: loading paddle takes seconds and hundreds of MB
+    from paddleocr import PaddleOCR
+
+    # Initialize PaddleOCR with English language model
+    return PaddleOCR(
+        use_angle_cls=True,
+        lang='en',
+        use_gpu=False,
+        det_db_thresh=0.3,
+        det_db_box_thresh=0.5,
+        det_db_unclip_ratio=1.8,
+        rec_batch_num=6,
+        drop_score=0.6
+    )
+
+
+def get_ocr():
+    """
+    The PaddleOCR engine, built on first use so importing this module (e.g.
+    for filter_specific_fields) does not load the models.
+    """
+    # Region threads of extract_fields_by_region may ask at the same time
+    with _ocr_lock:
+        return _build_ocr()
 
 def extract_all_english_text(image_path):
     """
@@ -30,7 +49,7 @@ def extract_all_english_text(image_path):
     """
 
     # Get OCR results
-    results = ocr.ocr(image_path, cls=True)
+    results = get_ocr().ocr(image_path, cls=True)
     
     # Process all text results
     all_text = []
@@ -61,6 +80,18 @@ def extract_all_english_text(image_path):
     
     return all_text
 
+# Field patterns, compiled once instead of on every line
+FORM_NUMBER_RE = re.compile(r'P\.?Q\.?\s*(\d+)', re.IGNORECASE)
+RECEIPT_NUMBER_RE = re.compile(r'NP\d+', re.IGNORECASE)
+DIGITS_RE = re.compile(r'\d+')
+DECIMAL_RE = re.compile(r'\d+[,\d]*[.\d]+')
+GROUPED_NUMBER_RE = re.compile(r'\d+,\d+,\d+')
+KG_LOWER_RE = re.compile(r'([\d,\.]+)\s*kg')
+KG_RE = re.compile(r'(\d+[,\d]*(?:\.\d+)?)\s*kg', re.IGNORECASE)
+CARTON_RE = re.compile(r'(\d+)\s*[Cc]arton')
+DATE_RE = re.compile(r'\d{1,2}/\d{1,2}/\d{2,4}')
+STRICT_DECIMAL_RE = re.compile(r'\d+[,\d]*\.\d+')
+
 def filter_specific_fields(all_text):
     """
     Filter the extracted text to find specific fields
@@ -91,14 +122,14 @@ def filter_specific_fields(all_text):
         
         # Form number (P.Q.7)
         if ('form' in text and 'p' in text and 'q' in text) or 'p.q.7' in text.lower():
-            match = re.search(r'P\.?Q\.?\s*(\d+)', item['text'], re.IGNORECASE)
+            match = FORM_NUMBER_RE.search(item['text'])
             if match:
                 fields['form_number'] = f"P.Q.{match.group(1)}"
             else:
                 # Look at nearby text items
                 for j in range(max(0, i-2), min(len(all_text), i+3)):
                     nearby_text = all_text[j]['text']
-                    match = re.search(r'P\.?Q\.?\s*(\d+)', nearby_text, re.IGNORECASE)
+                    match = FORM_NUMBER_RE.search(nearby_text)
                     if match:
                         fields['form_number'] = f"P.Q.{match.group(1)}"
                         break
@@ -108,12 +139,13 @@ def filter_specific_fields(all_text):
             # Look for the next item which likely contains the number
             if i + 1 < len(all_text):
                 number_text = all_text[i + 1]['text']
-                if re.search(r'\d+', number_text):
+                if DIGITS_RE.search(number_text):
                     fields['receipt_number'] = number_text
         
         # Check for NP60046795 format receipt number
-        if re.search(r'NP\d+', text, re.IGNORECASE):
-            fields['receipt_number'] = re.search(r'NP\d+', text, re.IGNORECASE).group()
+        receipt_match = RECEIPT_NUMBER_RE.search(text)
+        if receipt_match:
+            fields['receipt_number'] = receipt_match.group()
         
         # Destination country
         if 'destination' in text or 'city and country' in text:
@@ -152,28 +184,28 @@ def filter_specific_fields(all_text):
             # Look for values with numbers and currency
             for j in range(i, min(len(all_text), i+3)):
                 value_text = all_text[j]['text']
-                if re.search(r'\d+[,\d]*[.\d]+', value_text):
+                if DECIMAL_RE.search(value_text):
                     fields['total_weight'] = value_text
                     break
         
         # Check for "kg" or currency values
-        if 'kg' in text.lower() or re.search(r'\d+,\d+,\d+', text):
-            matches = re.search(r'([\d,\.]+)\s*kg', text.lower())
+        if 'kg' in text.lower() or GROUPED_NUMBER_RE.search(text):
+            matches = KG_LOWER_RE.search(text.lower())
             if matches:
                 fields['total_weight'] = matches.group(1) + ' kg'
             else:
-                numeric_match = re.search(r'\d+[,\d]*[.\d]+', text)
+                numeric_match = DECIMAL_RE.search(text)
                 if numeric_match:
                     fields['total_weight'] = numeric_match.group()
         
         # Number of boxes
-        if ('carton' in text.lower() or 'package' in text.lower()) and re.search(r'\d+', text):
-            matches = re.search(r'(\d+)\s*[Cc]arton', text)
+        if ('carton' in text.lower() or 'package' in text.lower()) and DIGITS_RE.search(text):
+            matches = CARTON_RE.search(text)
             if matches:
                 fields['number_of_boxes'] = matches.group(1) + ' Carton(s)'
             else:
                 # Just extract the number
-                numbers = re.findall(r'\d+', text)
+                numbers = DIGITS_RE.findall(text)
                 if numbers:
                     fields['number_of_boxes'] = numbers[0] + ' Carton(s)'
         
@@ -181,7 +213,7 @@ def filter_specific_fields(all_text):
         if 'date of exportation' in text.lower() or 'date of conveyance' in text.lower():
             for j in range(i, min(len(all_text), i+3)):
                 date_text = all_text[j]['text']
-                date_match = re.search(r'\d{1,2}/\d{1,2}/\d{2,4}', date_text)
+                date_match = DATE_RE.search(date_text)
                 if date_match:
                     fields['export_date'] = date_match.group()
                     break
@@ -192,20 +224,21 @@ def filter_specific_fields(all_text):
         text = item['text']
         
         # Date formats
-        date_match = re.search(r'\d{1,2}/\d{1,2}/\d{2,4}', text)
+        date_match = DATE_RE.search(text)
         if date_match and not fields['export_date']:
             fields['export_date'] = date_match.group()
         
         # Weight in kilograms
-        kg_match = re.search(r'(\d+[,\d]*(?:\.\d+)?)\s*kg', text, re.IGNORECASE)
+        kg_match = KG_RE.search(text)
         if kg_match and not fields['total_weight']:
             fields['total_weight'] = kg_match.group(1) + ' kg'
         
         # Value in kg
-        if not fields['total_weight'] and re.search(r'\d+[,\d]*\.\d+', text):
+        decimal_match = None if fields['total_weight'] else STRICT_DECIMAL_RE.search(text)
+        if decimal_match:
             # Check if it's in a context that suggests it's a value
             if any(value_word in text.lower() for value_word in ['value', 'amount', 'total', 'kg']):
-                fields['total_weight'] = re.search(r'\d+[,\d]*\.\d+', text).group()
+                fields['total_weight'] = decimal_match.group()
     
     return fields
 
@@ -270,7 +303,7 @@ def extract_text_from_region(region_image, region_name):
     cv2.imwrite(temp_region_path, region_image)
 
     # Get OCR results
-    results = ocr.ocr(region_image, cls=True)
+    results = get_ocr().ocr(region_image, cls=True)
     height, width = region_image.shape[:2]
 
     # Process results
@@ -361,17 +394,11 @@ def extract_fields_by_region(image_path):
 
 # Main execution
 if __name__ == "__main__":
-    # Replace with your image path
-    # image_path = "test_image/image5/ex5-large-p1.jpeg"
-    image_path = "rotate.jpg"
-    
-    # Extract fields by region
-    region_texts = extract_fields_by_region(image_path)
-
-    # Print all text by region
-    print("=== EXTRACTED TEXT BY REGION ===")
-    for region_name, texts in region_texts.items():
-        print(f"\n-- {region_name.upper()} REGION --")
-        for i, item in enumerate(texts, 1):
-            print(f"{i}. {item['text']} (Confidence: {item['confidence']:.2f})")
+    # Documents are processed with the bulk CLI, which takes the same arguments:
+    #   python -m dt_receipt_ocr.tools.bulk test_image/ --out results.jsonl
+    import sys
+
+    from dt_receipt_ocr.tools import bulk
+
+    sys.exit(bulk.main())
     
\ No newline at end of file
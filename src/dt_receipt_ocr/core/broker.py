@@ -0,0 +1,361 @@
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple, Protocol
+
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.metrics import REGISTRY
+
+ENQUEUED = REGISTRY.counter("pq7_jobs_enqueued_total", "Jobs handed to the broker by API front-ends")
+CLAIMED = REGISTRY.counter("pq7_jobs_claimed_total", "Jobs leased by workers, including retries")
+RETRIED = REGISTRY.counter("pq7_jobs_retried_total", "Jobs put back on the queue after a failure or an expired lease")
+FAILED = REGISTRY.counter("pq7_jobs_failed_total", "Jobs given up on after max_attempts")
+
+
+class Job(NamedTuple):
+    id: str
+    payload: bytes
+    attempts: int
+
+    def unpack(self) -> tuple[str, bytes]:
+        """The traceparent of the submitting request ('' when it was not traced) and the document."""
+        traceparent, _, document = self.payload.partition(b"\n")
+        return traceparent.decode(), document
+
+
+def pack(document: bytes, traceparent: str = "") -> bytes:
+    """Job payload: a traceparent line, so the worker's spans join the request's trace, then the document."""
+    return traceparent.encode() + b"\n" + document
+
+
+def failure(error: str) -> bytes:
+    """Result of a job given up on, in the format workers use for results."""
+    return json.dumps({"status": 500, "detail": error}).encode()
+
+
+class Broker(Protocol):
+    """
+    Job queue between API front-ends and workers, with at-least-once delivery.
+
+    Claimed jobs are leased for `lease_seconds`; a job whose worker neither
+    completes nor releases it in time (the worker died) is handed out again.
+    Completing or releasing is ignored once the job has been claimed again,
+    so a slow worker cannot requeue or answer for the one now holding it.
+    After `max_attempts` claims the job is completed with a failure result,
+    so the waiting front-end always gets an answer. Results nobody took
+    within `result_ttl` seconds, by when the front-end has given up, are
+    deleted. `take_result` does not block, so front-ends poll it from the
+    event loop instead of tying up a thread per waiting request.
+    """
+
+    def put(self, job_id: str, payload: bytes) -> None: ...
+
+    def claim(self, limit: int) -> list[Job]: ...
+
+    def complete(self, job: Job, result: bytes) -> None: ...
+
+    def release(self, job: Job, error: str) -> None: ...
+
+    def take_result(self, job_id: str) -> bytes | None: ...
+
+
+class SQLiteBroker:
+    """
+    Broker in one SQLite file, for tests and single-node deployments.
+
+    Any number of processes on the node can share the file; claims take the
+    write lock, so each job is leased to one worker at a time.
+    """
+
+    def __init__(
+        self, path: str = "queue/pq7.sqlite", lease_seconds: float = 120, max_attempts: int = 3, result_ttl: float = 3600
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    payload BLOB,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_until REAL,
+                    result BLOB,
+                    created REAL NOT NULL,
+                    finished REAL
+                )"""
+            )
+            # Queue files created before results were timestamped
+            if "finished" not in {column[1] for column in db.execute("PRAGMA table_info(jobs)")}:
+                db.execute("ALTER TABLE jobs ADD COLUMN finished REAL")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (state, created)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, so the broker is safe to use from any thread
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def put(self, job_id: str, payload: bytes) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO jobs (id, payload, state, created) VALUES (?, ?, 'queued', ?)",
+                (job_id, payload, time.time()),
+            )
+        ENQUEUED.inc()
+
+    def claim(self, limit: int) -> list[Job]:
+        now = time.time()
+        jobs = []
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # Results of jobs whose front-end stopped waiting; rows done before
+                # results were timestamped count from their enqueue time
+                db.execute(
+                    "DELETE FROM jobs WHERE state = 'done' AND coalesce(finished, created) < ?", (now - self.result_ttl,)
+                )
+                rows = db.execute(
+                    """SELECT id, payload, attempts, state FROM jobs
+                    WHERE state = 'queued' OR (state = 'leased' AND lease_until < ?)
+                    ORDER BY created LIMIT ?""",
+                    (now, limit),
+                ).fetchall()
+                for job_id, payload, attempts, state in rows:
+                    if state == "leased":
+                        RETRIED.inc()
+                    if attempts >= self.max_attempts:
+                        FAILED.inc()
+                        db.execute(
+                            "UPDATE jobs SET state = 'done', payload = NULL, result = ?, finished = ? WHERE id = ?",
+                            (failure(f"lease expired {attempts} times"), now, job_id),
+                        )
+                        continue
+                    db.execute(
+                        "UPDATE jobs SET state = 'leased', attempts = ?, lease_until = ? WHERE id = ?",
+                        (attempts + 1, now + self.lease_seconds, job_id),
+                    )
+                    jobs.append(Job(job_id, payload, attempts + 1))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        CLAIMED.inc(len(jobs))
+        return jobs
+
+    # Only while `job` still holds the lease: the attempt count changes with every claim
+    HELD = "id = ? AND state = 'leased' AND attempts = ?"
+
+    def complete(self, job: Job, result: bytes) -> None:
+        with self._connect() as db:
+            db.execute(
+                f"UPDATE jobs SET state = 'done', payload = NULL, result = ?, finished = ? WHERE {self.HELD}",
+                (result, time.time(), job.id, job.attempts),
+            )
+
+    def release(self, job: Job, error: str) -> None:
+        with self._connect() as db:
+            if job.attempts >= self.max_attempts:
+                updated = db.execute(
+                    f"UPDATE jobs SET state = 'done', payload = NULL, result = ?, finished = ? WHERE {self.HELD}",
+                    (failure(error), time.time(), job.id, job.attempts),
+                )
+                if updated.rowcount:
+                    FAILED.inc()
+            else:
+                updated = db.execute(
+                    f"UPDATE jobs SET state = 'queued', lease_until = NULL WHERE {self.HELD}", (job.id, job.attempts)
+                )
+                if updated.rowcount:
+                    RETRIED.inc()
+
+    def take_result(self, job_id: str) -> bytes | None:
+        with self._connect() as db:
+            row = db.execute("SELECT result FROM jobs WHERE id = ? AND state = 'done'", (job_id,)).fetchone()
+            if row is None:
+                return None
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            return row[0]
+
+
+class RedisBroker:
+    """
+    Broker on Redis or any server speaking its protocol (Valkey, KeyDB, ...).
+
+    Job ids wait in the `<prefix>:queue` list, payloads and attempt counts
+    in `<prefix>:job:<id>` hashes, leases in the `<prefix>:leases` sorted set
+    scored by deadline, and results in `<prefix>:result:<id>` keys that
+    expire after `result_ttl`. Claims and requeues are Lua scripts, so a job
+    is always in the queue, leased or done, whenever a worker dies. Needs
+    the optional `redis` package.
+    """
+
+    # Requeues expired leases, then pops up to `limit` jobs and leases them,
+    # or fails the ones out of attempts. Returns the number requeued, the
+    # number failed and (id, attempts, payload) of every job claimed.
+    CLAIM = """
+    local queue, leases = KEYS[1], KEYS[2]
+    local limit, now, lease_seconds = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local max_attempts, job_prefix, result_prefix = tonumber(ARGV[4]), ARGV[5], ARGV[6]
+    local expired = redis.call('ZRANGEBYSCORE', leases, '-inf', now)
+    for _, id in ipairs(expired) do
+        redis.call('ZREM', leases, id)
+        redis.call('RPUSH', queue, id)
+    end
+    local failed, claimed = 0, {}
+    for _ = 1, limit do
+        local id = redis.call('LPOP', queue)
+        if not id then break end
+        local job = job_prefix .. id
+        local payload = redis.call('HGET', job, 'payload')
+        -- A job already finished by an older lease has no hash left
+        if payload then
+            local attempts = redis.call('HINCRBY', job, 'attempts', 1)
+            if attempts > max_attempts then
+                redis.call('SET', result_prefix .. id, ARGV[7], 'EX', ARGV[8])
+                redis.call('DEL', job)
+                failed = failed + 1
+            else
+                redis.call('ZADD', leases, now + lease_seconds, id)
+                table.insert(claimed, id)
+                table.insert(claimed, attempts)
+                table.insert(claimed, payload)
+            end
+        end
+    end
+    return {#expired, failed, claimed}
+    """
+    # Puts a leased job back on the queue, unless its lease already expired and was requeued
+    REQUEUE = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+        return redis.call('RPUSH', KEYS[2], ARGV[1])
+    end
+    return 0
+    """
+
+    def __init__(
+        self,
+        url: str = "redis://localhost:6379/0",
+        prefix: str = "pq7",
+        lease_seconds: float = 120,
+        max_attempts: int = 3,
+        result_ttl: float = 3600,
+    ):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self._claim = self.redis.register_script(self.CLAIM)
+        self._requeue = self.redis.register_script(self.REQUEUE)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix, *parts))
+
+    def put(self, job_id: str, payload: bytes) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key("job", job_id), mapping={"payload": payload, "attempts": 0})
+        pipe.rpush(self._key("queue"), job_id)
+        pipe.execute()
+        ENQUEUED.inc()
+
+    def claim(self, limit: int) -> list[Job]:
+        requeued, failed, claimed = self._claim(
+            keys=[self._key("queue"), self._key("leases")],
+            args=[
+                limit,
+                repr(time.time()),
+                self.lease_seconds,
+                self.max_attempts,
+                self._key("job", ""),
+                self._key("result", ""),
+                failure(f"lease expired {self.max_attempts} times"),
+                max(1, round(self.result_ttl)),
+            ],
+        )
+        RETRIED.inc(requeued)
+        FAILED.inc(failed)
+        jobs = [
+            Job(job_id.decode(), payload, int(attempts))
+            for job_id, attempts, payload in zip(claimed[::3], claimed[1::3], claimed[2::3])
+        ]
+        CLAIMED.inc(len(jobs))
+        return jobs
+
+    def _holds(self, job: Job) -> bool:
+        # Every claim bumps the attempt count, so a different count means someone else's lease
+        attempts = self.redis.hget(self._key("job", job.id), "attempts")
+        return attempts is not None and int(attempts) == job.attempts
+
+    def _finish(self, job_id: str, result: bytes) -> None:
+        pipe = self.redis.pipeline()
+        pipe.set(self._key("result", job_id), result, ex=max(1, round(self.result_ttl)))
+        pipe.zrem(self._key("leases"), job_id)
+        pipe.delete(self._key("job", job_id))
+        pipe.execute()
+
+    def complete(self, job: Job, result: bytes) -> None:
+        if self._holds(job):
+            self._finish(job.id, result)
+
+    def release(self, job: Job, error: str) -> None:
+        if not self._holds(job):
+            return
+        if job.attempts >= self.max_attempts:
+            FAILED.inc()
+            self._finish(job.id, failure(error))
+        elif self._requeue(keys=[self._key("leases"), self._key("queue")], args=[job.id]):
+            RETRIED.inc()
+
+    def take_result(self, job_id: str) -> bytes | None:
+        return self.redis.getdel(self._key("result", job_id))
+
+
+class Dispatcher:
+    """
+    Where the API runs documents: in its own process (`inline`) or, in
+    `queue` mode, as broker jobs for `python -m dt_receipt_ocr.worker`
+    processes, so OCR capacity scales separately from the front-ends.
+    The broker is only built once queue mode uses it.
+    """
+
+    def __init__(self, mode: str = "inline", broker=None, result_timeout: float = 300, max_poll_interval: float = 0.5):
+        self.mode = mode
+        self._broker = broker
+        self.result_timeout = result_timeout
+        self.max_poll_interval = max_poll_interval
+
+    @property
+    def queued(self) -> bool:
+        return self.mode == "queue"
+
+    async def submit(self, payload: bytes) -> bytes:
+        """Enqueue `payload` and wait for the worker's result; TimeoutError after `result_timeout`."""
+        broker = self._broker()
+        job_id = uuid.uuid4().hex
+        tracing.annotate(job_id=job_id)
+        # The worker's spans continue this trace under the current (queue_wait) span
+        await asyncio.to_thread(broker.put, job_id, pack(payload, tracing.current_traceparent()))
+
+        deadline = time.monotonic() + self.result_timeout
+        interval = 0.02
+        while time.monotonic() < deadline:
+            result = await asyncio.to_thread(broker.take_result, job_id)
+            if result is not None:
+                return result
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+        raise TimeoutError(f"job {job_id} not done after {self.result_timeout}s")
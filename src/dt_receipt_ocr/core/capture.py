@@ -0,0 +1,145 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+# (recorder, entry) of the request being captured, for note_document
+_current = contextvars.ContextVar("capture_entry", default=None)
+
+
+class TrafficRecorder:
+    """
+    Opt-in capture of API traffic for `tools.replay`.
+
+    One JSON line per request is appended to `path`: arrival time, method,
+    path, latency, status, sha256 of the request body, the JSON request and
+    response bodies, and the sha256 of the document that was processed. With
+    `store_documents` the document itself is kept under `documents_dir`,
+    named by its hash, so uploads can be replayed and URL requests replayed
+    without the original storage. API keys are never recorded.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        path: str = "captures/requests.jsonl",
+        store_documents: bool = False,
+        documents_dir: str = "captures/documents",
+    ):
+        self.enabled = enabled
+        self.path = Path(path)
+        self.store_documents = store_documents
+        self.documents_dir = Path(documents_dir)
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a") as out:
+                out.write(line)
+
+    def store(self, file_bytes: bytes, digest: str) -> str:
+        document = self.documents_dir / digest
+        if not document.exists():
+            self.documents_dir.mkdir(parents=True, exist_ok=True)
+            tmp = document.with_suffix(".tmp")
+            tmp.write_bytes(file_bytes)
+            tmp.replace(document)
+        return str(document)
+
+
+def note_document(file_bytes: bytes, digest: str) -> None:
+    """Attach the document being processed to the captured request, if any."""
+    current = _current.get()
+    if current is None:
+        return
+    recorder, entry = current
+    entry["document_sha256"] = digest
+    entry["document_bytes"] = len(file_bytes)
+    if recorder.store_documents:
+        entry["document_path"] = recorder.store(file_bytes, digest)
+
+
+def _json_or_none(body: bytes, content_type: str):
+    if not content_type.startswith("application/json"):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware recording requests under `prefix` with the app's
+    `state.capture` recorder. Bodies are teed as the app reads and writes
+    them, so uploads still stream.
+    """
+
+    def __init__(self, app, prefix: str = "/dt"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        recorder = getattr(scope["app"].state, "capture", None) if "app" in scope else None
+        if (
+            scope["type"] != "http"
+            or recorder is None
+            or not recorder.enabled
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        entry = {
+            "ts": time.time(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "content_type": headers.get("content-type", ""),
+        }
+        request_hash = hashlib.sha256()
+        request_body = bytearray()
+        request_size = 0
+        response_body = bytearray()
+        response = {}
+
+        async def capture_receive():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                request_hash.update(chunk)
+                request_size += len(chunk)
+                # Only JSON bodies are kept inline; uploads are kept by note_document
+                if entry["content_type"].startswith("application/json"):
+                    request_body.extend(chunk)
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for key, value in message.get("headers", []):
+                    if key.lower() == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        token = _current.set((recorder, entry))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            _current.reset(token)
+            entry["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            entry["status"] = response.get("status")
+            entry["request_sha256"] = request_hash.hexdigest()
+            entry["request_bytes"] = request_size
+            entry["request"] = _json_or_none(bytes(request_body), entry["content_type"])
+            entry["response"] = _json_or_none(bytes(response_body), response.get("content_type", ""))
+            recorder.write(entry)
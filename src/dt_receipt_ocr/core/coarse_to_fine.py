@@ -0,0 +1,86 @@
+import numpy as np
+
+from dt_receipt_ocr.core.field_patterns import KEYWORD, FieldMatcher
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.core.ocr_engine import OCREngine, get_rotate_crop_image
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.orientation import downscale
+
+REGIONS = REGISTRY.counter(
+    "ocr_regions_total",
+    "Regions OCR'd, by how they were read: coarse (first pass kept), escalated (OCR'd again at full size) "
+    "or full_size (already small enough)",
+)
+REGION_ESCALATIONS = REGISTRY.counter(
+    "ocr_region_escalations_total", "Regions OCR'd again at full size, by the field whose value was missing"
+)
+LINES = REGISTRY.counter("ocr_coarse_lines_total", "Lines recognized in coarse first passes")
+LINE_ESCALATIONS = REGISTRY.counter(
+    "ocr_line_escalations_total", "Coarse lines re-recognized from the full-size crop because of a low score"
+)
+
+
+class CoarseToFine:
+    """
+    Two-tier OCR of one region.
+
+    The first pass runs on the region downscaled to `max_side`, which is
+    what bounds detection cost. Lines recognized below `min_score` are then
+    re-cropped from the full-size region and only re-recognized. When the
+    region shows the label of one of `fields`, or was expected to hold it,
+    but none of that field's patterns matched, the whole region is OCR'd
+    again at full size. Counters for both escalations are on /metrics.
+    """
+
+    def __init__(self, enabled: bool = False, max_side: int = 640, min_score: float = 0.85, fields=()):
+        self.enabled = enabled
+        self.max_side = max_side
+        self.min_score = min_score
+        self.fields = list(fields)
+
+    def read(self, region, ocr: OCREngine, matcher: FieldMatcher, cls: bool = True, expected=()) -> OCRLines:
+        """Lines of `region` in its own pixel coordinates."""
+        small = downscale(region, self.max_side)
+        if small is region:
+            REGIONS.inc(read="full_size")
+            return OCRLines.from_paddle(ocr.ocr(region, cls=cls)[0])
+
+        lines = OCRLines.from_paddle(ocr.ocr(small, cls=cls)[0]).scale(region.shape[1] / small.shape[1])
+        missing = self.missing_fields(lines, matcher, expected)
+        if missing:
+            REGIONS.inc(read="escalated")
+            REGION_ESCALATIONS.inc(field=missing[0])
+            return OCRLines.from_paddle(ocr.ocr(region, cls=cls)[0])
+
+        REGIONS.inc(read="coarse")
+        LINES.inc(len(lines))
+        low = np.flatnonzero(lines.scores < self.min_score)
+        if low.size:
+            LINE_ESCALATIONS.inc(low.size)
+            lines = self.rerecognize(region, lines, low, ocr, cls)
+        return lines
+
+    def missing_fields(self, lines: OCRLines, matcher: FieldMatcher, expected=()) -> list[str]:
+        # Only the fields this reader looks for are scanned
+        matches = matcher.scan(lines.texts.tolist())
+        return [
+            field for field in self.fields
+            if (field in expected or matches.of(field, KEYWORD)) and not matches.of(field)
+        ]
+
+    @staticmethod
+    def rerecognize(region, lines: OCRLines, index, ocr: OCREngine, cls: bool) -> OCRLines:
+        """Recognize the `index` lines again from `region`, keeping whichever reading scores higher."""
+        crops = [get_rotate_crop_image(region, lines.boxes[i]) for i in index]
+        classifier = getattr(ocr, "text_classifier", None)
+        if cls and classifier is not None:
+            crops, _, _ = classifier(crops)
+        results, _ = ocr.text_recognizer(crops)
+
+        texts = lines.texts.tolist()
+        scores = lines.scores.copy()
+        for i, (text, score) in zip(index, results):
+            if score > scores[i]:
+                texts[i] = text.strip()
+                scores[i] = score
+        return OCRLines(boxes=lines.boxes, texts=np.asarray(texts, dtype=np.str_), scores=scores)
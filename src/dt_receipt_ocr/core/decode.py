@@ -0,0 +1,150 @@
+import io
+import struct
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import pdf2image
+import puremagic
+from jaxtyping import UInt8
+from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError
+from PIL import Image, ImageOps
+
+from dt_receipt_ocr.core import tracing
+
+# cv2.imdecode flags that let libjpeg scale the DCT down while decoding
+REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2}
+# Start-of-image marker; puremagic names JPEGs .jpg, .jpeg or .jfif depending on the APP segment
+JPEG_SOI = b"\xff\xd8\xff"
+# What Pillow, OpenCV and poppler raise for bytes they cannot make a page of
+UNREADABLE = (OSError, cv2.error, Image.DecompressionBombError, PDFPageCountError, PDFSyntaxError)
+
+
+class UnsupportedDocument(ValueError):
+    """The upload is not an image or PDF that can be decoded; `error_code` is returned to the client."""
+
+    error_code = "UNSUPPORTED_DOCUMENT"
+
+
+@contextmanager
+def _readable():
+    try:
+        yield
+    except UNREADABLE as error:
+        raise UnsupportedDocument(f"{type(error).__name__}: {error}") from error
+
+
+class PageDecoder:
+    """
+    Turn uploaded file bytes into the single page array the pipeline works on.
+
+    The result is one C-contiguous BGR uint8 array, the channel order of the
+    OCR engines, so nothing downstream has to convert or copy it again.
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale when the longer side
+    stays at least `target_side` pixels; a 12 MP phone photo is never
+    materialized at full size. EXIF orientation is applied by the decoder.
+    PDFs render their first page at `pdf_size`; `decode_pages` renders up
+    to `max_pages` of them. Anything unreadable raises UnsupportedDocument.
+    """
+
+    def __init__(self, target_side: int = 2000, pdf_size: int = 1500, max_pages: int = 1):
+        self.target_side = target_side
+        self.pdf_size = pdf_size
+        self.max_pages = max_pages
+
+    def reduction(self, width: int, height: int) -> int:
+        long_side = max(width, height)
+        for factor in REDUCED_FLAGS:
+            if long_side / factor >= self.target_side:
+                return factor
+        return 1
+
+    def pixels(self, file_bytes: bytes) -> int:
+        """
+        Pixels `decode_pages` will produce, from the headers only; an upper
+        bound for PDFs. Raises UnsupportedDocument when there is no image
+        header to read.
+        """
+        if file_bytes.startswith(JPEG_SOI) or _sniff(file_bytes) != ".pdf":
+            width, height = _image_size(file_bytes)
+            if file_bytes.startswith(JPEG_SOI):
+                factor = self.reduction(width, height)
+                return -(-width // factor) * -(-height // factor)
+            return width * height
+        # Pages render with their longer side at pdf_size
+        return self.pdf_size**2 * max(1, self.max_pages)
+
+    def decode_pages(self, file_bytes: bytes) -> list[UInt8[np.ndarray, "h w 3"]]:
+        """The first `max_pages` pages of a PDF; any other file is a single page."""
+        with tracing.span("decode", bytes=len(file_bytes)) as span:
+            if self.max_pages <= 1 or file_bytes.startswith(JPEG_SOI) or _sniff(file_bytes) != ".pdf":
+                pages = [self.decode(file_bytes)]
+            else:
+                with _readable():
+                    pages = _render_pdf(file_bytes, self.max_pages, self.pdf_size)
+                if not pages:
+                    raise UnsupportedDocument("PDF without pages")
+            span.set(pages=len(pages), height=pages[0].shape[0], width=pages[0].shape[1])
+            return pages
+
+    def decode(self, file_bytes: bytes) -> UInt8[np.ndarray, "h w 3"]:
+        with _readable():
+            return self._decode(file_bytes)
+
+    def _decode(self, file_bytes: bytes) -> UInt8[np.ndarray, "h w 3"]:
+        buffer = np.frombuffer(file_bytes, dtype=np.uint8)
+        if file_bytes.startswith(JPEG_SOI):
+            width, height = _image_size(file_bytes)
+            img = cv2.imdecode(buffer, REDUCED_FLAGS.get(self.reduction(width, height), cv2.IMREAD_COLOR))
+        elif _sniff(file_bytes) == ".pdf":
+            pages = _render_pdf(file_bytes, 1, self.pdf_size)
+            if not pages:
+                raise UnsupportedDocument("PDF without pages")
+            return pages[0]
+        else:
+            img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+        if img is None:
+            # Formats OpenCV was built without (GIF, some TIFF/WebP variants)
+            img_pil = Image.open(io.BytesIO(file_bytes))
+            ImageOps.exif_transpose(img_pil, in_place=True)
+            img = cv2.cvtColor(np.asarray(img_pil.convert("RGB")), cv2.COLOR_RGB2BGR)
+        return img
+
+
+def _image_size(file_bytes: bytes) -> tuple[int, int]:
+    """
+    (width, height) from the image header. Unlike `Image.open`, there is no
+    decompression bomb check: the memory budget is what refuses huge images,
+    and it needs their size to do so.
+    """
+    Image.init()
+    prefix = file_bytes[:16]
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        try:
+            # accept returns a warning string for formats it recognizes but cannot open
+            accepted = not accept or accept(prefix)
+            if accepted and not isinstance(accepted, str):
+                return factory(io.BytesIO(file_bytes), "").size
+        except (SyntaxError, IndexError, TypeError, struct.error, OSError):
+            continue
+    raise UnsupportedDocument("No readable image header")
+
+
+def _sniff(file_bytes: bytes) -> str:
+    with tracing.span("puremagic") as span:
+        try:
+            extension = puremagic.from_string(file_bytes)
+        except (puremagic.PureError, ValueError):
+            # Unknown or empty; the image decoders get to say what is wrong
+            extension = ""
+        span.set(extension=extension)
+        return extension
+
+
+def _render_pdf(file_bytes: bytes, pages: int, size: int) -> list[UInt8[np.ndarray, "h w 3"]]:
+    with tracing.span("pdf2image", max_pages=pages, size=size) as span:
+        rendered = pdf2image.convert_from_bytes(file_bytes, last_page=pages, size=size)
+        span.set(pages=len(rendered))
+        return [cv2.cvtColor(np.asarray(page.convert("RGB")), cv2.COLOR_RGB2BGR) for page in rendered]
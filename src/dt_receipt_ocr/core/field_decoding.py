@@ -0,0 +1,145 @@
+import re
+import threading
+from contextlib import contextmanager
+from typing import Mapping
+
+import numpy as np
+
+from dt_receipt_ocr.core.field_patterns import FieldMatcher
+from dt_receipt_ocr.core.metrics import REGISTRY
+
+DECODES = REGISTRY.counter(
+    "ocr_constrained_decodes_total",
+    "Field-like spans re-decoded with the field's charset, by field and result: corrected, unchanged, "
+    "or rejected (the constrained reading did not match the field pattern)",
+)
+
+
+class _Field:
+    def __init__(self, name: str, charset: str, candidate: str, ignore_case: bool):
+        self.name = name
+        self.charset = charset
+        self.candidate = re.compile(candidate, re.IGNORECASE if ignore_case else 0)
+
+
+class ConstrainedDecoder:
+    """
+    CTC decoder that re-reads field values with a reduced character set.
+
+    Wraps a recognizer's greedy CTC decoder (PaddleOCR's CTCLabelDecode or
+    ours), whose `character` list maps logit columns to characters with the
+    blank at 0. Lines are decoded as before; then every span matching a
+    field's relaxed `candidate` regex is decoded again from its own frames
+    of the same logits, with every column outside the field's charset
+    masked. "NP6OO4679S" becomes "NP60046795" without running the model
+    again. The new reading is kept only when it has as many characters as
+    the span, spaces aside, and matches the field's pattern.
+    """
+
+    def __init__(self, decoder, fields: list[_Field], matcher: FieldMatcher, scope: threading.local):
+        self.decoder = decoder
+        self.character = decoder.character
+        self._matcher = matcher
+        self._scope = scope
+        self._fields = []
+        for field in fields:
+            columns = [0] + [i for i, char in enumerate(self.character) if char in field.charset]
+            self._fields.append((field, np.asarray(columns)))
+
+    def __getattr__(self, name):
+        return getattr(self.decoder, name)
+
+    def __call__(self, preds, label=None, *args, **kwargs):
+        results = self.decoder(preds, label, *args, **kwargs)
+        only = getattr(self._scope, "fields", None)
+        fields = [(field, columns) for field, columns in self._fields if only is None or field.name in only]
+        if not fields:
+            return results
+        if isinstance(preds, (tuple, list)):
+            preds = preds[-1]
+        probs = preds.numpy() if hasattr(preds, "numpy") else np.asarray(preds)
+        return [self._constrain(prob, result, fields) for prob, result in zip(probs, results)]
+
+    def _constrain(self, prob, result, fields):
+        text, _, *rest = result
+        index = prob.argmax(axis=1)
+        keep = index != 0
+        keep[1:] &= index[1:] != index[:-1]
+        frames = np.flatnonzero(keep)
+        if "".join(self.character[i] for i in index[frames]) != text:
+            # Not a plain greedy decoding (e.g. reversed Arabic); leave it
+            return result
+        char_probs = prob[frames, index[frames]].tolist()
+        bounds = [*frames.tolist(), len(prob)]
+
+        spans = sorted((
+            (match.start(), match.end(), field, columns)
+            for field, columns in fields
+            for match in field.candidate.finditer(text)
+        ), key=lambda span: span[:2])
+        changed = False
+        taken = len(text)
+        # From the end, so earlier character indices stay valid
+        for start, end, field, columns in reversed(spans):
+            if end > taken:
+                continue
+            # Frames from the span's first character up to the character after it
+            sub = prob[bounds[start] : bounds[end], columns]
+            sub_index = sub.argmax(axis=1)
+            sub_keep = sub_index != 0
+            sub_keep[1:] &= sub_index[1:] != sub_index[:-1]
+            value = "".join(self.character[columns[i]] for i in sub_index[sub_keep])
+            # A character with no plausible reading in the charset decodes as
+            # blank; a shorter value would pass the pattern but be wrong
+            span_length = end - start - text.count(" ", start, end)
+            if len(value) != span_length or self._matcher.search(field.name, value) != value:
+                DECODES.inc(field=field.name, result="rejected")
+                continue
+            taken = start
+            if value == text[start:end]:
+                DECODES.inc(field=field.name, result="unchanged")
+                continue
+            DECODES.inc(field=field.name, result="corrected")
+            text = text[:start] + value + text[end:]
+            char_probs[start:end] = sub.max(axis=1)[sub_keep].tolist()
+            changed = True
+        if not changed:
+            return result
+        return (text, float(np.mean(char_probs)), *rest)
+
+
+class FieldDecoding:
+    """
+    Installs a `ConstrainedDecoder` on OCR engines for the `fields` of the
+    patterns config that declare a `charset` and a relaxed `candidate` regex
+    (conf/patterns/). Every line recognized by the engine is checked for
+    candidates; `only` limits that, in the calling thread, to the fields an
+    ROI is known to hold.
+    """
+
+    def __init__(self, enabled: bool, patterns: Mapping[str, Mapping], matcher: FieldMatcher):
+        self.enabled = enabled
+        self.matcher = matcher
+        self.fields = [
+            _Field(name, spec["charset"], spec["candidate"], spec.get("ignore_case", False))
+            for name, spec in patterns.items()
+            if spec.get("charset") and spec.get("candidate")
+        ]
+        self._scope = threading.local()
+
+    def install(self, engine):
+        recognizer = getattr(engine, "text_recognizer", None)
+        decoder = getattr(recognizer, "postprocess_op", None)
+        if not self.enabled or not self.fields or decoder is None or not hasattr(decoder, "character"):
+            return engine
+        recognizer.postprocess_op = ConstrainedDecoder(decoder, self.fields, self.matcher, self._scope)
+        return engine
+
+    @contextmanager
+    def only(self, fields):
+        previous = getattr(self._scope, "fields", None)
+        self._scope.fields = set(fields)
+        try:
+            yield
+        finally:
+            self._scope.fields = previous
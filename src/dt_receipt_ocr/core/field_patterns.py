@@ -0,0 +1,215 @@
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, Mapping, NamedTuple
+
+from omegaconf import OmegaConf
+
+DEFAULT_PATTERNS_PATH = Path(__file__).parents[1] / "conf" / "patterns" / "pq7.yaml"
+
+PATTERN = "pattern"
+KEYWORD = "keyword"
+
+
+class FieldMatch(NamedTuple):
+    field: str
+    kind: str  # PATTERN or KEYWORD
+    value: str
+    line: int
+    start: int
+    end: int
+
+
+class _Scanner(NamedTuple):
+    # The patterns, or the keywords, of one field as one alternation of groups
+    regex: re.Pattern
+    # The same alternation in MULTILINE mode, run once over the joined lines
+    prefilter: re.Pattern
+    # Lowercase text every match contains, when known: checking lines for it
+    # is much faster than the prefilter, which a leading \b slows down
+    literals: tuple[str, ...] | None
+    # Group index -> value group offset
+    offsets: dict[int, int]
+    compact: bool
+
+
+def _literal(keyword: str) -> str | None:
+    """The text a keyword such as `\\bdate of exportation\\b` always matches, if it is plain text."""
+    text = keyword.removeprefix(r"\b").removesuffix(r"\b")
+    plain = text.replace(" ", "")
+    return text.lower() if plain and re.escape(plain) == plain else None
+
+
+def _value(scanner: _Scanner, match: re.Match) -> str:
+    # The entry's own group closes after any group nested in it
+    group = match.lastindex
+    offset = scanner.offsets[group]
+    value = (match.group(group + offset) if offset else match.group(group)) or ""
+    return "".join(value.split()) if scanner.compact else value
+
+
+class FieldMatches:
+    """
+    Matches of one scan, in line order then position order.
+
+    Fields are scanned on first use, so heuristics that only look at a few
+    fields never pay for the others.
+    """
+
+    def __init__(self, matcher: "FieldMatcher", texts: Iterable[str]):
+        self._matcher = matcher
+        self.texts = list(texts)
+        self._joined = None
+        self._by_kind: dict[tuple[str, str], list[FieldMatch]] = {}
+
+    @property
+    def joined(self) -> str:
+        if self._joined is None:
+            self._joined = "\n".join(self.texts)
+            self.lowered = self._joined.lower()
+        return self._joined
+
+    def line_at(self, position: int, lowered: bool = False) -> int:
+        """
+        Line of a character of the joined text, or of `lowered`: lowercasing
+        can change the length of a line ("İ" becomes two code points), but
+        never its newlines.
+        """
+        return (self.lowered if lowered else self._joined).count("\n", 0, position)
+
+    def of(self, field: str, kind: str = PATTERN) -> list[FieldMatch]:
+        matches = self._by_kind.get((field, kind))
+        if matches is None:
+            matches = self._by_kind[field, kind] = self._matcher._scan(field, kind, self)
+        return matches
+
+    def first(self, field: str, kind: str = PATTERN) -> str:
+        matches = self.of(field, kind)
+        return matches[0].value if matches else ""
+
+    def value_at(self, field: str, line: int) -> str:
+        """First pattern value of `field` on `line`, without scanning the other lines."""
+        matches = self._by_kind.get((field, PATTERN))
+        if matches is not None:
+            return next((match.value for match in matches if match.line == line), "")
+        return self._matcher._first_value(field, self.texts[line])
+
+    def __iter__(self) -> Iterator[FieldMatch]:
+        every = [
+            match for field in self._matcher.fields for kind in (PATTERN, KEYWORD) for match in self.of(field, kind)
+        ]
+        return iter(sorted(every, key=lambda match: (match.line, match.start)))
+
+    def __len__(self) -> int:
+        return sum(len(self.of(field, kind)) for field in self._matcher.fields for kind in (PATTERN, KEYWORD))
+
+
+class FieldMatcher:
+    """
+    Scans text lines against the patterns and keywords of every field.
+
+    The patterns of a field, and its keywords, are each compiled into one
+    alternation of groups and scanned for the first time a heuristic asks
+    for them, so fields it never looks at cost nothing. Lines that cannot
+    match are skipped after one pass over the whole text. Patterns of a
+    field never overlap within a line, nor do its keywords; at the same
+    position the one listed first wins. Keywords are case-insensitive
+    regexes, anchored with \\b where a label must not match inside a word.
+    """
+
+    def __init__(self, fields: Mapping[str, Mapping]):
+        self._scanners: dict[tuple[str, str], _Scanner] = {}
+        self._field_regexes = {}
+        self._keywords = {}
+        self._compact = set()
+
+        for field, spec in fields.items():
+            flags = "i" if spec.get("ignore_case", False) else ""
+            patterns = list(spec.get("patterns") or [])
+            keywords = list(spec.get("keywords") or [])
+            self._keywords[field] = keywords
+            compact = bool(spec.get("compact", False))
+            if compact:
+                self._compact.add(field)
+
+            if patterns:
+                alternatives = [f"(?{flags}:{pattern})" if flags else pattern for pattern in patterns]
+                self._scanners[field, PATTERN] = self._scanner(alternatives, None, compact)
+            if keywords:
+                literals = tuple(_literal(keyword) for keyword in keywords)
+                self._scanners[field, KEYWORD] = self._scanner(
+                    [f"(?i:{keyword})" for keyword in keywords], None if None in literals else literals, False
+                )
+            if patterns:
+                self._field_regexes[field] = [
+                    re.compile(pattern, re.IGNORECASE if flags else 0) for pattern in patterns
+                ]
+
+    @classmethod
+    def from_yaml(cls, path: Path | str) -> "FieldMatcher":
+        return cls(OmegaConf.to_object(OmegaConf.load(path)))
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self._keywords)
+
+    def keywords(self, field: str) -> list[str]:
+        return self._keywords.get(field, [])
+
+    @staticmethod
+    def _scanner(alternatives: list[str], literals: tuple[str, ...] | None, compact: bool) -> _Scanner:
+        parts, has_group = [], {}
+        for i, alternative in enumerate(alternatives):
+            parts.append(f"(?P<_{i}>{alternative})")
+            has_group[f"_{i}"] = re.compile(alternative).groups > 0
+        regex = re.compile("|".join(parts))
+        # The value is the entry's own first group, if it has one
+        offsets = {regex.groupindex[name]: 1 if grouped else 0 for name, grouped in has_group.items()}
+        return _Scanner(regex, re.compile(regex.pattern, re.MULTILINE), literals, offsets, compact)
+
+    def scan(self, texts: Iterable[str]) -> FieldMatches:
+        return FieldMatches(self, texts)
+
+    def _scan(self, field: str, kind: str, scan: FieldMatches) -> list[FieldMatch]:
+        scanner = self._scanners.get((field, kind))
+        if scanner is None:
+            return []
+        joined = scan.joined
+        lines = set()
+        if scanner.literals is not None:
+            # Lines holding one of the literals, found with str.find
+            for literal in scanner.literals:
+                position = scan.lowered.find(literal)
+                while position >= 0:
+                    lines.add(scan.line_at(position, lowered=True))
+                    position = scan.lowered.find(literal, position + 1)
+        else:
+            # Every line a match in the joined text starts in, ends in or
+            # spans; a line matched on its own is always among them
+            for match in scanner.prefilter.finditer(joined):
+                first = scan.line_at(match.start())
+                last = first + joined.count("\n", match.start(), match.end())
+                lines.update(range(first, last + 1))
+        candidates = sorted(lines)
+
+        return [
+            FieldMatch(field, kind, _value(scanner, match), line, match.start(), match.end())
+            for line in candidates
+            for match in scanner.regex.finditer(scan.texts[line])
+        ]
+
+    def _first_value(self, field: str, text: str) -> str:
+        scanner = self._scanners.get((field, PATTERN))
+        match = scanner.regex.search(text) if scanner else None
+        return _value(scanner, match) if match else ""
+
+    def search(self, field: str, text: str) -> str:
+        """Value of the first pattern of `field` found in `text`, or ''."""
+        for regex in self._field_regexes.get(field, ()):
+            match = regex.search(text)
+            if match:
+                value = match.group(1) if regex.groups else match.group()
+                return "".join(value.split()) if field in self._compact else value
+        return ""
+
+
+DEFAULT_MATCHER = FieldMatcher.from_yaml(DEFAULT_PATTERNS_PATH)
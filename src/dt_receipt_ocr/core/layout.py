@@ -0,0 +1,130 @@
+from typing import Mapping
+
+import cv2
+import numpy as np
+
+from dt_receipt_ocr.core.field_patterns import KEYWORD, FieldMatcher
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.orientation import downscale
+
+REGISTRATIONS = REGISTRY.counter(
+    "layout_registrations_total",
+    "Pages by layout registration result: verified, no_frame, or unverified (the ROIs were OCR'd for nothing and "
+    "the page is read again through the bands)",
+)
+UNVERIFIED_SECONDS = REGISTRY.counter(
+    "layout_unverified_seconds_total", "OCR time spent on the ROIs of unverified registrations, on top of the bands"
+)
+
+
+def order_corners(points) -> np.ndarray:
+    """Top-left, top-right, bottom-right, bottom-left."""
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = points[:, 1] - points[:, 0]
+    return np.float32([points[sums.argmin()], points[diffs.argmin()], points[sums.argmax()], points[diffs.argmax()]])
+
+
+def find_frame(gray, min_area: float = 0.3):
+    """Largest convex quadrilateral outline covering at least `min_area` of the image, or None."""
+    edges = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    image_area = gray.shape[0] * gray.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:10]:
+        if cv2.contourArea(contour) < min_area * image_area:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            return order_corners(approx)
+    return None
+
+
+class LayoutRegistrar:
+    """
+    Registers a page to a canonical form template and crops its field ROIs.
+
+    The form outline (paper edge or printed frame, see `frame`) is found on a
+    downscaled page and gives a homography from the template, `width` x
+    `height` pixels, to the page. Each ROI is then warped straight out of the
+    full-size page at template resolution, so its OCR boxes shifted by the
+    ROI origin are template coordinates, whatever the camera framing was.
+    Boxes in the config are fractions of the template; see conf/layout/.
+    """
+
+    def __init__(
+        self,
+        rois: Mapping[str, Mapping],
+        enabled: bool = True,
+        width: int = 1600,
+        height: int = 2263,
+        frame=(0.0, 0.0, 1.0, 1.0),
+        detect_side: int = 1000,
+        min_frame_area: float = 0.3,
+        max_aspect_error: float = 0.2,
+    ):
+        self.enabled = enabled
+        self.width = width
+        self.height = height
+        self.detect_side = detect_side
+        self.min_frame_area = min_frame_area
+        self.max_aspect_error = max_aspect_error
+
+        x0, y0, x1, y1 = frame
+        self.frame = np.float32([[x0 * width, y0 * height], [x1 * width, y0 * height], [x1 * width, y1 * height], [x0 * width, y1 * height]])
+        self.rois = {}
+        self.fields = {}
+        for name, roi in rois.items():
+            x0, y0, x1, y1 = roi["box"]
+            self.rois[name] = (round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height))
+            self.fields[name] = set(roi.get("fields") or [])
+
+    def register(self, img):
+        """Homography from template to page pixels, or None when no plausible frame is found."""
+        small = downscale(img, self.detect_side)
+        scale = img.shape[1] / small.shape[1]
+        quad = find_frame(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), self.min_frame_area)
+        if quad is None:
+            return None
+
+        quad_w = (np.linalg.norm(quad[1] - quad[0]) + np.linalg.norm(quad[2] - quad[3])) / 2
+        quad_h = (np.linalg.norm(quad[3] - quad[0]) + np.linalg.norm(quad[2] - quad[1])) / 2
+        frame_w, frame_h = self.frame[2] - self.frame[0]
+        if abs((quad_w / quad_h) / (frame_w / frame_h) - 1) > self.max_aspect_error:
+            return None
+        return cv2.getPerspectiveTransform(self.frame, quad * scale)
+
+    def crop(self, img, homography) -> dict:
+        """ROI name -> (ROI image, ROI origin in template pixels)."""
+        regions = {}
+        for name, (x0, y0, x1, y1) in self.rois.items():
+            # ROI pixel -> template pixel -> page pixel
+            to_page = homography @ np.float64([[1, 0, x0], [0, 1, y0], [0, 0, 1]])
+            roi = cv2.warpPerspective(
+                img, to_page, (x1 - x0, y1 - y0), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP, borderMode=cv2.BORDER_REPLICATE
+            )
+            regions[name] = (roi, (x0, y0))
+        return regions
+
+    def regions(self, img) -> dict | None:
+        if not self.enabled or not self.rois:
+            return None
+        homography = self.register(img)
+        if homography is None:
+            REGISTRATIONS.inc(result="no_frame")
+            return None
+        return self.crop(img, homography)
+
+    def verify(self, region_texts: Mapping[str, OCRLines], matcher: FieldMatcher) -> bool:
+        """Every ROI shows a label or value of one of its fields; else the registration is not trusted."""
+        for name, lines in region_texts.items():
+            fields = self.fields.get(name)
+            if not fields:
+                continue
+            matches = matcher.scan(lines.texts.tolist())
+            if not any(matches.of(field) or matches.of(field, KEYWORD) for field in fields):
+                REGISTRATIONS.inc(result="unverified")
+                return False
+        REGISTRATIONS.inc(result="verified")
+        return True
@@ -0,0 +1,127 @@
+import json
+import time
+from typing import TYPE_CHECKING
+
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.models.ocr import PQ7ModelResponse
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "LLM extraction calls by finish reason; 'length' means max_tokens cut the answer"
+)
+PROMPT_TOKENS = REGISTRY.counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM")
+CACHED_TOKENS = REGISTRY.counter(
+    "llm_cached_prompt_tokens_total", "Prompt tokens the server reported as served from its prefix cache"
+)
+COMPLETION_TOKENS = REGISTRY.counter("llm_completion_tokens_total", "Tokens generated by the LLM")
+SECONDS = REGISTRY.counter("llm_seconds_total", "Wall time spent waiting for the LLM")
+
+# Everything before the OCR text is the same bytes on every call, so an
+# OpenAI-compatible server with prefix caching (vLLM, SGLang) computes its
+# KV cache once; keep per-document values out of it.
+INSTRUCTIONS = """You are a helpful assistant. Extract information EXACTLY as it appears in the provided text, without combining with other texts.
+Return only a single valid JSON object with the shipping details, without any additional text, comments, or trailing content.
+
+Extract these fields from the OCR text of a P.Q.7 phytosanitary receipt:
+- "receipt_number": The P.Q.7 receipt number (format NP****)
+- "destination_country": Country/countries of destination as a single string
+- "transportation_mode": Method of transport
+- "total_weight": Total weight of shipment
+- "number_of_boxes": Number of boxes/cartons
+- "export_date": Date of exportation
+
+EXTRACTION RULES:
+1. For receipt_number: Look for number with format NP****
+2. For destination_country: Find text near "City and country of destination"
+- Return as a SINGLE STRING, preserving the EXACT original format
+- Include all geographical details (provinces, cities, etc.) exactly as written
+- **If multiple countries are listed, include them all in the same string (e.g., "Youyiguan CHINA, Quang Binh VIENAM, Thakhek LAO PEOPLE")**
+- **Correct misspelled country names (e.g., "CHNA" → "CHINA")**
+- Destination country should not be Thailand
+- Ignore phrases like "IMPORT AND EXPORT TRADE"
+3. For transportation_mode: Look for phrases starting with "by" (e.g., "By Train", "By Truck", "By Truck and Railway")
+4. For number_of_boxes: Look for numeric values, may include unit "CARTONS" or "cartons"
+5. For export_date: Find date near phrase "Date of exportation" and in middle or bottom keyword part. It have format dd/mm/yyyy
+6. **If you can not find any suitable information, let this field empty**
+Return ONLY the JSON object without additional text, comments, or explanations."""
+
+
+def response_schema() -> dict:
+    """Strict JSON schema of PQ7ModelResponse, for servers that constrain decoding to it."""
+    schema = PQ7ModelResponse.model_json_schema()
+    schema["additionalProperties"] = False
+    schema["required"] = list(schema["properties"])
+    return {"type": "json_schema", "json_schema": {"name": "pq7", "strict": True, "schema": schema}}
+
+
+class PQ7Extractor:
+    """
+    Extracts the P.Q.7 fields from OCR text with an OpenAI-compatible LLM.
+
+    Requests have a fixed instruction prefix, the exact response schema for
+    guided decoding and `max_tokens` sized for six short fields (about 100
+    tokens in practice), so a confused model cannot run on for thousands
+    of tokens. `suffix` is appended to the user turn, e.g. "/no_think" for
+    Qwen3. Token usage of every call is exported on /metrics.
+    """
+
+    def __init__(
+        self,
+        client: "AsyncOpenAI",
+        model: str = "Qwen3",
+        max_tokens: int = 256,
+        temperature: float = 0.2,
+        suffix: str = "",
+    ):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.suffix = suffix
+        self.response_format = response_schema()
+
+    def messages(self, document_text: str) -> list[dict]:
+        user = f"TEXT TO PROCESS:\n{document_text}"
+        if self.suffix:
+            user += f"\n{self.suffix}"
+        return [{"role": "system", "content": INSTRUCTIONS}, {"role": "user", "content": user}]
+
+    async def extract(self, document_text: str) -> PQ7ModelResponse:
+        start = time.perf_counter()
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self.messages(document_text),
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            response_format=self.response_format,
+        )
+        SECONDS.inc(time.perf_counter() - start)
+
+        choice = response.choices[0]
+        REQUESTS.inc(finish_reason=choice.finish_reason)
+        tracing.annotate(model=self.model, finish_reason=choice.finish_reason)
+        usage = response.usage
+        if usage is not None:
+            PROMPT_TOKENS.inc(usage.prompt_tokens)
+            COMPLETION_TOKENS.inc(usage.completion_tokens)
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None) if details is not None else None
+            if cached:
+                CACHED_TOKENS.inc(cached)
+            tracing.annotate(
+                prompt_tokens=usage.prompt_tokens,
+                cached_tokens=cached or 0,
+                completion_tokens=usage.completion_tokens,
+            )
+            print(
+                f"LLM usage: {usage.prompt_tokens} prompt ({cached or 0} cached), "
+                f"{usage.completion_tokens} completion, {choice.finish_reason}"
+            )
+
+        content = choice.message.content or ""
+        # Reasoning models may still emit an empty <think></think> before the JSON
+        content = content[content.find("{") :] if "{" in content else content
+        return PQ7ModelResponse.model_validate(json.loads(content))
@@ -0,0 +1,227 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.metrics import REGISTRY
+
+ADMISSIONS = REGISTRY.counter(
+    "pq7_memory_admissions_total", "Documents by admission outcome: admitted, waited (then admitted) or rejected"
+)
+ADMITTED_BYTES = REGISTRY.gauge("pq7_memory_admitted_bytes", "Estimated working memory of the documents in progress")
+PEAK_RSS = REGISTRY.gauge("process_peak_rss_bytes", "Peak resident set size of this process")
+TRACED = REGISTRY.counter("pq7_memory_traced_documents_total", "Documents whose allocations were traced")
+STAGE_PEAK = REGISTRY.counter(
+    "pq7_stage_peak_bytes_total", "Sum over traced documents of the peak bytes allocated per stage"
+)
+STAGE_PEAK_MAX = REGISTRY.gauge("pq7_stage_peak_bytes_max", "Largest peak bytes allocated by one document per stage")
+DOCUMENT_PEAK_MAX = REGISTRY.gauge("pq7_document_peak_bytes_max", "Largest peak bytes allocated by one traced document")
+BYTES_PER_PIXEL_MAX = REGISTRY.gauge(
+    "pq7_document_bytes_per_pixel_max", "Largest traced peak per decoded pixel, to tune memory.bytes_per_pixel"
+)
+
+# The document traced in this context, if any
+_traced = contextvars.ContextVar("memory_traced", default=None)
+
+
+def process_memory(pid: int | str = "self") -> dict[str, int]:
+    """
+    Memory of one process in bytes from /proc/<pid>/smaps_rollup (Linux).
+
+    `uss` (unique set size) is what the process alone costs: its private
+    clean and dirty pages. Pages still shared copy-on-write with a parent or
+    siblings show up in `shared` and are split evenly between sharers in `pss`.
+    """
+    fields = {}
+    with open(Path("/proc") / str(pid) / "smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if len(parts) == 2 and parts[1] == "kB":
+                fields[key] = int(parts[0]) * 1024
+
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def resident_bytes() -> int:
+    """Current RSS of this process, cheap enough to read per request; 0 where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def peak_resident_bytes() -> int:
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryBudgetExceeded(Exception):
+    """A document that does not fit the memory budget; `retryable` when it would fit later."""
+
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class MemoryBudget:
+    """
+    Admission control on the estimated working memory of documents.
+
+    A document is estimated at `bytes_per_pixel` times its decoded pixel
+    count (the page, its rotated and grayscale copies, the blur Laplacian,
+    OCR inputs), before anything is decoded. It starts once the estimates of
+    the documents in progress plus its own fit in `max_bytes` and, with
+    `max_rss_bytes`, the process' resident memory plus its estimate fits
+    too (a document with none in progress always starts); otherwise it waits up to `wait_seconds` for others to finish and is
+    rejected as retryable. A document alone larger than `max_bytes` is
+    rejected outright.
+
+    With `trace_every_n`, one document out of every n is traced with
+    tracemalloc and the peak bytes allocated by each pipeline `stage` are
+    exported. Traced numbers cover Python and NumPy allocations (OpenCV
+    returns NumPy arrays) but not the OCR engine's native buffers, and
+    include whatever other requests allocate meanwhile, so treat them as an
+    upper bound of the Python-visible part.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_bytes: int = 2 << 30,
+        bytes_per_pixel: float = 24,
+        max_rss_bytes: int = 0,
+        wait_seconds: float = 30,
+        trace_every_n: int = 0,
+    ):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.bytes_per_pixel = bytes_per_pixel
+        self.max_rss_bytes = max_rss_bytes
+        self.wait_seconds = wait_seconds
+        self.trace_every_n = trace_every_n
+        self.admitted = 0
+        self._changed = None
+        self._counter = itertools.count(1)
+        self._tracing = threading.Lock()
+
+    def estimate(self, pixels: int) -> int:
+        return int(pixels * self.bytes_per_pixel)
+
+    def _fits(self, estimate: int) -> bool:
+        if not self.admitted:
+            # Alone it always runs, waiting would not free anything
+            return True
+        if self.admitted + estimate > self.max_bytes:
+            return False
+        return not self.max_rss_bytes or resident_bytes() + estimate <= self.max_rss_bytes
+
+    async def _acquire(self, estimate: int) -> None:
+        if estimate > self.max_bytes:
+            ADMISSIONS.inc(result="rejected")
+            raise MemoryBudgetExceeded(
+                f"Document needs about {estimate >> 20} MiB, more than the {self.max_bytes >> 20} MiB budget",
+                retryable=False,
+            )
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        result = "admitted"
+        deadline = time.monotonic() + self.wait_seconds
+        with tracing.span("memory_admission", estimate_bytes=estimate) as span:
+            async with self._changed:
+                while not self._fits(estimate):
+                    result = "waited"
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        ADMISSIONS.inc(result="rejected")
+                        raise MemoryBudgetExceeded("Memory budget exhausted, retry later", retryable=True)
+                    # RSS only drops as memory is returned, so look again now and then
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), min(remaining, 0.25))
+                    except TimeoutError:
+                        pass
+                self.admitted += estimate
+            span.set(result=result)
+        ADMISSIONS.inc(result=result)
+        ADMITTED_BYTES.set(self.admitted)
+
+    async def _release(self, estimate: int) -> None:
+        async with self._changed:
+            self.admitted -= estimate
+            self._changed.notify_all()
+        ADMITTED_BYTES.set(self.admitted)
+
+    @asynccontextmanager
+    async def admit(self, pixels: int):
+        """Run one document of `pixels` decoded pixels within the budget; raises MemoryBudgetExceeded."""
+        estimate = self.estimate(pixels) if self.enabled else 0
+        if self.enabled:
+            await self._acquire(estimate)
+        try:
+            with self._trace(pixels):
+                yield
+        finally:
+            if self.enabled:
+                await self._release(estimate)
+            PEAK_RSS.set(peak_resident_bytes())
+
+    @contextmanager
+    def _trace(self, pixels: int):
+        if not self.trace_every_n or next(self._counter) % self.trace_every_n != 0:
+            yield
+            return
+        # One traced document at a time, tracing stays off the rest of the time
+        if not self._tracing.acquire(blocking=False):
+            yield
+            return
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        traced = {"base": tracemalloc.get_traced_memory()[0], "peak": 0}
+        token = _traced.set(traced)
+        try:
+            yield
+        finally:
+            _traced.reset(token)
+            if started:
+                tracemalloc.stop()
+            self._tracing.release()
+            TRACED.inc()
+            _raise_to(DOCUMENT_PEAK_MAX, traced["peak"])
+            if pixels:
+                _raise_to(BYTES_PER_PIXEL_MAX, round(traced["peak"] / pixels, 2))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Peak bytes allocated during `name` of a traced document; stages must not nest."""
+        traced = _traced.get()
+        if traced is None:
+            yield
+            return
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            STAGE_PEAK.inc(peak - start, stage=name)
+            _raise_to(STAGE_PEAK_MAX, peak - start, stage=name)
+            traced["peak"] = max(traced["peak"], peak - traced["base"])
+
+
+def _raise_to(gauge, value, **labels) -> None:
+    if value > gauge.value(**labels):
+        gauge.set(value, **labels)
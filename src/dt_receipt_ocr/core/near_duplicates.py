@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.models.ocr import PQ7Response
+
+LOOKUPS = REGISTRY.counter(
+    "pq7_near_duplicate_lookups_total",
+    "Near-duplicate lookups by result: hit (prior result reused), miss, or unverified (a near-identical "
+    "page was found but its receipt number did not read back the same)",
+)
+ENTRIES = REGISTRY.gauge("pq7_near_duplicate_entries", "Pages in the near-duplicate index")
+
+
+def page_hash(img, hash_size: int = 16) -> int:
+    """
+    Perceptual (average) hash of a BGR page: one bit per cell of a
+    hash_size x hash_size grey thumbnail of the inked area, set where the
+    cell is darker than the median cell. Robust to rescaling, recompression,
+    exposure and framing; on noisy photos of paper it separates documents
+    far better than a difference hash, whose bits flip between near-equal
+    blank cells.
+    """
+    # Strided sampling first, so INTER_AREA averages a few thousand pixels instead of the whole page
+    step = max(1, max(img.shape[:2]) // (hash_size * 16))
+    gray = cv2.cvtColor(np.ascontiguousarray(img[::step, ::step]), cv2.COLOR_BGR2GRAY)
+    # Crop to the ink so the framing of the photo does not shift every cell
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    x, y, w, h = cv2.boundingRect(ink)
+    if w > hash_size and h > hash_size:
+        gray = gray[y : y + h, x : x + w]
+    thumb = cv2.resize(gray, (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(thumb < np.median(thumb)).tobytes(), "big")
+
+
+class NearDuplicateIndex:
+    """
+    Recently returned results keyed by the perceptual hash of their page.
+
+    A page whose hash differs from a recent one in at most `max_distance`
+    bits is treated as another photo of the same document. With `verify`
+    the caller reads the receipt number back from the new photo before
+    reusing the prior result, which guards against different forms of the
+    same template hashing alike. At most `max_entries` results are kept,
+    least recently used first out, each for at most `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        hash_size: int = 16,
+        max_distance: int = 40,
+        max_entries: int = 4096,
+        ttl_seconds: float = 3600,
+        verify: bool = True,
+    ):
+        self.enabled = enabled
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.verify = verify
+        self._entries: OrderedDict[int, tuple[float, PQ7Response]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hash(self, img) -> int:
+        return page_hash(img, self.hash_size)
+
+    def lookup(self, page_hash: int) -> PQ7Response | None:
+        """The result of the closest recent page within `max_distance`, if any."""
+        now = time.monotonic()
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            expired = []
+            # A linear scan over a few thousand ints is well under a millisecond
+            for key, (stored, _) in self._entries.items():
+                if now - stored > self.ttl_seconds:
+                    expired.append(key)
+                    continue
+                distance = (key ^ page_hash).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+            for key in expired:
+                del self._entries[key]
+            ENTRIES.set(len(self._entries))
+            if best is None:
+                return None
+            self._entries.move_to_end(best)
+            return self._entries[best][1].model_copy()
+
+    def add(self, page_hash: int, result: PQ7Response) -> None:
+        with self._lock:
+            self._entries[page_hash] = (time.monotonic(), result.model_copy())
+            self._entries.move_to_end(page_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            ENTRIES.set(len(self._entries))
@@ -0,0 +1,31 @@
+from typing import Protocol
+
+import cv2
+import numpy as np
+
+
+class OCREngine(Protocol):
+    """
+    What the pipeline needs from an OCR engine: PaddleOCR's `ocr()` call.
+
+    `ocr(img)` takes one BGR uint8 image and returns a one-page list whose
+    item is `[[box, (text, score)], ...]`, or `[None]` when nothing is found.
+    Engines also expose PaddleOCR's stage objects `text_detector`,
+    `text_classifier` (None without angle classification) and
+    `text_recognizer` for callers that run a single stage.
+    """
+
+    def ocr(self, img, det: bool = True, rec: bool = True, cls: bool = True) -> list: ...
+
+
+def get_rotate_crop_image(img, points):
+    """Perspective-crop a text line box, rotating tall crops (counter-clockwise) to horizontal."""
+    points = np.asarray(points, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    crop = cv2.warpPerspective(img, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if crop.shape[0] / max(crop.shape[1], 1) >= 1.5:
+        crop = np.rot90(crop)
+    return crop
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from functools import cached_property
+from itertools import chain
+from typing import Iterable
+
+import numpy as np
+from jaxtyping import Float32, Int
+
+
+_CORNER_MEAN = np.tile(np.eye(2, dtype=np.float32), (4, 1)) / 4
+
+
+@dataclass(frozen=True)
+class OCRLines:
+    """
+    Columnar view of OCR output: one row per detected text line.
+
+    boxes are the four corner points (top-left, top-right, bottom-right,
+    bottom-left) in page coordinates, texts a fixed-width unicode array and
+    scores the recognition confidences. Every operation returns a new
+    instance, so derived columns (centroids, extents, lowercase texts) are
+    computed once and shared by all heuristics querying the same lines.
+    """
+
+    boxes: Float32[np.ndarray, "n 4 2"]
+    texts: np.ndarray
+    scores: Float32[np.ndarray, " n"]
+
+    @classmethod
+    def empty(cls) -> "OCRLines":
+        return cls(
+            boxes=np.empty((0, 4, 2), dtype=np.float32),
+            texts=np.empty(0, dtype=np.str_),
+            scores=np.empty(0, dtype=np.float32),
+        )
+
+    @classmethod
+    def from_paddle(cls, lines) -> "OCRLines":
+        """Build from one page of PaddleOCR output: `[[bbox, (text, score)], ...]`."""
+        if not lines:
+            return cls.empty()
+        # One flat pass over the corner coordinates: converting the nested
+        # lists directly costs twice as much for the few dozen lines of a region
+        corners = chain.from_iterable(chain.from_iterable(line[0] for line in lines))
+        boxes = np.fromiter(corners, dtype=np.float32, count=8 * len(lines)).reshape(-1, 4, 2)
+        texts = np.asarray([line[1][0].strip() for line in lines], dtype=np.str_)
+        scores = np.asarray([line[1][1] for line in lines], dtype=np.float32)
+        return cls(boxes=boxes, texts=texts, scores=scores)
+
+    @classmethod
+    def concat(cls, parts: Iterable["OCRLines"]) -> "OCRLines":
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return cls.empty()
+        return cls(
+            boxes=np.concatenate([part.boxes for part in parts]),
+            texts=np.concatenate([part.texts for part in parts]),
+            scores=np.concatenate([part.scores for part in parts]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def select(self, index) -> "OCRLines":
+        """Rows picked by a boolean mask or an integer index array."""
+        return OCRLines(boxes=self.boxes[index], texts=self.texts[index], scores=self.scores[index])
+
+    def offset(self, dx: float, dy: float) -> "OCRLines":
+        """Translate boxes from region coordinates to page coordinates."""
+        return OCRLines(
+            boxes=self.boxes + np.asarray([dx, dy], dtype=np.float32),
+            texts=self.texts,
+            scores=self.scores,
+        )
+
+    def scale(self, factor: float) -> "OCRLines":
+        """Map boxes found on a resized image back to the original resolution."""
+        return OCRLines(boxes=self.boxes * np.float32(factor), texts=self.texts, scores=self.scores)
+
+    @cached_property
+    def centroids(self) -> Float32[np.ndarray, "n 2"]:
+        # Mean of the four corners as one (n, 8) @ (8, 2) product
+        return self.boxes.reshape(-1, 8) @ _CORNER_MEAN
+
+    @cached_property
+    def mins(self) -> Float32[np.ndarray, "n 2"]:
+        """(min_x, min_y) of every box."""
+        b = self.boxes
+        return np.minimum(np.minimum(b[:, 0], b[:, 1]), np.minimum(b[:, 2], b[:, 3]))
+
+    @cached_property
+    def maxs(self) -> Float32[np.ndarray, "n 2"]:
+        """(max_x, max_y) of every box."""
+        b = self.boxes
+        return np.maximum(np.maximum(b[:, 0], b[:, 1]), np.maximum(b[:, 2], b[:, 3]))
+
+    @cached_property
+    def lowered(self) -> np.ndarray:
+        # str.lower per line beats np.char.lower on arrays this small
+        return np.asarray([text.lower() for text in self.texts.tolist()], dtype=np.str_)
+
+    def non_latin_counts(self) -> Int[np.ndarray, " n"]:
+        if not len(self):
+            return np.zeros(0, dtype=np.int64)
+        # Fixed-width unicode arrays are UCS-4 code points padded with NUL
+        codes = self.texts.view(np.uint32).reshape(len(self), -1)
+        return np.count_nonzero(codes > 127, axis=1)
+
+    def filter_mask(self, min_score: float = 0.6, min_length: int = 2, max_non_latin: float = 0.5) -> np.ndarray:
+        """Rows that are not low confidence, very short or mostly non-Latin."""
+        lengths = np.char.str_len(self.texts)
+        keep = (self.scores >= min_score) & (lengths >= min_length)
+        # Most pages are plain ASCII, which needs no per-line count
+        if len(self) and self.texts.view(np.uint32).max() > 127:
+            keep &= self.non_latin_counts() <= max_non_latin * np.maximum(lengths, 1)
+        return keep
+
+    def filter(self, min_score: float = 0.6, min_length: int = 2, max_non_latin: float = 0.5) -> "OCRLines":
+        """Drop low confidence, very short and mostly non-Latin lines."""
+        return self.select(self.filter_mask(min_score, min_length, max_non_latin))
+
+    def sort_reading_order(self, keep: np.ndarray | None = None) -> "OCRLines":
+        """
+        Top to bottom, then left to right, by box centroid. With a `keep`
+        mask, only those rows, in one selection instead of two.
+        """
+        centroids = self.centroids
+        if keep is None:
+            return self.select(np.lexsort((centroids[:, 0], centroids[:, 1])))
+        # Dropped rows sort last and are cut off
+        order = np.lexsort((centroids[:, 0], centroids[:, 1], ~keep))
+        return self.select(order[: np.count_nonzero(keep)])
+
+    def contains(self, needle: str, case_sensitive: bool = True) -> np.ndarray:
+        texts = self.texts if case_sensitive else self.lowered
+        return np.char.find(texts, needle) >= 0
+
+    def to_records(self) -> list[dict]:
+        """Plain `{"text", "bbox"}` dicts, e.g. for the LLM prompt."""
+        boxes = np.rint(self.boxes).astype(np.int32).tolist()
+        return [{"text": text, "bbox": bbox} for text, bbox in zip(self.texts.tolist(), boxes)]
+
+    def records_text(self) -> str:
+        """`str(self.to_records())`, as in the LLM prompt, without building the records."""
+        boxes = np.rint(self.boxes).astype(np.int32).reshape(-1, 8).tolist()
+        return "[" + ", ".join(
+            f"{{'text': {text!r}, 'bbox': [[{x0}, {y0}], [{x1}, {y1}], [{x2}, {y2}], [{x3}, {y3}]]}}"
+            for text, (x0, y0, x1, y1, x2, y2, x3, y3) in zip(self.texts.tolist(), boxes)
+        ) + "]"
@@ -0,0 +1,305 @@
+"""
+PaddleOCR det/cls/rec models run through ONNX Runtime on CPU.
+
+Pre- and post-processing follow PaddleOCR 2.x (DB detection, 0/180 degree
+line classifier, CTC recognition) so results match the Paddle engine, and
+the stage objects mirror PaddleOCR's `text_detector`, `text_classifier` and
+`text_recognizer` call signatures. Models are exported with
+`python -m dt_receipt_ocr.tools.onnx_export`.
+"""
+
+import math
+import time
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from dt_receipt_ocr.core.ocr_engine import get_rotate_crop_image
+
+
+def create_session(model_path: str, intra_op_num_threads: int = 0, inter_op_num_threads: int = 0):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_num_threads
+    options.inter_op_num_threads = inter_op_num_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def sorted_boxes(dt_boxes):
+    """Top to bottom, then left to right, treating boxes within 10px as one row."""
+    boxes = sorted(dt_boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+class TextDetector:
+    def __init__(
+        self,
+        session,
+        limit_side_len: int = 960,
+        limit_type: str = "max",
+        thresh: float = 0.3,
+        box_thresh: float = 0.6,
+        unclip_ratio: float = 1.5,
+        max_candidates: int = 1000,
+        min_size: int = 3,
+    ):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.limit_side_len = limit_side_len
+        self.limit_type = limit_type
+        self.thresh = thresh
+        self.box_thresh = box_thresh
+        self.unclip_ratio = unclip_ratio
+        self.max_candidates = max_candidates
+        self.min_size = min_size
+        self.mean = np.float32([0.485, 0.456, 0.406])
+        self.std = np.float32([0.229, 0.224, 0.225])
+
+    def _resize(self, img):
+        h, w = img.shape[:2]
+        if self.limit_type == "max":
+            ratio = self.limit_side_len / max(h, w) if max(h, w) > self.limit_side_len else 1.0
+        else:
+            ratio = self.limit_side_len / min(h, w) if min(h, w) < self.limit_side_len else 1.0
+        resize_h = max(int(round(h * ratio / 32) * 32), 32)
+        resize_w = max(int(round(w * ratio / 32) * 32), 32)
+        return cv2.resize(img, (resize_w, resize_h)), resize_h / h, resize_w / w
+
+    @staticmethod
+    def _mini_box(contour):
+        rect = cv2.minAreaRect(contour)
+        points = sorted(cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+        left = sorted(points[:2], key=lambda p: p[1])
+        right = sorted(points[2:], key=lambda p: p[1])
+        box = np.float32([left[0], right[0], right[1], left[1]])
+        return box, min(rect[1])
+
+    @staticmethod
+    def _box_score(bitmap, box):
+        h, w = bitmap.shape[:2]
+        xmin = int(np.clip(np.floor(box[:, 0].min()), 0, w - 1))
+        xmax = int(np.clip(np.ceil(box[:, 0].max()), 0, w - 1))
+        ymin = int(np.clip(np.floor(box[:, 1].min()), 0, h - 1))
+        ymax = int(np.clip(np.ceil(box[:, 1].max()), 0, h - 1))
+        mask = np.zeros((ymax - ymin + 1, xmax - xmin + 1), dtype=np.uint8)
+        shifted = box - np.float32([xmin, ymin])
+        cv2.fillPoly(mask, shifted.reshape(1, -1, 2).astype(np.int32), 1)
+        return cv2.mean(bitmap[ymin : ymax + 1, xmin : xmax + 1], mask)[0]
+
+    def _unclip(self, box):
+        # Offsetting a rectangle by `distance` grows each side by 2 * distance;
+        # PaddleOCR does the same with pyclipper on the polygon
+        rect = cv2.minAreaRect(box)
+        (cx, cy), (rw, rh), angle = rect
+        area, length = rw * rh, 2 * (rw + rh)
+        distance = area * self.unclip_ratio / max(length, 1e-6)
+        return cv2.boxPoints(((cx, cy), (rw + 2 * distance, rh + 2 * distance), angle))
+
+    def _boxes_from_bitmap(self, pred, bitmap, dest_w, dest_h):
+        h, w = bitmap.shape
+        contours, _ = cv2.findContours((bitmap * 255).astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[: self.max_candidates]:
+            points, sside = self._mini_box(contour)
+            if sside < self.min_size:
+                continue
+            if self._box_score(pred, points) < self.box_thresh:
+                continue
+            box, sside = self._mini_box(self._unclip(points).reshape(-1, 1, 2))
+            if sside < self.min_size + 2:
+                continue
+            box[:, 0] = np.clip(np.round(box[:, 0] / w * dest_w), 0, dest_w)
+            box[:, 1] = np.clip(np.round(box[:, 1] / h * dest_h), 0, dest_h)
+            boxes.append(box)
+        return boxes
+
+    def __call__(self, img):
+        start = time.perf_counter()
+        src_h, src_w = img.shape[:2]
+        resized, _, _ = self._resize(img)
+        tensor = ((resized.astype(np.float32) / 255.0 - self.mean) / self.std).transpose(2, 0, 1)[None]
+        pred = self.session.run(None, {self.input_name: tensor})[0][0, 0]
+
+        boxes = self._boxes_from_bitmap(pred, pred > self.thresh, src_w, src_h)
+        kept = []
+        for box in boxes:
+            box[:, 0] = np.clip(box[:, 0], 0, src_w - 1)
+            box[:, 1] = np.clip(box[:, 1], 0, src_h - 1)
+            if np.linalg.norm(box[0] - box[1]) <= 3 or np.linalg.norm(box[0] - box[3]) <= 3:
+                continue
+            kept.append(box)
+        return np.asarray(kept, dtype=np.float32).reshape(-1, 4, 2), time.perf_counter() - start
+
+
+class TextClassifier:
+    def __init__(self, session, batch_num: int = 6, thresh: float = 0.9, image_shape=(3, 48, 192)):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.batch_num = batch_num
+        self.thresh = thresh
+        self.image_shape = image_shape
+        self.labels = ["0", "180"]
+
+    def _normalize(self, img):
+        _, img_h, img_w = self.image_shape
+        h, w = img.shape[:2]
+        resized_w = min(img_w, int(math.ceil(img_h * w / h)))
+        resized = cv2.resize(img, (resized_w, img_h)).astype(np.float32).transpose(2, 0, 1) / 255
+        padded = np.zeros(self.image_shape, dtype=np.float32)
+        padded[:, :, :resized_w] = (resized - 0.5) / 0.5
+        return padded
+
+    def __call__(self, img_list):
+        start = time.perf_counter()
+        img_list = list(img_list)
+        results = [("", 0.0)] * len(img_list)
+        order = np.argsort([img.shape[1] / img.shape[0] for img in img_list])
+        for begin in range(0, len(img_list), self.batch_num):
+            batch = order[begin : begin + self.batch_num]
+            tensor = np.stack([self._normalize(img_list[i]) for i in batch])
+            probs = self.session.run(None, {self.input_name: tensor})[0]
+            for i, prob in zip(batch, probs):
+                label = int(prob.argmax())
+                results[i] = (self.labels[label], float(prob[label]))
+                if self.labels[label] == "180" and prob[label] > self.thresh:
+                    img_list[i] = cv2.rotate(img_list[i], cv2.ROTATE_180)
+        return img_list, results, time.perf_counter() - start
+
+
+class CTCLabelDecode:
+    """Greedy CTC decoding; index 0 is the blank."""
+
+    def __init__(self, char_dict_path: str, use_space_char: bool = True):
+        with open(char_dict_path, encoding="utf-8") as f:
+            characters = [line.rstrip("\r\n") for line in f]
+        if use_space_char:
+            characters.append(" ")
+        self.character = ["blank", *characters]
+
+    def __call__(self, preds, label=None):
+        indices = preds.argmax(axis=2)
+        probs = preds.max(axis=2)
+        results = []
+        for index, prob in zip(indices, probs):
+            keep = index != 0
+            keep[1:] &= index[1:] != index[:-1]
+            text = "".join(self.character[i] for i in index[keep])
+            results.append((text, float(prob[keep].mean()) if keep.any() else 0.0))
+        return results
+
+
+class TextRecognizer:
+    def __init__(self, session, decoder: CTCLabelDecode, batch_num: int = 6, image_shape=(3, 48, 320)):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        # Same attribute name as PaddleOCR's TextRecognizer, so decoders can be swapped
+        self.postprocess_op = decoder
+        self.batch_num = batch_num
+        self.image_shape = image_shape
+
+    def _normalize(self, img, max_wh_ratio):
+        _, img_h, _ = self.image_shape
+        img_w = int(img_h * max_wh_ratio)
+        h, w = img.shape[:2]
+        resized_w = min(img_w, int(math.ceil(img_h * w / h)))
+        resized = cv2.resize(img, (resized_w, img_h)).astype(np.float32).transpose(2, 0, 1) / 255
+        padded = np.zeros((3, img_h, img_w), dtype=np.float32)
+        padded[:, :, :resized_w] = (resized - 0.5) / 0.5
+        return padded
+
+    def __call__(self, img_list):
+        start = time.perf_counter()
+        _, img_h, img_w = self.image_shape
+        results = [("", 0.0)] * len(img_list)
+        ratios = [img.shape[1] / img.shape[0] for img in img_list]
+        order = np.argsort(ratios)
+        for begin in range(0, len(img_list), self.batch_num):
+            batch = order[begin : begin + self.batch_num]
+            max_wh_ratio = max(img_w / img_h, *(ratios[i] for i in batch))
+            tensor = np.stack([self._normalize(img_list[i], max_wh_ratio) for i in batch])
+            preds = self.session.run(None, {self.input_name: tensor})[0]
+            for i, result in zip(batch, self.postprocess_op(preds)):
+                results[i] = result
+        return results, time.perf_counter() - start
+
+
+class OnnxOCR:
+    """Drop-in for PaddleOCR's `ocr()` running the exported ONNX models."""
+
+    def __init__(
+        self,
+        det_model: str,
+        rec_model: str,
+        rec_char_dict_path: str,
+        cls_model: str | None = None,
+        use_angle_cls: bool = True,
+        intra_op_num_threads: int = 0,
+        inter_op_num_threads: int = 1,
+        det_limit_side_len: int = 960,
+        det_limit_type: str = "max",
+        det_db_thresh: float = 0.3,
+        det_db_box_thresh: float = 0.6,
+        det_db_unclip_ratio: float = 1.5,
+        rec_batch_num: int = 6,
+        cls_batch_num: int = 6,
+        cls_thresh: float = 0.9,
+        drop_score: float = 0.5,
+        use_space_char: bool = True,
+    ):
+        threads = {"intra_op_num_threads": intra_op_num_threads, "inter_op_num_threads": inter_op_num_threads}
+        self.drop_score = drop_score
+        self.text_detector = TextDetector(
+            create_session(det_model, **threads),
+            limit_side_len=det_limit_side_len,
+            limit_type=det_limit_type,
+            thresh=det_db_thresh,
+            box_thresh=det_db_box_thresh,
+            unclip_ratio=det_db_unclip_ratio,
+        )
+        self.text_classifier = (
+            TextClassifier(create_session(cls_model, **threads), batch_num=cls_batch_num, thresh=cls_thresh)
+            if use_angle_cls and cls_model
+            else None
+        )
+        self.text_recognizer = TextRecognizer(
+            create_session(rec_model, **threads),
+            CTCLabelDecode(rec_char_dict_path, use_space_char=use_space_char),
+            batch_num=rec_batch_num,
+        )
+
+    def ocr(self, img, det: bool = True, rec: bool = True, cls: bool = True):
+        if not det:
+            crops = img if isinstance(img, list) else [img]
+            if cls and self.text_classifier is not None:
+                crops, cls_res, _ = self.text_classifier(crops)
+                if not rec:
+                    return [cls_res]
+            rec_res, _ = self.text_recognizer(crops)
+            return [rec_res]
+
+        dt_boxes, _ = self.text_detector(img)
+        if not len(dt_boxes):
+            return [None]
+        dt_boxes = sorted_boxes(dt_boxes)
+        if not rec:
+            return [[box.tolist() for box in dt_boxes]]
+
+        crops = [get_rotate_crop_image(img, box) for box in dt_boxes]
+        if cls and self.text_classifier is not None:
+            crops, _, _ = self.text_classifier(crops)
+        rec_res, _ = self.text_recognizer(crops)
+
+        lines = [
+            [box.tolist(), (text, score)]
+            for box, (text, score) in zip(dt_boxes, rec_res)
+            if score >= self.drop_score
+        ]
+        return [lines or None]
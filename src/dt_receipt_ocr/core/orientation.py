@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from dt_receipt_ocr.core.ocr_engine import OCREngine, get_rotate_crop_image
+
+# cv2.rotate codes for counter-clockwise page rotations
+ROTATE_CODES = {90: cv2.ROTATE_90_COUNTERCLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_CLOCKWISE}
+
+
+def downscale(img, max_side: int):
+    """Shrink so the longer side is at most `max_side`; returns a view when already small enough."""
+    h, w = img.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return img
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+@dataclass(frozen=True)
+class PageOrientation:
+    # Counter-clockwise rotation that makes the page upright: 0, 90, 180 or 270
+    angle: int = 0
+    # Remaining tilt of the text lines in degrees, positive when they descend to the right
+    skew: float = 0.0
+    # False when the lines disagree; OCR should then classify every line itself
+    confident: bool = False
+
+    def apply(self, img, min_skew: float = 0.5, max_skew: float = 10.0):
+        # A guess is worse than nothing: OCR with cls=True reads either way up
+        if not self.confident:
+            return img
+        if self.angle:
+            img = cv2.rotate(img, ROTATE_CODES[self.angle])
+        if min_skew <= abs(self.skew) <= max_skew:
+            h, w = img.shape[:2]
+            matrix = cv2.getRotationMatrix2D((w / 2, h / 2), self.skew, 1.0)
+            img = cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        return img
+
+
+class PageOrienter:
+    """
+    One orientation decision per page instead of one per text line.
+
+    Text lines are detected on a downscaled page: their long axis tells 0/180
+    from 90/270 degrees and gives the skew. The angle classifier then only
+    runs on the `sample_lines` longest lines, and their majority picks the
+    side. The result is only `confident` when both votes agree by at least
+    `min_agreement`.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_side: int = 960,
+        sample_lines: int = 8,
+        min_lines: int = 3,
+        min_agreement: float = 0.8,
+        min_skew: float = 0.5,
+        max_skew: float = 10.0,
+    ):
+        self.enabled = enabled
+        self.max_side = max_side
+        self.sample_lines = sample_lines
+        self.min_lines = min_lines
+        self.min_agreement = min_agreement
+        self.min_skew = min_skew
+        self.max_skew = max_skew
+
+    def detect(self, small, ocr: OCREngine) -> PageOrientation:
+        """`small` is the downscaled page in the channel order the engine expects."""
+        if not self.enabled:
+            return PageOrientation()
+        boxes, _ = ocr.text_detector(small)
+        boxes = np.asarray(boxes if boxes is not None else [], dtype=np.float32).reshape(-1, 4, 2)
+
+        # Long axis of every line; near-square boxes (single characters) have none
+        edge_a = boxes[:, 1] - boxes[:, 0]
+        edge_b = boxes[:, 2] - boxes[:, 1]
+        len_a = np.linalg.norm(edge_a, axis=1)
+        len_b = np.linalg.norm(edge_b, axis=1)
+        long_edge = np.where((len_a >= len_b)[:, None], edge_a, edge_b)
+        length = np.maximum(len_a, len_b)
+        keep = length >= 2 * np.minimum(len_a, len_b)
+        boxes, long_edge, length = boxes[keep], long_edge[keep], length[keep]
+        if len(boxes) < self.min_lines:
+            return PageOrientation()
+
+        vertical = np.abs(long_edge[:, 1]) > np.abs(long_edge[:, 0])
+        is_vertical = bool(vertical.mean() > 0.5)
+        axis_agreement = float(max(vertical.mean(), 1 - vertical.mean()))
+        lines = np.flatnonzero(vertical == is_vertical)
+
+        classifier = getattr(ocr, "text_classifier", None)
+        if classifier is None:
+            return PageOrientation(skew=self._skew(long_edge[lines], 0))
+
+        # Tall crops are turned counter-clockwise, so an upright result on a
+        # vertical page means the page needs the same 90 degree turn
+        picked = lines[np.argsort(-length[lines])[: self.sample_lines]]
+        _, results, _ = classifier([get_rotate_crop_image(small, boxes[i]) for i in picked])
+        upside_down = float(np.mean([label == "180" for label, _ in results]))
+        flipped = upside_down > 0.5
+        if is_vertical:
+            angle = 270 if flipped else 90
+        else:
+            angle = 180 if flipped else 0
+
+        return PageOrientation(
+            angle=angle,
+            skew=self._skew(long_edge[lines], angle),
+            confident=bool(min(axis_agreement, max(upside_down, 1 - upside_down)) >= self.min_agreement),
+        )
+
+    @staticmethod
+    def _skew(edges, angle: int) -> float:
+        # Line directions after the page rotation, folded into [-90, 90)
+        dx, dy = edges[:, 0], edges[:, 1]
+        if angle in (90, 270):
+            dx, dy = (dy, -dx) if angle == 90 else (-dy, dx)
+        angles = np.degrees(np.arctan2(dy, dx))
+        angles = (angles + 90) % 180 - 90
+        return float(np.median(angles)) if len(angles) else 0.0
+
+    def orient(self, img, small, ocr: OCREngine) -> tuple[np.ndarray, PageOrientation]:
+        """
+        Detect on `small` and return the full-size `img` turned upright, or
+        unchanged when the lines disagree.
+        """
+        orientation = self.detect(small, ocr)
+        return orientation.apply(img, self.min_skew, self.max_skew), orientation
@@ -1,18 +1,89 @@
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+
 from dependency_injector.wiring import inject
 import numpy as np
 from jaxtyping import UInt8
 
-from dt_receipt_ocr.deps.container import OCRDep, OpenAIDep
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER, KEYWORD, FieldMatcher, FieldMatches
+from dt_receipt_ocr.core.layout import UNVERIFIED_SECONDS
+from dt_receipt_ocr.core.near_duplicates import LOOKUPS as NEAR_DUPLICATE_LOOKUPS
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.orientation import PageOrientation, downscale
+from dt_receipt_ocr.core.spatial_index import SpatialIndex
+from dt_receipt_ocr.deps.container import (
+    CoarseToFineDep,
+    FieldDecodingDep,
+    FieldMatcherDep,
+    LayoutDep,
+    LLMExtractorDep,
+    MemoryBudgetDep,
+    NearDuplicatesDep,
+    OCRPoolDep,
+    OCRDep,
+    OrienterDep,
+    PrescreenDep,
+    ProfilerDep,
+    TiledReaderDep,
+)
 from dt_receipt_ocr.models.ocr import PQ7Response, PQ7ModelResponse
-from PIL.Image import Image
 
 import cv2
-import re
 
-async def extract(img_pil: Image):
-    img_np = np.array(img_pil)
+@inject
+async def extract(img_np: UInt8[np.ndarray, "h w 3"], matcher: FieldMatcherDep, extra_pages=()):
+    """
+    `img_np` is the BGR page produced by `PageDecoder`; `extra_pages`, the
+    following pages of a PDF, are only read in tiling mode.
+    """
+    return await _extract(img_np, matcher, extra_pages=extra_pages)
+
+
+@dataclass(frozen=True)
+class PageText:
+    """What the OCR stage hands to the LLM stage; picklable, so the stages can run in different processes."""
+
+    ocr_text: str
+    lines: OCRLines
+
+
+@inject
+async def _extract(img_np: UInt8[np.ndarray, "h w 3"], matcher: FieldMatcher, memory: MemoryBudgetDep, extra_pages=()):
+    with memory.stage("ocr"):
+        page = read_page(img_np, matcher=matcher, extra_pages=extra_pages)
+    if isinstance(page, PQ7Response):
+        return page
+    with memory.stage("llm"):
+        return await complete_page(page, matcher=matcher)
 
-    if detect_blur(img_np)[0]:
+
+@inject
+def read_page(
+    img_np: UInt8[np.ndarray, "h w 3"], matcher: FieldMatcherDep, profiler: ProfilerDep, extra_pages=()
+) -> PageText | PQ7Response:
+    """
+    OCR stage: everything up to the LLM call, CPU bound.
+
+    Blurry pages short-circuit to their final response; unusable pages raise
+    PrescreenRejected.
+    """
+    # Only this synchronous stage is profiled: while a request awaits the
+    # LLM, the event loop runs other requests, which would land in its profile
+    with profiler.profile("pq7_read_page"):
+        return _read_page(img_np, matcher, extra_pages)
+
+
+def _read_page(img_np: UInt8[np.ndarray, "h w 3"], matcher: FieldMatcher, extra_pages=()) -> PageText | PQ7Response:
+    # Raises PrescreenRejected for dark, blank or washed out pages
+    with tracing.span("check_exposure"):
+        _check_exposure(img_np)
+
+    with tracing.span("detect_blur", height=img_np.shape[0], width=img_np.shape[1]) as span:
+        is_blurry, laplacian_variance = detect_blur(img_np)
+        span.set(laplacian_variance=round(float(laplacian_variance), 1), is_blurry=bool(is_blurry))
+    if is_blurry:
         return PQ7Response(
             receipt_number = '',
             destination_country = '',
@@ -23,31 +94,44 @@ async def extract(img_pil: Image):
             is_blur = True
             )
 
-    enhance_img = enhance_image(img_np)
-    ocr_result = _extract_document(img_np)
-    # cv2.imwrite('normal_image.jpg', img_np)
-    # cv2.imwrite('enhance_image.jpg', enhance_img)
+    img_np, orientation = _orient_page(img_np)
+    # Raises PrescreenRejected when configured to and the page does not look like a P.Q.7
+    with tracing.span("probe_form") as span:
+        upper_right = _probe_form(img_np, cls=not orientation.confident)
+        span.set(reused=upper_right is not None)
+    ocr_result = _extract_document(img_np, orientation=orientation, extra_pages=extra_pages, upper_right=upper_right)
     ocr_text = "# EXTRACTED FIELDS\n"  # Fixed string quote
     for field_name, field_value in ocr_result["region_texts"].items():
-        ocr_text += f"{field_name}: {field_value}\n"  # Changed print() to string concatenation, added newline
-    total_weight = extract_total_weight(flatten_dict_list(ocr_result["region_texts"]))
-    export_date = extract_epxorted_date(ocr_result['region_texts']['middle'])
+        ocr_text += f"{field_name}: {field_value.records_text()}\n"  # Changed print() to string concatenation, added newline
+    return PageText(ocr_text=ocr_text, lines=ocr_result["raw_text"])
+
+
+@inject
+async def complete_page(page: PageText, matcher: FieldMatcherDep) -> PQ7Response:
+    """LLM stage: field heuristics on the OCR'd lines plus the LLM extraction."""
+    index = SpatialIndex(page.lines)
+    matches = matcher.scan(index.lines.texts.tolist())
+    total_weight = extract_total_weight(index, matches)
+    export_date = extract_epxorted_date(index, matches)
 
     print(export_date)
 
     # Process text with AI
-    ai_extraction = await _process_document_with_ai(ocr_text)
+    with tracing.span("process_document_with_ai", text_chars=len(page.ocr_text), lines=len(page.lines)):
+        ai_extraction = await _process_document_with_ai(page.ocr_text)
     ai_extraction.total_weight = total_weight
     ai_extraction.export_date = export_date
+    _fill_missing_fields(ai_extraction, index, matches)
 
     print(ai_extraction)
 
-    ai_extraction = post_process_ai_response(ai_extraction)
+    with tracing.span("post_process_ai_response"):
+        ai_extraction = post_process_ai_response(ai_extraction, matcher)
 
     pq7_response = PQ7Response(**ai_extraction.model_dump())
     return pq7_response
 
-def post_process_ai_response(ai_extraction: PQ7ModelResponse):
+def post_process_ai_response(ai_extraction: PQ7ModelResponse, matcher: FieldMatcher = DEFAULT_MATCHER):
     tranport_mode = ai_extraction.transportation_mode.lower()
     if ('**' in ai_extraction.receipt_number):
         ai_extraction.receipt_number = ""
@@ -56,8 +140,9 @@ def post_process_ai_response(ai_extraction: PQ7ModelResponse):
     country = ai_extraction.destination_country.lower()
     if ("vietnam" not in country) and ("china" not in country) and ("lao" not in country) and ("campuchia") not in country:
         ai_extraction.destination_country = ""
-    if re.search(r'NP\d+', ai_extraction.receipt_number, re.IGNORECASE):
-            ai_extraction.receipt_number = re.search(r'NP\d+', ai_extraction.receipt_number, re.IGNORECASE).group()
+    receipt_number = matcher.search("receipt_number", ai_extraction.receipt_number)
+    if receipt_number:
+        ai_extraction.receipt_number = receipt_number
     return ai_extraction
 
 def enhance_image(img_np):
@@ -69,10 +154,8 @@ def enhance_image(img_np):
         output_path (str): Path to save the processed image
     """
      
-    img = cv2.cvtColor(img_np, cv2.COLOR_RGB2BGR)
-
     # Apply Gaussian blur to reduce noise
-    blurred = cv2.GaussianBlur(img, (3, 3), 0)
+    blurred = cv2.GaussianBlur(img_np, (3, 3), 0)
     
     # Convert to LAB color space (better for color adjustments)
     lab = cv2.cvtColor(blurred, cv2.COLOR_BGR2LAB)
@@ -85,8 +168,8 @@ def enhance_image(img_np):
     # Merge the CLAHE enhanced L-channel back with the a and b channels
     enhanced_lab = cv2.merge((l_clahe, a, b))
     
-    # Convert back to RGB color space
-    enhanced_img = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2RGB)
+    # Convert back to BGR color space
+    enhanced_img = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
     
     return enhanced_img
     
@@ -103,146 +186,274 @@ def detect_blur(img_np, threshold=100):
     """
     
     # Convert to grayscale
-    gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+    gray = cv2.cvtColor(img_np, cv2.COLOR_BGR2GRAY)
     
-    # Calculate the Laplacian of the image and compute the variance
-    laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    laplacian_variance = laplacian.var()
+    # Calculate the Laplacian of the image and compute the variance. The
+    # Laplacian of uint8 pixels fits in int16 (a quarter of a float64 page)
+    # and meanStdDev needs no float copy of it, unlike ndarray.var()
+    laplacian = cv2.Laplacian(gray, cv2.CV_16S)
+    _, stddev = cv2.meanStdDev(laplacian)
+    laplacian_variance = float(stddev[0, 0]) ** 2
     
     # Determine if the image is blurry based on the variance
     is_blurry = laplacian_variance < threshold
     
     return is_blurry, laplacian_variance
 
-def extract_epxorted_date(bboxes):
-    # Pattern để trích xuất định dạng dd/mm/yyyy
-    pattern = r'\d{2}/\d{2}/\d{4}'
-    
-    # Tìm tất cả các kết quả khớp
-    for box in bboxes:
-        dates_found = re.findall(pattern, box['text'])
-        if dates_found:
-            print(f"Tìm thấy {len(dates_found)} ngày tháng:")
-            return dates_found[0]
+def _anchors(matches: FieldMatches, field: str) -> list[int]:
+    # Lines holding one of the field's label keywords, in reading order
+    return sorted({match.line for match in matches.of(field, KEYWORD)})
+
+
+def _value_near(matches: FieldMatches, field: str, lines) -> str:
+    # First pattern value of the field on these lines, in this order; only
+    # they are searched, not the whole page
+    for i in lines:
+        value = matches.value_at(field, i)
+        if value:
+            return value
+    return ""
+
+
+def extract_epxorted_date(index: SpatialIndex, matches: FieldMatches):
+    # dd/mm/yyyy next to or under "Date of exportation", else the first date found
+    for anchor in _anchors(matches, "export_date"):
+        nearby = [*index.right_of(anchor).tolist(), *index.below(anchor)[:2].tolist()]
+        date = _value_near(matches, "export_date", nearby)
+        if date:
+            return date
+    return matches.first("export_date")
+
+
+def extract_total_weight(index: SpatialIndex, matches: FieldMatches):
+    """
+    Read the total weight printed under the "Quantity" column header.
+
+    The weight is the nearest line below the anchor in the same column; the
+    ".0000" line is the weight repeated with its unit, which is appended to
+    the result.
+    """
+    texts = matches.texts
+    anchors = _anchors(matches, "total_weight")
+    if not anchors:
+        return ""
+    anchor = anchors[-1]
+
+    unit_rows = [i for i, text in enumerate(texts) if ".0000" in text]
+    unit = texts[unit_rows[-1]] if unit_rows else ""
+
+    for i in index.below(anchor).tolist():
+        if ".0000" not in texts[i] and texts[i] != texts[anchor]:
+            return "".join(char for char in texts[i] if char.isdigit()) + "," + unit
     return ""
 
-def extract_total_weight(bboxes):
-    def is_overlap(bbox1, bbox2):
-        x1, y1, x2, y2 = bbox1
-        x3, y3, x4, y4 = bbox2
-
-        if (x1 <= x3 <= x2 or x1 <= x4 <= x2) and (y2 < y3 or y4 < y1):
-            return True
-        return False
-
-    def is_not_second_row(text):
-        return ".0000" not in text
-
-    potential = []
-    anchor_box = {}
-    unit = ""
-    for i, bbox in enumerate(bboxes):
-        if bbox["text"].lower() == "quantity" or 'quant' in  bbox["text"].lower():
-            potential = bboxes[i:]
-            anchor_box = bboxes[i]
-        if ".0000" in bbox["text"]:
-            unit = bbox["text"]
-
-    for bbox in potential:
-        if (
-            is_overlap(bbox["bbox"], anchor_box["bbox"])
-            and bbox["text"] != anchor_box["text"]
-            and is_not_second_row(bbox["text"])
-        ):
-            return "".join(char for char in bbox["text"] if char.isdigit()) + "," + unit
+
+def extract_transportation_mode(index: SpatialIndex, matches: FieldMatches):
+    # "By Truck", "By Train", ... next to or under "Means of conveyance"
+    for anchor in _anchors(matches, "transportation_mode"):
+        nearby = [*index.right_of(anchor).tolist(), *index.below(anchor)[:3].tolist()]
+        mode = _value_near(matches, "transportation_mode", nearby)
+        if mode:
+            return mode
+    return ""
+
+
+def extract_number_of_boxes(index: SpatialIndex, matches: FieldMatches):
+    # "1,250 CARTONS" under "Number and description of packages"
+    for anchor in _anchors(matches, "number_of_boxes"):
+        count = _value_near(matches, "number_of_boxes", index.below(anchor)[:3].tolist())
+        if count:
+            return int(count.replace(",", ""))
+    return 0
+
+
+def extract_destination_country(index: SpatialIndex, matches: FieldMatches):
+    # Every entry on the first row under "City and country of destination",
+    # e.g. "Youyiguan CHINA, Quang Binh VIETNAM"
+    for anchor in _anchors(matches, "destination_country"):
+        line_height = index.maxs[anchor, 1] - index.mins[anchor, 1]
+        below = index.below(anchor, max_distance=3 * line_height)
+        if below.size:
+            column = set(below.tolist())
+            row = [str(index.lines.texts[i]) for i in index.row_of(below[0]) if i in column]
+            return ", ".join(dict.fromkeys(row))
     return ""
 
 
-def flatten_dict_list(data):
-    return [item for k, v in data.items() for item in v]
+def _fill_missing_fields(ai_extraction: PQ7ModelResponse, index: SpatialIndex, matches: FieldMatches):
+    # Rule-based fallbacks for fields the LLM left empty
+    if not ai_extraction.transportation_mode:
+        ai_extraction.transportation_mode = extract_transportation_mode(index, matches)
+    if not ai_extraction.number_of_boxes:
+        ai_extraction.number_of_boxes = extract_number_of_boxes(index, matches)
+    if not ai_extraction.destination_country:
+        ai_extraction.destination_country = extract_destination_country(index, matches)
+
+
+def flatten_dict_list(data: dict[str, OCRLines]) -> OCRLines:
+    return OCRLines.concat(data.values())
 
 
 @inject
-async def _process_document_with_ai(document_text, openai_client: OpenAIDep):
-    # Make the API call
-    
+async def _process_document_with_ai(document_text, extractor: LLMExtractorDep):
     print("Document text", document_text)
-    
-    response = await openai_client.beta.chat.completions.parse(
-        # model="RedHatAI/Mistral-Small-3.1-24B-Instruct-2503-quantized.w4a16",
-        model = "Qwen3",
-        messages=[
-            {
-            "role": "system",
-            "content": """You are a helpful assistant. Extract information EXACTLY as it appears in the provided text, without combining with other texts.
-            Return only a single valid JSON object with the shipping details, without any additional text, comments, or trailing content /no_think""",
-            },
-            {
-                "role": "user",
-                "content": f"""
-        Extract shipping details from the text below and return ONLY a valid JSON object with these fields:
-        - "receipt_number": The P.Q.7 receipt number (format NP****)
-        - "destination_countries": Country/countries of destination as a single string
-        - "transportation_mode": Method of transport
-        - "total_weight": Total weight of shipment
-        - "number_of_boxes": Number of boxes/cartons
-        - "export_date"
-
-        EXTRACTION RULES:
-        1. For receipt_number: Look for number with format NP****
-        2. For destination_countries: Find text near "City and country of destination"
-        - Return as a SINGLE STRING, preserving the EXACT original format
-        - Include all geographical details (provinces, cities, etc.) exactly as written
-        - **If multiple countries are listed, include them all in the same string (e.g., "Youyiguan CHINA, Quang Binh VIENAM, Thakhek LAO PEOPLE")**
-        - **Correct misspelled country names (e.g., "CHNA" → "CHINA")**
-        - Destination country should not be Thailand
-        - Ignore phrases like "IMPORT AND EXPORT TRADE"
-        3. For transportation_mode: Look for phrases starting with "by" (e.g., "By Train", "By Truck", "By Truck and Railway")
-        4. For number_of_boxes: Look for numeric values, may include unit "CARTONS" or "cartons"
-        5. For export_date: For export_date: Find date near phrase "Date of exportation" and in middle or bottom keyword part. It have format dd/mm/yyyy
-        6. **If you can not find any suitable information, let this field empty**
-        Return ONLY the JSON object without additional text, comments, or explanations.
-
-        TEXT TO PROCESS:
-        {document_text}
-        """,
-            },
-        ],
-        temperature=0.2,
-        max_tokens=3096,
-        response_format=PQ7ModelResponse
-    )
-
-    # Return the AI response
-    return response.choices[0].message.parsed
-
-
-def _extract_document(img_np: UInt8):
+    return await extractor.extract(document_text)
+
+
+@inject
+def _extract_document(
+    img_np: UInt8,
+    layout: LayoutDep,
+    matcher: FieldMatcherDep,
+    tiler: TiledReaderDep,
+    orientation: PageOrientation | None = None,
+    extra_pages=(),
+    upper_right: OCRLines | None = None,
+):
     result = {"status": "success", "fields": {}, "region_texts": {}, "raw_text": []}
 
-    region_texts = _extract_fields_by_region_wrapper(img_np)
+    if orientation is None:
+        img_np, orientation = _orient_page(img_np)
+    cls = not orientation.confident
+
+    # Big scans and multi-page PDFs: parallel tiles instead of a few giant regions
+    pages = [img_np, *(orientation.apply(page) for page in extra_pages)]
+    if tiler.wanted(pages):
+        region_texts = _read_tiled(pages, cls=cls)
+        result["region_texts"] = region_texts
+        result["raw_text"] = flatten_dict_list(region_texts)
+        return result
+
+    # Tight field ROIs from the registered template, else the fixed bands
+    region_texts = None
+    rois = layout.regions(img_np)
+    if rois is not None:
+        start = time.perf_counter()
+        region_texts = _extract_text_from_regions(rois, cls=cls, expected=layout.fields)
+        if not layout.verify(region_texts, matcher):
+            print("Layout registration not confirmed by OCR, falling back to bands")
+            UNVERIFIED_SECONDS.inc(time.perf_counter() - start)
+            region_texts = None
+    if region_texts is None:
+        region_texts = _extract_fields_by_region_wrapper(img_np, cls=cls, upper_right=upper_right)
     result["region_texts"] = region_texts
     # Combine all text for raw_text
-    all_text = []
-    for texts in region_texts.values():
-        all_text.extend(texts)
-    result["raw_text"] = all_text
+    result["raw_text"] = flatten_dict_list(region_texts)
 
     return result
 
 
-def _extract_fields_by_region_wrapper(img_np: UInt8):
+@inject
+def _check_exposure(img_np: UInt8, prescreen: PrescreenDep):
+    prescreen.check_exposure(img_np)
+
+
+@inject
+def _probe_form(
+    img_np: UInt8, prescreen: PrescreenDep, ocr: OCRDep, matcher: FieldMatcherDep, cls: bool = False
+) -> OCRLines | None:
+    return prescreen.probe_form(img_np, ocr, matcher, cls=cls)
+
+
+@inject
+def _orient_page(img_np: UInt8, orienter: OrienterDep, ocr: OCRDep) -> tuple[UInt8, PageOrientation]:
+    # Detection runs on a small copy; only the rotation touches the full page
+    small = downscale(img_np, orienter.max_side)
+    with tracing.span("orient_page", height=img_np.shape[0], width=img_np.shape[1]) as span:
+        img_np, orientation = orienter.orient(img_np, small, ocr)
+        span.set(angle=orientation.angle, confident=orientation.confident)
+    print(f"Page orientation: {orientation}")
+    return img_np, orientation
+
+
+@inject
+def read_receipt_number(img_np: UInt8, prescreen: PrescreenDep, ocr: OCRDep, matcher: FieldMatcherDep) -> str:
+    # Orientation plus one small corner OCR, a fraction of the full pipeline
+    img_np, orientation = _orient_page(img_np)
+    lines = prescreen.corner_lines(img_np, ocr, cls=not orientation.confident)
+    return next(filter(None, (matcher.search("receipt_number", text) for text in lines.texts.tolist())), "")
+
+
+@inject
+def find_near_duplicate(img_np: UInt8, index: NearDuplicatesDep) -> tuple[int | None, PQ7Response | None]:
+    """
+    Hash of the page and the result of a near-identical page processed
+    recently, if any; the hash is None when the index is disabled.
+    """
+    if not index.enabled:
+        return None, None
+    page_hash = index.hash(img_np)
+    prior = index.lookup(page_hash)
+    if prior is None:
+        NEAR_DUPLICATE_LOOKUPS.inc(result="miss")
+        return page_hash, None
+    if index.verify and read_receipt_number(img_np) != prior.receipt_number:
+        NEAR_DUPLICATE_LOOKUPS.inc(result="unverified")
+        return page_hash, None
+    NEAR_DUPLICATE_LOOKUPS.inc(result="hit")
+    return page_hash, prior
+
+
+@inject
+def remember_page(page_hash: int | None, result: PQ7Response, index: NearDuplicatesDep) -> None:
+    if page_hash is not None:
+        index.add(page_hash, result)
+
+
+@inject
+def _read_tiled(pages, tiler: TiledReaderDep, pool: OCRPoolDep, matcher: FieldMatcherDep, cls: bool = True):
+    with tracing.span("tiled_ocr", pages=len(pages)) as span:
+        page_lines = tiler.read(pages, pool, matcher, cls=cls)
+        span.set(lines=sum(len(lines) for lines in page_lines))
+    return {
+        f"page_{number}": _clean_region_lines(lines, (0, 0))
+        for number, lines in enumerate(page_lines, start=1)
+    }
+
+
+def _extract_fields_by_region_wrapper(img_np: UInt8, cls: bool = True, upper_right: OCRLines | None = None):
     # Extract regions from the image
     regions = _extract_regions_from_image(img_np)
+    region_texts = {}
+    if upper_right is not None:
+        # Same crop, already OCR'd at full size by the prescreen probe
+        _, origin = regions.pop("upper_right")
+        region_texts["upper_right"] = _clean_region_lines(upper_right, origin)
+    region_texts.update(_extract_text_from_regions(regions, cls=cls))
+    return region_texts
 
+
+def _extract_text_from_regions(regions, cls: bool = True, expected=None):
     # Extract text from each region
     region_texts = {}
-    for region_name, region_image in regions.items():
-        region_texts[region_name] = _extract_text_from_region(region_image, region_name)
+    for region_name, (region_image, origin) in regions.items():
+        region_fields = (expected or {}).get(region_name, ())
+        height, width = region_image.shape[:2]
+        with tracing.span("extract_text_from_region", region=region_name, height=height, width=width) as span:
+            region_texts[region_name] = _read_region(region_image, origin, cls=cls, expected=region_fields)
+            span.set(lines=len(region_texts[region_name]))
 
     return region_texts
 
 
+@inject
+def _read_region(
+    region_img_np,
+    origin,
+    reader: CoarseToFineDep,
+    ocr: OCRDep,
+    matcher: FieldMatcherDep,
+    field_decoding: FieldDecodingDep,
+    cls: bool = True,
+    expected=(),
+) -> OCRLines:
+    # A registered ROI holds known fields; only those are decoded with their charset
+    with field_decoding.only(expected) if expected else nullcontext():
+        if not reader.enabled:
+            return _extract_text_from_region(region_img_np, origin, ocr=ocr, cls=cls)
+        return _clean_region_lines(reader.read(region_img_np, ocr, matcher, cls=cls, expected=expected), origin)
+
+
 def _extract_regions_from_image(img_np):
     # Get image dimensions
     height, width = img_np.shape[:2]
@@ -258,72 +469,30 @@ def _extract_regions_from_image(img_np):
         "bottom": [0, int(height * 0.6), width, height],
     }
 
-    # Extract each region
+    # Extract each region, as a view into the page, together with its
+    # top-left corner in the page
     region_images = {}
     for region_name, coords in regions.items():
         x_start, y_start, x_end, y_end = coords
-        region_images[region_name] = img_np[y_start:y_end, x_start:x_end].copy()
+        region_image = img_np[y_start:y_end, x_start:x_end]
+        region_images[region_name] = (region_image, (x_start, y_start))
 
         # # Save region for debugging (optional)
-        cv2.imwrite(f"region_{region_name}_api.jpg", region_images[region_name])
+        # cv2.imwrite(f"region_{region_name}_api.jpg", region_image)
 
     return region_images
 
 
 @inject
-def _extract_text_from_region(region_img_np, region_name, ocr: OCRDep):
-
-    temp_region_path = f"temp_{region_name}_api.jpg"
-    # cv2.imwrite(temp_region_path, region_img_np)
-  
-    results = ocr.ocr(region_img_np[...,::-1], cls=True)
-    height, width = region_img_np.shape[:2]
-
-    # Process results
-    region_text = []
-    if results[0]:
-        for bbox, (text, confidence) in results[0]:
-            text = text.strip()
-
-            if region_name == "upper_right":
-                # update min_x bbox[0] -> (min_x, min_y)
-                bbox[0][0] = bbox[0][0] + int(width * 0.5)
-                bbox[1][0] = bbox[1][0] + int(width * 0.5)
-                bbox[2][0] = bbox[2][0] + int(width * 0.5)
-                bbox[3][0] = bbox[3][0] + int(width * 0.5)
-            if region_name == "middle":
-                # update min_y
-                bbox[0][1] = bbox[0][1] + int(height * 0.2)
-                bbox[1][1] = bbox[1][1] + int(height * 0.2)
-                bbox[2][1] = bbox[2][1] + int(height * 0.2)
-                bbox[3][1] = bbox[3][1] + int(height * 0.2)
-
-            if region_name == "bottom":
-                # update y
-                bbox[0][1] = bbox[0][1] + int(height * 0.6)
-                bbox[1][1] = bbox[1][1] + int(height * 0.6)
-                bbox[2][1] = bbox[2][1] + int(height * 0.6)
-                bbox[3][1] = bbox[3][1] + int(height * 0.6)
-
-            # Skip low confidence or very short results
-            if confidence < 0.6 or len(text) < 2:
-                continue
-
-            # Filter for English characters
-            non_latin_count = sum(1 for char in text if ord(char) > 127)
-            if (
-                non_latin_count / len(text) > 0.5
-            ):  # Skip if more than 50% non-Latin characters
-                continue
-
-            region_text.append({"text": text, "bbox": bbox})
-
-    # Sort results by position (top to bottom, then left to right)
-    region_text.sort(
-        key=lambda x: (
-            sum([p[1] for p in x["bbox"]]) / 4,
-            sum([p[0] for p in x["bbox"]]) / 4,
-        )
-    )
-
-    return region_text
+def _extract_text_from_region(region_img_np, origin, ocr: OCRDep, cls: bool = True) -> OCRLines:
+    # cls=False once the page itself has been turned upright
+    results = ocr.ocr(region_img_np, cls=cls)
+    return _clean_region_lines(OCRLines.from_paddle(results[0]), origin)
+
+
+def _clean_region_lines(lines: OCRLines, origin) -> OCRLines:
+    # Move boxes into page coordinates, drop low confidence, very short and
+    # mostly non-Latin lines, then sort top to bottom, left to right
+    x_start, y_start = origin
+    lines = lines.offset(x_start, y_start)
+    return lines.sort_reading_order(keep=lines.filter_mask(min_score=0.6, min_length=2, max_non_latin=0.5))
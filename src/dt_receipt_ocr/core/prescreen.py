@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+
+from dt_receipt_ocr.core.field_patterns import FieldMatcher
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.core.ocr_engine import OCREngine
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.orientation import downscale
+
+UNDEREXPOSED = "PQ7_UNDEREXPOSED"
+OVEREXPOSED = "PQ7_OVEREXPOSED"
+BLANK_PAGE = "PQ7_BLANK_PAGE"
+NO_TEXT = "PQ7_NO_TEXT"
+NOT_PQ7 = "PQ7_NOT_PQ7"
+
+SCREENED = REGISTRY.counter("pq7_prescreen_total", "Uploads pre-screened before full OCR")
+REJECTIONS = REGISTRY.counter("pq7_prescreen_rejections_total", "Uploads rejected before full OCR, by error code")
+PROBE_MISSES = REGISTRY.counter(
+    "pq7_prescreen_probe_misses_total",
+    "Probed pages without a form or receipt number in the upper right corner, by the error code "
+    "they get when reject_misses is on",
+)
+
+
+class PrescreenRejected(Exception):
+    """The upload cannot be a readable P.Q.7; `error_code` is returned to the client."""
+
+    def __init__(self, error_code: str, detail: str = ""):
+        super().__init__(f"{error_code}: {detail}" if detail else error_code)
+        self.error_code = error_code
+        self.detail = detail
+
+
+class Prescreen:
+    """
+    Cheap checks that reject unusable uploads before full OCR and the LLM call.
+
+    `check_exposure` samples the page down to about `max_side`: it is too
+    dark when its mean brightness is below `min_brightness`, and blank or
+    washed out (mostly clipped highlights rather than one flat color) when
+    less than `min_ink` of it is at least `ink_contrast` darker than the
+    background. `probe_form` OCRs the upper-right corner at `probe_side` and
+    looks for a pattern of one of `probe_fields` there, the "P.Q.7" form
+    number or the "NP..." receipt number. A miss is only counted unless
+    `reject_misses` is set: glare or a cropped corner should not cost a
+    readable form its result.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_side: int = 640,
+        min_brightness: float = 40,
+        ink_contrast: int = 60,
+        min_ink: float = 0.002,
+        max_clipped: float = 0.5,
+        probe: bool = True,
+        probe_side: int = 960,
+        probe_fields=("form_number", "receipt_number"),
+        reject_misses: bool = False,
+    ):
+        self.enabled = enabled
+        self.max_side = max_side
+        self.min_brightness = min_brightness
+        self.ink_contrast = ink_contrast
+        self.min_ink = min_ink
+        self.max_clipped = max_clipped
+        self.probe = probe
+        self.probe_side = probe_side
+        self.probe_fields = set(probe_fields)
+        self.reject_misses = reject_misses
+
+    def _reject(self, error_code: str, detail: str = ""):
+        REJECTIONS.inc(error_code=error_code)
+        raise PrescreenRejected(error_code, detail)
+
+    def check_exposure(self, img) -> None:
+        if not self.enabled:
+            return
+        SCREENED.inc()
+        # Every step-th pixel is plenty for histogram statistics and costs no resize
+        step = max(1, -(-max(img.shape[:2]) // self.max_side))
+        gray = cv2.cvtColor(np.ascontiguousarray(img[::step, ::step]), cv2.COLOR_BGR2GRAY)
+        hist = np.bincount(gray.ravel(), minlength=256) / gray.size
+        cdf = np.cumsum(hist)
+
+        brightness = float(hist @ np.arange(256))
+        if brightness < self.min_brightness:
+            self._reject(UNDEREXPOSED, f"mean brightness {brightness:.0f}")
+
+        background = int(np.searchsorted(cdf, 0.5))
+        ink = float(cdf[background - self.ink_contrast]) if background >= self.ink_contrast else 0.0
+        if ink < self.min_ink:
+            clipped = float(hist[250:].sum())
+            spread = int(np.searchsorted(cdf, 0.99)) - int(np.searchsorted(cdf, 0.01))
+            if clipped > self.max_clipped and spread > 8:
+                self._reject(OVEREXPOSED, f"{clipped:.0%} clipped, {ink:.2%} ink")
+            self._reject(BLANK_PAGE, f"{ink:.2%} ink")
+
+    def _miss(self, error_code: str, detail: str = ""):
+        PROBE_MISSES.inc(error_code=error_code)
+        if self.reject_misses:
+            self._reject(error_code, detail)
+
+    @staticmethod
+    def corner(img):
+        """Upper right corner of the upright page, where the form and receipt numbers are."""
+        height, width = img.shape[:2]
+        return img[: int(height * 0.3), width // 2 :]
+
+    def corner_lines(self, img, ocr: OCREngine, cls: bool = False) -> OCRLines:
+        """OCR of the corner at `probe_side`, in the downscaled corner's pixels."""
+        return OCRLines.from_paddle(ocr.ocr(downscale(self.corner(img), self.probe_side), cls=cls)[0])
+
+    def probe_form(self, img, ocr: OCREngine, matcher: FieldMatcher, cls: bool = False) -> OCRLines | None:
+        """
+        `img` is the upright page. Returns the corner lines when the corner
+        was read at full size, so the caller need not OCR it again.
+        """
+        if not self.enabled or not self.probe:
+            return None
+        lines = self.corner_lines(img, ocr, cls=cls)
+        if not len(lines):
+            self._miss(NO_TEXT)
+        else:
+            matches = matcher.scan(lines.texts.tolist())
+            if not any(matches.of(field) for field in self.probe_fields):
+                self._miss(NOT_PQ7, "no form or receipt number in the upper right corner")
+        return lines if max(self.corner(img).shape[:2]) <= self.probe_side else None
@@ -0,0 +1,46 @@
+import cProfile
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class RequestProfiler:
+    """
+    Opt-in cProfile hook that samples one request out of every `every_n`.
+
+    Each sampled request is dumped as a `.prof` file into `output_dir`, readable
+    with `python -m pstats` or snakeviz. Only one request is profiled at a time;
+    overlapping sampled requests simply run unprofiled. cProfile records
+    everything the calling thread runs, so wrap synchronous code only: around
+    an `await` the other coroutines the event loop runs would be recorded too.
+    """
+
+    def __init__(self, enabled: bool = False, every_n: int = 100, output_dir: str = "profiles"):
+        self.enabled = enabled
+        self.every_n = max(1, int(every_n))
+        self.output_dir = Path(output_dir)
+        self._counter = itertools.count(1)
+        self._active = threading.Lock()
+
+    @contextmanager
+    def profile(self, name: str):
+        if not self.enabled or next(self._counter) % self.every_n != 0:
+            yield
+            return
+        if not self._active.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.output_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(self.output_dir / f"{name}-{time.time_ns()}.prof")
+        finally:
+            self._active.release()
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+from dt_receipt_ocr.core.metrics import REGISTRY
+
+T = TypeVar("T")
+
+CALLS = REGISTRY.counter("singleflight_calls_total", "Calls entering a single-flight group")
+COALESCED = REGISTRY.counter(
+    "singleflight_coalesced_total", "Calls that joined an execution already in flight instead of starting one"
+)
+CANCELLED = REGISTRY.counter(
+    "singleflight_cancelled_total", "Executions cancelled because every caller waiting on them went away"
+)
+IN_FLIGHT = REGISTRY.gauge("singleflight_in_flight", "Executions currently running")
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts `factory()` as a task; callers arriving
+    while it runs await the same task and get its result or exception. A
+    caller being cancelled (a client disconnecting) never cancels the shared
+    task for the others; the task is only cancelled once no caller is left
+    waiting on it. Keys are forgotten as soon as their execution finishes,
+    so this is not a cache.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: dict[Hashable, _Flight] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        CALLS.inc(flight=self.name)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            IN_FLIGHT.inc(flight=self.name)
+            flight.task.add_done_callback(lambda _: self._finished(key, flight))
+        else:
+            COALESCED.inc(flight=self.name)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                CANCELLED.inc(flight=self.name)
+                flight.task.cancel()
+
+    def _finished(self, key: Hashable, flight: _Flight) -> None:
+        IN_FLIGHT.dec(flight=self.name)
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Nobody may be left to await a cancelled-for-lack-of-callers task
+        if not flight.task.cancelled():
+            flight.task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
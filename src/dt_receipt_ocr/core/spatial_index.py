@@ -0,0 +1,123 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+
+
+class SpatialIndex:
+    """
+    Uniform grid over the boxes of one document's OCR lines.
+
+    Every line is registered in each grid cell its bounding rectangle touches,
+    so rectangle queries only test the lines of the cells they cover. Below
+    `min_grid_lines` lines, as on a single P.Q.7 page, building the grid costs
+    more than it saves and queries test every line instead. Queries return
+    integer indices into `lines`.
+
+    The tests themselves run on plain floats: for the few dozen candidates
+    of a query, a Python loop is several times faster than the dozen NumPy
+    calls of a vectorized one.
+    """
+
+    def __init__(self, lines: OCRLines, cells_per_side: int = 16, min_grid_lines: int = 200):
+        self.lines = lines
+        self.mins = lines.mins
+        self.maxs = lines.maxs
+        self.centroids = lines.centroids
+        # (x0, y0, x1, y1, cx, cy) of every line
+        self._rects = np.concatenate([self.mins, self.maxs, self.centroids], axis=1).tolist()
+        self._grid = None
+        if len(lines) and len(lines) >= min_grid_lines:
+            self._build_grid(cells_per_side)
+
+    def _build_grid(self, cells_per_side: int) -> None:
+        self._origin = self.mins.min(axis=0)
+        self._end = self.maxs.max(axis=0)
+        self._cell = np.maximum((self._end - self._origin) / cells_per_side, 1.0)
+
+        first_cells = self._cell_of(self.mins)
+        last_cells = self._cell_of(self.maxs)
+        self._last_cell = last_cells.max(axis=0).tolist()
+        grid = defaultdict(list)
+        for i, ((cx0, cy0), (cx1, cy1)) in enumerate(zip(first_cells.tolist(), last_cells.tolist())):
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    grid[cx, cy].append(i)
+        self._grid = dict(grid)
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def _cell_of(self, points) -> np.ndarray:
+        return np.floor((points - self._origin) / self._cell).astype(np.int64)
+
+    def find(self, keyword: str) -> np.ndarray:
+        """Indices of lines containing `keyword`, case-insensitively."""
+        return np.flatnonzero(self.lines.contains(keyword.lower(), case_sensitive=False))
+
+    def within(self, rect, fully: bool = False) -> np.ndarray:
+        """
+        Lines intersecting `rect` = (x0, y0, x1, y1), or entirely inside it
+        with `fully=True`, in index order.
+        """
+        return np.asarray(self._within(*rect, fully=fully), dtype=np.int64)
+
+    def _within(self, x0, y0, x1, y1, fully: bool = False) -> list[int]:
+        if not self._rects or x1 < x0 or y1 < y0:
+            return []
+        if self._grid is not None:
+            rects = self._rects
+            candidates = [(i, rects[i]) for i in self._grid_candidates(x0, y0, x1, y1)]
+        else:
+            candidates = enumerate(self._rects)
+        if fully:
+            return [
+                i for i, (rx0, ry0, rx1, ry1, _, _) in candidates
+                if rx0 >= x0 and ry0 >= y0 and rx1 <= x1 and ry1 <= y1
+            ]
+        return [
+            i for i, (rx0, ry0, rx1, ry1, _, _) in candidates
+            if rx1 >= x0 and ry1 >= y0 and rx0 <= x1 and ry0 <= y1
+        ]
+
+    def _grid_candidates(self, x0, y0, x1, y1) -> list[int]:
+        # Unbounded queries stop at the lines' extent
+        corners = np.clip(np.asarray([[x0, y0], [x1, y1]], dtype=np.float64), self._origin, self._end)
+        (cx0, cy0), (cx1, cy1) = self._cell_of(corners).tolist()
+        last_cx, last_cy = self._last_cell
+        candidates = set()
+        for cx in range(max(cx0, 0), min(cx1, last_cx) + 1):
+            for cy in range(max(cy0, 0), min(cy1, last_cy) + 1):
+                candidates.update(self._grid.get((cx, cy), ()))
+        return sorted(candidates)
+
+    def below(self, anchor: int, max_distance: float = math.inf) -> np.ndarray:
+        """
+        Lines under `anchor` that share part of its column, nearest first.
+
+        A line counts as below once its centroid is under the anchor's bottom
+        edge, which tolerates slightly skewed boxes.
+        """
+        ax0, _, ax1, ay1, _, _ = self._rects[anchor]
+        rects = self._rects
+        found = [i for i in self._within(ax0, ay1, ax1, ay1 + max_distance) if rects[i][5] > ay1]
+        found.sort(key=lambda i: (rects[i][1], rects[i][0]))
+        return np.asarray(found, dtype=np.int64)
+
+    def right_of(self, anchor: int, max_distance: float = math.inf) -> np.ndarray:
+        """Lines on the same row as `anchor` and right of it, nearest first."""
+        _, ay0, ax1, ay1, _, _ = self._rects[anchor]
+        rects = self._rects
+        found = [i for i in self._within(ax1, ay0, ax1 + max_distance, ay1) if rects[i][4] > ax1]
+        found.sort(key=lambda i: rects[i][0])
+        return np.asarray(found, dtype=np.int64)
+
+    def row_of(self, index: int) -> np.ndarray:
+        """Lines whose centroid lies within the vertical span of line `index`, left to right."""
+        _, y0, _, y1, _, _ = self._rects[index]
+        rects = self._rects
+        found = [i for i in self._within(-math.inf, y0, math.inf, y1) if y0 <= rects[i][5] <= y1]
+        found.sort(key=lambda i: rects[i][0])
+        return np.asarray(found, dtype=np.int64)
@@ -0,0 +1,172 @@
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+
+from dt_receipt_ocr.core.field_patterns import FieldMatcher
+from dt_receipt_ocr.core.metrics import REGISTRY
+from dt_receipt_ocr.core.ocr_engine import OCREngine
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+
+TILES = REGISTRY.counter(
+    "ocr_tiles_total", "Tiles of tiled OCR by outcome: read, or skipped once every required field was found"
+)
+SEAM_DUPLICATES = REGISTRY.counter("ocr_tile_seam_duplicates_total", "Lines dropped as duplicates across tile seams")
+
+
+def tile_grid(height: int, width: int, tile_side: int, overlap: int) -> list[tuple[int, int, int, int]]:
+    """(x0, y0, x1, y1) of tiles of at most `tile_side` sharing `overlap` pixels, in reading order."""
+
+    def starts(length: int) -> list[int]:
+        if length <= tile_side:
+            return [0]
+        count = -(-(length - overlap) // (tile_side - overlap))
+        # Spread the tiles evenly instead of leaving a sliver at the end
+        step = (length - tile_side) / (count - 1)
+        return [round(i * step) for i in range(count)]
+
+    return [
+        (x, y, min(x + tile_side, width), min(y + tile_side, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def dedupe_seams(lines: OCRLines, min_overlap: float = 0.5) -> OCRLines:
+    """
+    Drop lines read twice in the overlap of two tiles.
+
+    A line is a duplicate when its box overlaps a longer line's box by
+    `min_overlap` of its own area and its text is contained in the other's
+    (a line cut by a seam is a fragment of the same line read whole in the
+    neighbouring tile), or when the two boxes almost coincide.
+    """
+    if len(lines) < 2:
+        return lines
+    mins, maxs = lines.mins, lines.maxs
+    sizes = np.maximum(maxs - mins, 1e-3)
+    areas = sizes[:, 0] * sizes[:, 1]
+    inter = np.clip(np.minimum(maxs[:, None], maxs[None]) - np.maximum(mins[:, None], mins[None]), 0, None)
+    inter_area = inter[..., 0] * inter[..., 1]
+    # Row i: how much of line i is covered by line j
+    covered = inter_area / areas[:, None]
+    np.fill_diagonal(covered, 0)
+
+    lengths = np.char.str_len(lines.texts)
+    texts = lines.lowered.tolist()
+    drop = np.zeros(len(lines), dtype=bool)
+    for i, j in zip(*np.nonzero(covered >= min_overlap)):
+        if drop[i] or drop[j]:
+            continue
+        # Keep the longer reading, or the higher score of two equal ones
+        if (lengths[i], lines.scores[i]) > (lengths[j], lines.scores[j]):
+            continue
+        if texts[i] in texts[j] or min(covered[i, j], covered[j, i]) >= 0.9:
+            drop[i] = True
+    SEAM_DUPLICATES.inc(int(drop.sum()))
+    return lines.select(~drop)
+
+
+class OCRPool:
+    """
+    Up to `size` OCR engines for reading tiles in parallel threads.
+
+    The first is the process' shared engine; the others are built by
+    `factory` on first use, so memory only grows once tiling is used.
+    """
+
+    def __init__(self, primary: OCREngine, factory, size: int = 4):
+        self.size = max(1, size)
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._idle.put(primary)
+        self._created = 1
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def engine(self):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = self._created < self.size
+                if grow:
+                    self._created += 1
+            engine = self._factory() if grow else self._idle.get()
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+
+class TiledReader:
+    """
+    OCR of pages too large for one detection pass, and of multi-page PDFs.
+
+    Each page is cut into tiles of `tile_side` pixels overlapping by
+    `overlap` (more than the tallest text line), which are read in parallel
+    by `workers` engines in reading order across pages. Once every one of
+    `required_fields` has matched a pattern, tiles not started yet are
+    skipped. Pages are stacked top to bottom in the returned coordinates.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        tile_side: int = 1280,
+        overlap: int = 96,
+        min_side: int = 2400,
+        workers: int = 4,
+        required_fields=(),
+    ):
+        self.enabled = enabled
+        self.tile_side = tile_side
+        self.overlap = overlap
+        self.min_side = min_side
+        self.workers = max(1, workers)
+        self.required_fields = set(required_fields)
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="ocr-tile")
+
+    def wanted(self, pages: list) -> bool:
+        return self.enabled and (len(pages) > 1 or max(pages[0].shape[:2]) > self.min_side)
+
+    def _read_tile(self, pool: OCRPool, tile, origin, cls: bool) -> OCRLines:
+        with pool.engine() as engine:
+            lines = OCRLines.from_paddle(engine.ocr(tile, cls=cls)[0])
+        return lines.offset(*origin)
+
+    def read(self, pages: list, pool: OCRPool, matcher: FieldMatcher, cls: bool = False) -> list[OCRLines]:
+        """Lines of every page, seams deduplicated, in stacked page coordinates."""
+        tiles = []
+        top = 0
+        for page_index, page in enumerate(pages):
+            height, width = page.shape[:2]
+            for x0, y0, x1, y1 in tile_grid(height, width, self.tile_side, self.overlap):
+                tiles.append((page_index, page[y0:y1, x0:x1], (x0, y0 + top)))
+            top += height
+
+        parts = [[] for _ in pages]
+        missing = set(self.required_fields)
+        pending = {}
+        next_tile = 0
+        while next_tile < len(tiles) or pending:
+            # Keep every worker busy, starting tiles in reading order
+            while next_tile < len(tiles) and len(pending) < self.workers and (missing or not self.required_fields):
+                page_index, tile, origin = tiles[next_tile]
+                future = self._executor.submit(self._read_tile, pool, tile, origin, cls)
+                pending[future] = page_index
+                next_tile += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                lines = future.result()
+                parts[pending.pop(future)].append(lines)
+                TILES.inc(result="read")
+                if missing:
+                    matches = matcher.scan(lines.texts.tolist())
+                    missing = {field for field in missing if not matches.of(field)}
+        TILES.inc(len(tiles) - next_tile, result="skipped")
+        return [dedupe_seams(OCRLines.concat(page_parts)) for page_parts in parts]
@@ -0,0 +1,328 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from dt_receipt_ocr.core.metrics import REGISTRY
+
+TRACES = REGISTRY.counter("traces_total", "Traces recorded, by outcome: exported, dropped (export queue full) or failed")
+
+# The trace being recorded and its innermost open span
+_trace = contextvars.ContextVar("trace", default=None)
+_span = contextvars.ContextVar("span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace_id: str, parent_id: str | None, name: str, attributes: dict):
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoSpan:
+    """What `span` yields outside a trace, so callers can always `.set()`."""
+
+    def set(self, **attributes) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        # Appended to from threads too (asyncio.to_thread copies the context)
+        self.spans: list[Span] = []
+
+
+def current_trace_id() -> str | None:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def current_traceparent() -> str:
+    """W3C `traceparent` naming the current span, to continue the trace in another process; '' outside a trace."""
+    current = _span.get()
+    if _trace.get() is None or current is None:
+        return ""
+    return f"00-{current.trace_id}-{current.span_id}-01"
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time the enclosed block as a child of the current span; a no-op costing
+    one context variable lookup when no trace is being recorded.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield NO_SPAN
+        return
+    parent = _span.get()
+    current = Span(trace.trace_id, parent.span_id if parent else None, name, attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _span.reset(token)
+        trace.spans.append(current)
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the current span, e.g. token counts known deep inside a call."""
+    current = _span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+class JsonlExporter:
+    """One JSON line per trace, with all its spans, for `tools.waterfall`."""
+
+    def __init__(self, path: str = "traces/spans.jsonl"):
+        self.path = Path(path)
+
+    def export(self, spans: list[Span]) -> None:
+        record = {
+            "trace_id": spans[0].trace_id,
+            "spans": [span.to_dict() for span in sorted(spans, key=lambda span: span.start_ns)],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as out:
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpExporter:
+    """
+    OTLP/HTTP JSON exporter, for any OpenTelemetry collector, Jaeger,
+    Tempo, ... listening on `endpoint` (usually http://<host>:4318/v1/traces).
+    """
+
+    def __init__(self, endpoint: str = "http://localhost:4318/v1/traces", service_name: str = "dt-receipt-ocr", timeout: float = 5):
+        import httpx
+
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.Client(timeout=timeout)
+
+    def payload(self, spans: list[Span]) -> dict:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "dt_receipt_ocr"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                                    "name": span.name,
+                                    # SERVER for the root span, finished last, else INTERNAL
+                                    "kind": 2 if span is spans[-1] else 1,
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns),
+                                    "attributes": [
+                                        {"key": key, "value": _otlp_value(value)}
+                                        for key, value in span.attributes.items()
+                                    ],
+                                    # STATUS_CODE_ERROR or UNSET
+                                    "status": {"code": 2, "message": span.error} if span.error else {},
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, spans: list[Span]) -> None:
+        self._client.post(self.endpoint, json=self.payload(spans)).raise_for_status()
+
+
+class Tracer:
+    """
+    Records one trace per request (or queue job) and hands finished traces
+    to `exporter` on a background thread, so a slow collector never delays
+    responses; when `max_queue` traces are waiting, new ones are dropped.
+    `sample_rate` is the fraction of traces recorded.
+    """
+
+    def __init__(self, enabled: bool = False, exporter=None, sample_rate: float = 1.0, max_queue: int = 1000):
+        self.enabled = enabled and exporter is not None
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(
+        self,
+        name: str,
+        trace_id: str | None = None,
+        parent_id: str | None = None,
+        sampled: bool | None = None,
+        **attributes,
+    ):
+        """
+        Root span of a new trace, continuing `trace_id` when given; yields
+        None when not sampled. `sampled` is the caller's decision, e.g. the
+        traceparent flag; without one, a continued trace is recorded and a
+        new one with probability `sample_rate`.
+        """
+        if sampled is None:
+            sampled = trace_id is not None or random.random() < self.sample_rate
+        if not self.enabled or not sampled:
+            yield None
+            return
+        trace = Trace(trace_id or _new_id(16))
+        root = Span(trace.trace_id, parent_id, name, attributes)
+        trace_token = _trace.set(trace)
+        span_token = _span.set(root)
+        try:
+            yield root
+        except BaseException as error:
+            root.error = f"{type(error).__name__}: {error}"
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _span.reset(span_token)
+            _trace.reset(trace_token)
+            trace.spans.append(root)
+            self._submit(trace.spans)
+
+    def _submit(self, spans: list[Span]) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._export_loop, name="trace-export", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            TRACES.inc(result="dropped")
+
+    def _export_loop(self) -> None:
+        while True:
+            spans = self._queue.get()
+            try:
+                self.exporter.export(spans)
+                TRACES.inc(result="exported")
+            except Exception as error:
+                TRACES.inc(result="failed")
+                print("Trace export failed:", error)
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until the traces recorded so far are exported."""
+        if self._thread is not None:
+            self._queue.join()
+
+
+def parse_traceparent(header: str) -> tuple[str | None, str | None, bool | None]:
+    """(trace id, parent span id, sampled flag) of a W3C `traceparent` header, or Nones."""
+    parts = header.strip().split("-")
+    if (
+        len(parts) == 4
+        and len(parts[1]) == 32
+        and len(parts[2]) == 16
+        and parts[1] != "0" * 32
+        and len(parts[3]) == 2
+        and all(char in "0123456789abcdef" for char in parts[3])
+    ):
+        return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+    return None, None, None
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware recording a trace per request under `prefix` with the
+    app's `state.tracer`. An incoming W3C `traceparent` is continued when
+    its sampled flag is set and not recorded when it is not, and the trace
+    id is returned in the X-Trace-Id header.
+    """
+
+    def __init__(self, app, prefix: str = "/dt"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        tracer = getattr(scope["app"].state, "tracer", None) if "app" in scope else None
+        if (
+            scope["type"] != "http"
+            or tracer is None
+            or not tracer.enabled
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        trace_id, parent_id, sampled = parse_traceparent(headers.get("traceparent", ""))
+        name = f"{scope['method']} {scope['path']}"
+        # Chunked or malformed requests are traced too, with no length
+        declared = headers.get("content-length", "")
+        content_length = int(declared) if declared.isdigit() else 0
+        with tracer.trace(name, trace_id, parent_id, sampled, content_length=content_length) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def traced_send(message):
+                if message["type"] == "http.response.start":
+                    root.set(status=message["status"])
+                    message = {
+                        **message,
+                        "headers": [*message.get("headers", []), (b"x-trace-id", root.trace_id.encode())],
+                    }
+                await send(message)
+
+            await self.app(scope, receive, traced_send)
@@ -1 +1 @@
-from .container import HttpClientDep, OCRDep, Container
+from .container import ContentFlightDep, DispatcherDep, HttpClientDep, MemoryBudgetDep, OCRDep, PageDecoderDep, UploadLimitDep, UrlFlightDep, Container
@@ -1,10 +1,63 @@
 import httpx
-from typing import Annotated
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated
 
 from dependency_injector import containers, providers
 from dependency_injector.wiring import Provide
-from paddleocr import PaddleOCR
-from openai import AsyncOpenAI
+
+from dt_receipt_ocr.core.broker import Dispatcher, RedisBroker, SQLiteBroker
+from dt_receipt_ocr.core.capture import TrafficRecorder
+from dt_receipt_ocr.core.coarse_to_fine import CoarseToFine
+from dt_receipt_ocr.core.decode import PageDecoder
+from dt_receipt_ocr.core.field_decoding import FieldDecoding
+from dt_receipt_ocr.core.field_patterns import FieldMatcher
+from dt_receipt_ocr.core.layout import LayoutRegistrar
+from dt_receipt_ocr.core.llm import PQ7Extractor
+from dt_receipt_ocr.core.memory import MemoryBudget
+from dt_receipt_ocr.core.near_duplicates import NearDuplicateIndex
+from dt_receipt_ocr.core.ocr_engine import OCREngine
+from dt_receipt_ocr.core.orientation import PageOrienter
+from dt_receipt_ocr.core.prescreen import Prescreen
+from dt_receipt_ocr.core.profiling import RequestProfiler
+from dt_receipt_ocr.core.singleflight import SingleFlight
+from dt_receipt_ocr.core.tiling import OCRPool, TiledReader
+from dt_receipt_ocr.core.tracing import JsonlExporter, OtlpExporter, Tracer
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from paddleocr import PaddleOCR
+
+
+PACKAGE_DIR = Path(__file__).parents[1]
+ONNX_MODEL_KEYS = ("det_model", "rec_model", "cls_model", "rec_char_dict_path")
+
+
+def init_paddle_ocr(params: dict, field_decoding: FieldDecoding | None = None) -> "PaddleOCR":
+    # Importing paddle takes seconds, so it happens when the engine is first
+    # built (warmup or first request), not on every import of the package
+    from paddleocr import PaddleOCR
+
+    params = {key: value for key, value in params.items() if key != "engine"}
+    engine = PaddleOCR(**params)
+    return field_decoding.install(engine) if field_decoding else engine
+
+
+def init_onnx_ocr(params: dict, field_decoding: FieldDecoding | None = None) -> OCREngine:
+    # onnxruntime is only needed when this engine is selected
+    from dt_receipt_ocr.core.onnx_ocr import OnnxOCR
+
+    params = {key: value for key, value in params.items() if key != "engine"}
+    for key in ONNX_MODEL_KEYS:
+        if params.get(key):
+            params[key] = str(PACKAGE_DIR / params[key])
+    engine = OnnxOCR(**params)
+    return field_decoding.install(engine) if field_decoding else engine
+
+
+def init_openai_client(base_url: str, api_key: str) -> "AsyncOpenAI":
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(base_url=base_url, api_key=api_key)
 
 
 async def init_http_client():
@@ -14,23 +67,177 @@ async def init_http_client():
 
 class Container(containers.DeclarativeContainer):
     cfg = providers.Configuration()
-    ocr = providers.Singleton(
-        PaddleOCR,
-        use_angle_cls=True,
-        lang="en",
-        use_gpu=True,
-        det_db_thresh=0.3,
-        det_db_box_thresh=0.5,
-        det_db_unclip_ratio=1.8,
-        rec_batch_num=6,
-        drop_score=0.6,
+    field_matcher = providers.Singleton(FieldMatcher, cfg.patterns)
+    field_decoding = providers.Singleton(
+        FieldDecoding, enabled=cfg.field_decoding.enabled, patterns=cfg.patterns, matcher=field_matcher
+    )
+    ocr = providers.Selector(
+        cfg.ocr.engine,
+        paddle=providers.Singleton(init_paddle_ocr, cfg.ocr, field_decoding),
+        onnx=providers.Singleton(init_onnx_ocr, cfg.ocr, field_decoding),
+    )
+    # Fresh engines with the same parameters, for the tiling pool
+    ocr_factory = providers.Selector(
+        cfg.ocr.engine,
+        paddle=providers.Factory(init_paddle_ocr, cfg.ocr, field_decoding),
+        onnx=providers.Factory(init_onnx_ocr, cfg.ocr, field_decoding),
     )
+    ocr_pool = providers.Singleton(OCRPool, primary=ocr, factory=ocr_factory.provider, size=cfg.tiling.workers)
     http_client = providers.Resource(init_http_client)
     openai_client = providers.Singleton(
-        AsyncOpenAI, base_url=cfg.openai.base_url, api_key=cfg.openai.api_key
+        init_openai_client, base_url=cfg.openai.base_url, api_key=cfg.openai.api_key
+    )
+    llm_extractor = providers.Singleton(
+        PQ7Extractor,
+        client=openai_client,
+        model=cfg.openai.model,
+        max_tokens=cfg.openai.max_tokens,
+        temperature=cfg.openai.temperature,
+        suffix=cfg.openai.suffix,
+    )
+    profiler = providers.Singleton(
+        RequestProfiler,
+        enabled=cfg.profiling.enabled,
+        every_n=cfg.profiling.every_n,
+        output_dir=cfg.profiling.output_dir,
+    )
+    capture = providers.Singleton(
+        TrafficRecorder,
+        enabled=cfg.capture.enabled,
+        path=cfg.capture.path,
+        store_documents=cfg.capture.store_documents,
+        documents_dir=cfg.capture.documents_dir,
+    )
+    tracing_exporter = providers.Selector(
+        cfg.tracing.exporter,
+        jsonl=providers.Singleton(JsonlExporter, path=cfg.tracing.path),
+        otlp=providers.Singleton(
+            OtlpExporter, endpoint=cfg.tracing.otlp_endpoint, service_name=cfg.tracing.service_name
+        ),
+    )
+    tracer = providers.Singleton(
+        Tracer,
+        enabled=cfg.tracing.enabled,
+        exporter=tracing_exporter,
+        sample_rate=cfg.tracing.sample_rate,
+    )
+    near_duplicates = providers.Singleton(
+        NearDuplicateIndex,
+        enabled=cfg.near_duplicates.enabled,
+        hash_size=cfg.near_duplicates.hash_size,
+        max_distance=cfg.near_duplicates.max_distance,
+        max_entries=cfg.near_duplicates.max_entries,
+        ttl_seconds=cfg.near_duplicates.ttl_seconds,
+        verify=cfg.near_duplicates.verify,
+    )
+    broker = providers.Selector(
+        cfg.dispatch.broker,
+        sqlite=providers.Singleton(
+            SQLiteBroker,
+            path=cfg.dispatch.sqlite_path,
+            lease_seconds=cfg.dispatch.lease_seconds,
+            max_attempts=cfg.dispatch.max_attempts,
+            result_ttl=cfg.dispatch.result_timeout,
+        ),
+        redis=providers.Singleton(
+            RedisBroker,
+            url=cfg.dispatch.redis_url,
+            lease_seconds=cfg.dispatch.lease_seconds,
+            max_attempts=cfg.dispatch.max_attempts,
+            result_ttl=cfg.dispatch.result_timeout,
+        ),
+    )
+    dispatcher = providers.Singleton(
+        Dispatcher,
+        mode=cfg.dispatch.mode,
+        # The provider itself, so inline mode never connects to a broker
+        broker=broker.provider,
+        result_timeout=cfg.dispatch.result_timeout,
+    )
+    memory = providers.Singleton(
+        MemoryBudget,
+        enabled=cfg.memory.enabled,
+        max_bytes=cfg.memory.max_bytes,
+        bytes_per_pixel=cfg.memory.bytes_per_pixel,
+        max_rss_bytes=cfg.memory.max_rss_bytes,
+        wait_seconds=cfg.memory.wait_seconds,
+        trace_every_n=cfg.memory.trace_every_n,
+    )
+    url_flight = providers.Singleton(SingleFlight, "url")
+    content_flight = providers.Singleton(SingleFlight, "content")
+    layout = providers.Singleton(
+        LayoutRegistrar,
+        rois=cfg.layout.rois,
+        enabled=cfg.layout.enabled,
+        width=cfg.layout.width,
+        height=cfg.layout.height,
+        frame=cfg.layout.frame,
+        detect_side=cfg.layout.detect_side,
+        min_frame_area=cfg.layout.min_frame_area,
+        max_aspect_error=cfg.layout.max_aspect_error,
+    )
+    prescreen = providers.Singleton(
+        Prescreen,
+        enabled=cfg.prescreen.enabled,
+        max_side=cfg.prescreen.max_side,
+        min_brightness=cfg.prescreen.min_brightness,
+        ink_contrast=cfg.prescreen.ink_contrast,
+        min_ink=cfg.prescreen.min_ink,
+        max_clipped=cfg.prescreen.max_clipped,
+        probe=cfg.prescreen.probe,
+        probe_side=cfg.prescreen.probe_side,
+        probe_fields=cfg.prescreen.probe_fields,
+        reject_misses=cfg.prescreen.reject_misses,
+    )
+    region_reader = providers.Singleton(
+        CoarseToFine,
+        enabled=cfg.coarse_to_fine.enabled,
+        max_side=cfg.coarse_to_fine.max_side,
+        min_score=cfg.coarse_to_fine.min_score,
+        fields=cfg.coarse_to_fine.fields,
+    )
+    decoder = providers.Singleton(
+        PageDecoder,
+        target_side=cfg.decode.target_side,
+        pdf_size=cfg.decode.pdf_size,
+        max_pages=cfg.decode.max_pages,
+    )
+    tiler = providers.Singleton(
+        TiledReader,
+        enabled=cfg.tiling.enabled,
+        tile_side=cfg.tiling.tile_side,
+        overlap=cfg.tiling.overlap,
+        min_side=cfg.tiling.min_side,
+        workers=cfg.tiling.workers,
+        required_fields=cfg.tiling.required_fields,
+    )
+    orienter = providers.Singleton(
+        PageOrienter,
+        enabled=cfg.orientation.enabled,
+        max_side=cfg.orientation.max_side,
+        sample_lines=cfg.orientation.sample_lines,
+        min_agreement=cfg.orientation.min_agreement,
+        max_skew=cfg.orientation.max_skew,
     )
 
 
 HttpClientDep = Annotated[httpx.AsyncClient, Provide[Container.http_client]]
-OCRDep = Annotated[PaddleOCR, Provide[Container.ocr]]
-OpenAIDep = Annotated[AsyncOpenAI, Provide[Container.openai_client]]
+OCRDep = Annotated[OCREngine, Provide[Container.ocr]]
+OpenAIDep = Annotated["AsyncOpenAI", Provide[Container.openai_client]]
+LLMExtractorDep = Annotated[PQ7Extractor, Provide[Container.llm_extractor]]
+ProfilerDep = Annotated[RequestProfiler, Provide[Container.profiler]]
+FieldMatcherDep = Annotated[FieldMatcher, Provide[Container.field_matcher]]
+FieldDecodingDep = Annotated[FieldDecoding, Provide[Container.field_decoding]]
+CoarseToFineDep = Annotated[CoarseToFine, Provide[Container.region_reader]]
+DispatcherDep = Annotated[Dispatcher, Provide[Container.dispatcher]]
+MemoryBudgetDep = Annotated[MemoryBudget, Provide[Container.memory]]
+UrlFlightDep = Annotated[SingleFlight, Provide[Container.url_flight]]
+ContentFlightDep = Annotated[SingleFlight, Provide[Container.content_flight]]
+NearDuplicatesDep = Annotated[NearDuplicateIndex, Provide[Container.near_duplicates]]
+PrescreenDep = Annotated[Prescreen, Provide[Container.prescreen]]
+LayoutDep = Annotated[LayoutRegistrar, Provide[Container.layout]]
+UploadLimitDep = Annotated[int, Provide[Container.cfg.upload.max_bytes]]
+PageDecoderDep = Annotated[PageDecoder, Provide[Container.decoder]]
+TiledReaderDep = Annotated[TiledReader, Provide[Container.tiler]]
+OCRPoolDep = Annotated[OCRPool, Provide[Container.ocr_pool]]
+OrienterDep = Annotated[PageOrienter, Provide[Container.orienter]]
@@ -1,11 +1,18 @@
+import asyncio
+import os
+import time
+
 from fastapi import FastAPI, Depends, HTTPException, Security, status
 from fastapi.security.api_key import APIKeyHeader, APIKey
-import hydra
 import dt_receipt_ocr.core.pq7_pipeline
+from dt_receipt_ocr.core import warmup
+from dt_receipt_ocr.core.capture import CaptureMiddleware
+from dt_receipt_ocr.core.tracing import TracingMiddleware
 from dt_receipt_ocr.deps import Container
+from dt_receipt_ocr.routers import health, metrics
 from dt_receipt_ocr.routers.v1 import ocr
 from contextlib import asynccontextmanager
-from omegaconf import OmegaConf
+from omegaconf import DictConfig, OmegaConf
 
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -24,11 +31,29 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
         status_code=status.HTTP_403_FORBIDDEN, detail="Invalid API Key"
     )
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    container = Container()
+# Set by preload(), e.g. in the parent process of dt_receipt_ocr.server, so
+# forked workers reuse engines that are already loaded
+preloaded = {"container": None, "warm": False}
+
+
+def load_config(overrides: list[str] | None = None) -> DictConfig:
+    """
+    Compose conf/main.yaml.
+
+    Hydra overrides such as `ocr=cpu_16c` come from `overrides` or, when not
+    given, from the whitespace-separated DT_RECEIPT_OCR_OVERRIDES variable.
+    """
+    import hydra
+
+    if overrides is None:
+        overrides = os.environ.get("DT_RECEIPT_OCR_OVERRIDES", "").split()
     with hydra.initialize(version_base=None, config_path="conf"):
-        cfg = hydra.compose(config_name="main")
+        return hydra.compose(config_name="main", overrides=overrides)
+
+
+def create_container(overrides: list[str] | None = None) -> Container:
+    container = Container()
+    cfg = load_config(overrides)
     if "security" in cfg and "api_key" in cfg.security:
         config_container["api_key"] = cfg.security.api_key
     else:
@@ -38,17 +63,70 @@ async def lifespan(app: FastAPI):
 
     container.cfg.from_dict(OmegaConf.to_object(cfg))
     container.wire(modules=[ocr, dt_receipt_ocr.core.pq7_pipeline])
+    return container
+
+
+def preload(warm_up: bool = False, overrides: list[str] | None = None) -> Container:
+    """Build the container and load the OCR models before any worker starts."""
+    container = create_container(overrides)
+    container.ocr()
+    if warm_up and container.cfg.warmup.enabled():
+        warmup.warm_up(container.cfg.warmup.sizes())
+    preloaded.update(container=container, warm=warm_up)
+    return container
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    container = preloaded["container"] or create_container()
     await container.init_resources()
+    app.state.capture = container.capture()
+    app.state.tracer = container.tracer()
+
+    app.state.readiness = {"status": "warming_up"}
+    warmup_task = asyncio.create_task(_warm_up(app, container, skip_inference=preloaded["warm"]))
 
     yield
 
+    warmup_task.cancel()
+    app.state.tracer.flush()
     await container.shutdown_resources()
-    container.unwire()
+    if container is not preloaded["container"]:
+        container.unwire()
+
+
+async def _warm_up(app: FastAPI, container: Container, skip_inference: bool = False):
+    # Build the engines and run warmup inferences off the event loop, so
+    # liveness keeps answering while readiness reports 503
+    start = time.perf_counter()
+    try:
+        # Both import their client libraries on first use
+        await asyncio.to_thread(container.llm_extractor)
+        await asyncio.to_thread(container.ocr)
+        timings = {}
+        if container.cfg.warmup.enabled() and not skip_inference:
+            timings = await asyncio.to_thread(warmup.warm_up, container.cfg.warmup.sizes())
+    except Exception as error:
+        app.state.readiness = {"status": "failed", "error": str(error)}
+        print("Warmup failed:", error)
+        return
+
+    app.state.readiness = {
+        "status": "ready",
+        "warmup_seconds": round(time.perf_counter() - start, 3),
+        "warmup_timings": {size: round(seconds, 3) for size, seconds in timings.items()},
+    }
+    print("Warmup done:", app.state.readiness)
 
 
 api = FastAPI(lifespan=lifespan)
+# Added last, so capture runs outermost and records the X-Trace-Id header
+api.add_middleware(TracingMiddleware, prefix="/dt")
+api.add_middleware(CaptureMiddleware, prefix="/dt")
+api.include_router(health.router, prefix="/health")
+api.include_router(metrics.router, prefix="/metrics")
 api.include_router(
     ocr.router, 
     prefix="/dt", 
-    dependencies=[Depends(get_api_key)]
+    dependencies=[Depends(get_api_key), Depends(health.require_ready)]
 )
@@ -1,11 +1,11 @@
-from sqlmodel import SQLModel
+from pydantic import BaseModel
 
 
-class PQ7Request(SQLModel):
+class PQ7Request(BaseModel):
     file_url: str
 
 
-class PQ7ModelResponse(SQLModel):
+class PQ7ModelResponse(BaseModel):
     receipt_number: str
     destination_country: str
     transportation_mode: str
@@ -14,7 +14,7 @@ class PQ7ModelResponse(SQLModel):
     export_date: str
     # is_blur: bool = False
 
-class PQ7Response(SQLModel):
+class PQ7Response(BaseModel):
     receipt_number: str
     destination_country: str
     transportation_mode: str
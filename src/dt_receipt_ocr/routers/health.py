@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+
+@router.get("/live")
+async def live():
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def ready(request: Request):
+    # Ready only once the OCR engine is built and warm, see main.lifespan
+    readiness = request.app.state.readiness
+    if readiness["status"] == "ready":
+        return readiness
+    return JSONResponse(status_code=503, content=readiness)
+
+
+async def require_ready(request: Request):
+    # The warmup inferences run in a thread on the same OCR engine, which is
+    # not thread-safe, so OCR requests wait until they are done
+    readiness = request.app.state.readiness
+    if readiness["status"] != "ready":
+        raise HTTPException(status_code=503, detail=readiness, headers={"Retry-After": "5"})
@@ -1,32 +1,79 @@
-from PIL import Image, ImageOps
-import pdf2image
-from fastapi import APIRouter, HTTPException
+import hashlib
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartParser
 import httpx
-from dt_receipt_ocr.core import pq7_pipeline, utils
+from dt_receipt_ocr.core import capture, pq7_pipeline, tracing, utils
+from dt_receipt_ocr.core.decode import UnsupportedDocument
+from dt_receipt_ocr.core.memory import MemoryBudgetExceeded
+from dt_receipt_ocr.core.prescreen import PrescreenRejected
 from dt_receipt_ocr.models import PQ7Response, PQ7Request, PQ7ModelResponse
 from pydantic import HttpUrl
-from dt_receipt_ocr.deps import HttpClientDep
+from dt_receipt_ocr.deps import ContentFlightDep, DispatcherDep, HttpClientDep, MemoryBudgetDep, PageDecoderDep, UploadLimitDep, UrlFlightDep
 from dependency_injector.wiring import inject
-import puremagic
-
-import io
 
 router = APIRouter()
 
 @inject
 async def url_download(image_url: HttpUrl, http_client: HttpClientDep):
-    response = await http_client.get(str(image_url))
-    response.raise_for_status()
-    return response.content
+    with tracing.span("url_download", host=httpx.URL(str(image_url)).host) as span:
+        response = await http_client.get(str(image_url))
+        span.set(status=response.status_code, bytes=len(response.content))
+        response.raise_for_status()
+        return response.content
+
+
+@inject
+async def read_upload(request: Request, max_bytes: UploadLimitDep) -> bytes:
+    """The uploaded file: the raw body, or the `file` part of a multipart body."""
+    too_large = HTTPException(status_code=413, detail=f"Upload larger than {max_bytes} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes:
+        raise too_large
+
+    # Chunked uploads carry no length, so the limit is enforced while streaming
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        async def buffered():
+            yield bytes(body)
+
+        form = await MultiPartParser(request.headers, buffered(), max_files=1).parse()
+        try:
+            upload = form.get("file")
+            if not isinstance(upload, UploadFile):
+                raise HTTPException(status_code=422, detail="Multipart upload has no 'file' part")
+            return await upload.read()
+        finally:
+            await form.close()
+
+    if not body:
+        raise HTTPException(status_code=422, detail="Empty upload")
+    return bytes(body)
+
+
+@inject
+def decode_pages(file_bytes: bytes, decoder: PageDecoderDep, memory: MemoryBudgetDep):
+    with memory.stage("decode"):
+        return decoder.decode_pages(file_bytes)
+
+
+@inject
+def admit(file_bytes: bytes, decoder: PageDecoderDep, memory: MemoryBudgetDep):
+    # Sized from the image headers, before the pages take any memory
+    return memory.admit(decoder.pixels(file_bytes))
 
 
 @router.post("/ocr_pq7")
 async def ocr_pq7(request: PQ7Request) -> PQ7Response:
     if request.file_url.startswith("http"):
-        try:
-            file_bytes = await url_download(request.file_url)
-        except httpx.HTTPStatusError as err:
-            raise HTTPException(status_code=err.response.status_code, detail=str(err))
+        return await coalesce_url(request.file_url)
     elif request.file_url.startswith("s3"):
         raise HTTPException(
             status_code=501,
@@ -38,16 +85,111 @@ async def ocr_pq7(request: PQ7Request) -> PQ7Response:
             detail="Unsupported file URL scheme. Only 'http(s)' and 's3' are supported.",
         )
 
-    match puremagic.from_string(file_bytes):
-        case ".pdf":
-            images = pdf2image.convert_from_bytes(file_bytes, last_page=1, size=1500)
-            img_pil = images[0]
-        case _:
-            img_pil = Image.open(io.BytesIO(file_bytes))
-            ImageOps.exif_transpose(img_pil, in_place=True)
+
+@router.post(
+    "/ocr_pq7/upload",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"],
+                    }
+                },
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
+async def ocr_pq7_upload(request: Request) -> PQ7Response:
+    """Same as /ocr_pq7 for clients that already hold the image or PDF bytes."""
+    file_bytes = await read_upload(request)
+    return await coalesce_content(file_bytes)
+
+
+@inject
+async def coalesce_url(file_url: str, url_flight: UrlFlightDep) -> PQ7Response:
+    # Retries of the same URL share one download and pipeline run
+    return await url_flight.do(file_url, lambda: _ocr_url(file_url))
+
+
+async def _ocr_url(file_url: str) -> PQ7Response:
+    try:
+        file_bytes = await url_download(file_url)
+    except httpx.HTTPStatusError as err:
+        raise HTTPException(status_code=err.response.status_code, detail=str(err))
+    return await coalesce_content(file_bytes)
+
+
+@inject
+async def coalesce_content(file_bytes: bytes, content_flight: ContentFlightDep) -> PQ7Response:
+    # Different URLs or uploads of the same document share one pipeline run
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    capture.note_document(file_bytes, digest)
+    return await content_flight.do(digest, lambda: run_pipeline(file_bytes))
+
+
+@inject
+async def run_pipeline(file_bytes: bytes, dispatcher: DispatcherDep) -> PQ7Response:
+    if not dispatcher.queued:
+        return await process_bytes(file_bytes)
+    try:
+        with tracing.span("queue_wait", bytes=len(file_bytes)):
+            result = json.loads(await dispatcher.submit(file_bytes))
+    except TimeoutError as error:
+        raise HTTPException(status_code=504, detail=str(error))
+    if result["status"] != 200:
+        raise HTTPException(status_code=result["status"], detail=result["detail"])
+    return PQ7Response(**result["body"])
+
+
+async def run_job(file_bytes: bytes) -> bytes:
+    """
+    Worker side of queue mode: the result to hand back to `run_pipeline`.
+    Client errors (undecodable or rejected documents, missing fields, too
+    large for the memory budget) would fail the same way on every attempt,
+    so they are final results; server errors propagate, so the broker
+    retries the job.
+    """
+    try:
+        result = await process_bytes(file_bytes)
+    except HTTPException as error:
+        if error.status_code >= 500:
+            raise
+        return json.dumps({"status": error.status_code, "detail": error.detail}).encode()
+    return json.dumps({"status": 200, "body": result.model_dump()}).encode()
+
+
+async def process_bytes(file_bytes: bytes) -> PQ7Response:
+    try:
+        async with admit(file_bytes):
+            return await _process_admitted(file_bytes)
+    except MemoryBudgetExceeded as error:
+        if error.retryable:
+            raise HTTPException(
+                status_code=503,
+                detail={"error_code": "MEMORY_BUDGET_EXHAUSTED"},
+                headers={"Retry-After": "5"},
+            )
+        raise HTTPException(status_code=413, detail={"error_code": "DOCUMENT_TOO_LARGE", "message": str(error)})
+    except UnsupportedDocument as error:
+        raise HTTPException(status_code=415, detail={"error_code": error.error_code, "message": str(error)})
+
+
+async def _process_admitted(file_bytes: bytes) -> PQ7Response:
+    img_np, *extra_pages = decode_pages(file_bytes)
 
     try:
-        result = await pq7_pipeline.extract(img_pil)
+        # Another photo of a page processed recently reuses its result
+        with tracing.span("find_near_duplicate") as span:
+            page_hash, prior = pq7_pipeline.find_near_duplicate(img_np)
+            span.set(hit=prior is not None)
+        if prior is not None:
+            return prior
+        result = await pq7_pipeline.extract(img_np, extra_pages=extra_pages)
         if (utils.is_missing_field_pq7_response(result) and not result.is_blur) or result.receipt_number == '':
             raise HTTPException(
                 status_code=422,
@@ -55,7 +197,12 @@ async def ocr_pq7(request: PQ7Request) -> PQ7Response:
                     "error_code": "PQ7_MISSING_FIELDS",
                 }
             )   
+    except PrescreenRejected as rejection:
+        raise HTTPException(status_code=422, detail={"error_code": rejection.error_code})
+    except HTTPException:
+        raise
     except Exception as error:
         raise HTTPException(status_code=500, detail=str(error))
 
+    pq7_pipeline.remember_page(page_hash, result)
     return result
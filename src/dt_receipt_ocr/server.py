@@ -0,0 +1,205 @@
+"""
+Pre-forking launcher: load the OCR models once, then fork the API workers.
+
+Workers inherit the loaded model weights copy-on-write instead of each
+importing paddle and reading the det/rec/cls models on its own, which cuts
+startup time and per-worker memory. The parent restarts crashed workers
+(again from the loaded state), backing off when they keep crashing, and
+periodically reports every worker's unique memory (USS), which is what one
+more worker actually costs on the node.
+
+A CUDA context does not survive fork, so the models are always loaded on
+CPU here; run uvicorn directly to use a GPU.
+
+Usage:
+    python -m dt_receipt_ocr.server --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from dt_receipt_ocr import main as app_main
+from dt_receipt_ocr.core.memory import process_memory
+
+
+class RestartPolicy:
+    """
+    When to restart a worker that exited.
+
+    An exit within `min_uptime` seconds of starting counts as a crash.
+    Consecutive crashes delay the restart by 1, 2, 4, ... seconds, up to
+    `max_delay`; after `max_crashes` of them the server gives up instead of
+    forking broken workers forever.
+    """
+
+    def __init__(self, min_uptime: float = 30.0, max_crashes: int = 5, max_delay: float = 60.0):
+        self.min_uptime = min_uptime
+        self.max_crashes = max_crashes
+        self.max_delay = max_delay
+        self.crashes = 0
+
+    def exited(self, uptime: float) -> float | None:
+        """Seconds to wait before restarting, or None to give up."""
+        self.crashes = self.crashes + 1 if uptime < self.min_uptime else 0
+        if self.crashes > self.max_crashes:
+            return None
+        return min(2.0 ** (self.crashes - 1), self.max_delay) if self.crashes else 0.0
+
+
+def cpu_overrides() -> list[str]:
+    """The configured Hydra overrides, with the OCR engine moved off the GPU."""
+    overrides = os.environ.get("DT_RECEIPT_OCR_OVERRIDES", "").split()
+    if app_main.load_config(overrides).ocr.get("use_gpu", False):
+        print("Pre-forked workers cannot share a CUDA context, loading the OCR models on CPU", flush=True)
+        overrides.append("ocr.use_gpu=false")
+    return overrides
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, args) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app_main.api, log_level=args.log_level, timeout_keep_alive=args.timeout_keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _spawn(sock: socket.socket, args) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(sock, args)
+        except BaseException as error:
+            print(f"Worker {os.getpid()} crashed: {error}", file=sys.stderr)
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def _report_memory(workers: list[int]) -> None:
+    mib = 1024 * 1024
+    parent = process_memory()
+    lines = [f"parent pid={os.getpid()} rss={parent['rss'] / mib:.0f}MiB uss={parent['uss'] / mib:.0f}MiB"]
+    for pid in workers:
+        try:
+            mem = process_memory(pid)
+        except OSError:
+            continue
+        lines.append(
+            f"worker pid={pid} rss={mem['rss'] / mib:.0f}MiB pss={mem['pss'] / mib:.0f}MiB "
+            f"uss={mem['uss'] / mib:.0f}MiB shared={mem['shared'] / mib:.0f}MiB"
+        )
+    print("Memory:\n  " + "\n  ".join(lines), flush=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--warmup-in-parent",
+        action="store_true",
+        help="also run warmup inferences before forking; only safe for inference "
+        "backends whose thread pools survive fork (plain Paddle CPU without OpenMP)",
+    )
+    parser.add_argument("--memory-report-interval", type=float, default=60.0, help="seconds, 0 disables")
+    parser.add_argument(
+        "--max-crashes",
+        type=int,
+        default=5,
+        help="give up once this many workers in a row exit within --min-uptime seconds",
+    )
+    parser.add_argument("--min-uptime", type=float, default=30.0)
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    app_main.preload(warm_up=args.warmup_in_parent, overrides=cpu_overrides())
+    print(f"Models loaded in {time.perf_counter() - start:.1f}s, forking {args.workers} workers", flush=True)
+
+    sock = _bind(args.host, args.port)
+    # Keep the garbage collector from touching (and so un-sharing) every
+    # object allocated so far in each worker
+    gc.collect()
+    gc.freeze()
+
+    # pid -> start time of every running worker
+    workers = {}
+
+    def spawn():
+        workers[_spawn(sock, args)] = time.monotonic()
+
+    for _ in range(args.workers):
+        spawn()
+    policy = RestartPolicy(min_uptime=args.min_uptime, max_crashes=args.max_crashes)
+    # Times at which to fork the replacements of exited workers
+    restarts = []
+    stopping = False
+    code = 0
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    next_report = time.monotonic() + args.memory_report_interval
+    while workers or (restarts and not stopping):
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG) if workers else (0, 0)
+        except ChildProcessError:
+            break
+        if pid:
+            uptime = time.monotonic() - workers.pop(pid)
+            if not stopping:
+                exit_code = os.waitstatus_to_exitcode(status)
+                delay = policy.exited(uptime)
+                if delay is None:
+                    print(f"Worker {pid} exited with status {exit_code}, {policy.crashes} crashes in a row, stopping")
+                    code = 1
+                    stop(None, None)
+                else:
+                    print(f"Worker {pid} exited with status {exit_code}, restarting in {delay:.0f}s", flush=True)
+                    restarts.append(time.monotonic() + delay)
+            continue
+
+        now = time.monotonic()
+        if not stopping:
+            for due in [due for due in restarts if due <= now]:
+                restarts.remove(due)
+                spawn()
+        if args.memory_report_interval and now >= next_report:
+            _report_memory(list(workers))
+            next_report = now + args.memory_report_interval
+        time.sleep(0.5)
+
+    sock.close()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Benchmark PaddleOCR CPU settings on sample documents and write the fastest.
+
+Starting from the configured `ocr` parameters (forced to CPU), each knob of
+the search space is tuned in turn while the others keep their best value so
+far (coordinate descent). A setting only counts if the lines it recognizes
+keep at least --min-recall of the lines found with the starting config.
+
+The result is written to conf/ocr/cpu_<cores>c.yaml; select it on nodes of
+the same type with DT_RECEIPT_OCR_OVERRIDES="ocr=cpu_<cores>c". Only the
+paddle engine is tuned: the knobs are PaddleOCR parameters.
+
+Usage:
+    python -m dt_receipt_ocr.tools.autotune --samples test_image/
+"""
+
+import argparse
+import datetime
+import gc
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.core import pq7_pipeline
+from dt_receipt_ocr.core.decode import PageDecoder
+from dt_receipt_ocr.deps.container import init_paddle_ocr
+from dt_receipt_ocr.main import load_config
+
+CONF_DIR = Path(__file__).parents[1] / "conf" / "ocr"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".pdf"}
+
+
+def search_space(cores: int) -> dict[str, list]:
+    threads = sorted({n for n in (1, 2, 4, 8, 16, 32, cores // 2, cores) if 1 <= n <= cores})
+    return {
+        "enable_mkldnn": [False, True],
+        "cpu_threads": threads,
+        "rec_batch_num": [1, 6, 12, 24],
+        "det_limit_side_len": [640, 736, 960, 1280],
+    }
+
+
+def load_page(path: Path, decoder: PageDecoder | None = None) -> np.ndarray:
+    # The same decode as the API, so regions and resolutions match production
+    decoder = decoder or PageDecoder(**load_config().decode)
+    return decoder.decode(path.read_bytes())
+
+
+def measure(params: dict, pages: list[np.ndarray], repeats: int) -> tuple[float, list[set[str]]]:
+    """Median seconds per page and the recognized lines of every page."""
+    engine = init_paddle_ocr(params)
+    try:
+        regions = [pq7_pipeline._extract_regions_from_image(page) for page in pages]
+        # First-inference graph setup is not what we are tuning
+        for region_img, origin in regions[0].values():
+            pq7_pipeline._extract_text_from_region(region_img, origin, ocr=engine)
+
+        timings = []
+        texts = []
+        for _ in range(repeats):
+            texts = []
+            for page_regions in regions:
+                start = time.perf_counter()
+                lines = [
+                    pq7_pipeline._extract_text_from_region(region_img, origin, ocr=engine)
+                    for region_img, origin in page_regions.values()
+                ]
+                timings.append(time.perf_counter() - start)
+                texts.append({text for part in lines for text in part.texts.tolist()})
+        return statistics.median(timings), texts
+    finally:
+        del engine
+        gc.collect()
+
+
+def recall(reference: list[set[str]], candidate: list[set[str]]) -> float:
+    scores = [len(ref & got) / len(ref) for ref, got in zip(reference, candidate) if ref]
+    return statistics.mean(scores) if scores else 1.0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, required=True, help="directory of sample documents")
+    parser.add_argument("--limit", type=int, default=10, help="max sample documents to use")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-recall", type=float, default=0.98)
+    parser.add_argument("--cores", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--out", type=Path, help="defaults to conf/ocr/cpu_<cores>c.yaml")
+    args = parser.parse_args(argv)
+
+    engine = load_config().ocr.get("engine", "paddle")
+    if engine != "paddle":
+        parser.error(f"only the paddle engine can be tuned, the configured ocr.engine is {engine!r}")
+
+    paths = sorted(p for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[: args.limit]
+    if not paths:
+        parser.error(f"no sample documents in {args.samples}")
+    decoder = PageDecoder(**load_config().decode)
+    pages = [load_page(path, decoder) for path in paths]
+
+    best = dict(OmegaConf.to_object(load_config().ocr), use_gpu=False)
+    best_seconds, reference = measure(best, pages, args.repeats)
+    print(f"baseline: {best_seconds * 1000:.0f} ms/page", flush=True)
+
+    for knob, values in search_space(args.cores).items():
+        for value in values:
+            if best.get(knob) == value:
+                continue
+            params = {**best, knob: value}
+            seconds, texts = measure(params, pages, args.repeats)
+            score = recall(reference, texts)
+            accepted = score >= args.min_recall and seconds < best_seconds
+            print(f"{knob}={value}: {seconds * 1000:.0f} ms/page, recall {score:.3f}{' *' if accepted else ''}", flush=True)
+            if accepted:
+                best, best_seconds = params, seconds
+
+    out = args.out or CONF_DIR / f"cpu_{args.cores}c.yaml"
+    header = (
+        f"# Written by dt_receipt_ocr.tools.autotune on {datetime.date.today()} for {args.cores} cores\n"
+        f"# {best_seconds * 1000:.0f} ms/page over {len(pages)} sample documents\n\n"
+    )
+    out.write_text(header + OmegaConf.to_yaml(OmegaConf.create(best)))
+    print(f"wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
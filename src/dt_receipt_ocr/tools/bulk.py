@@ -0,0 +1,228 @@
+"""
+Run the P.Q.7 pipeline over many archived documents.
+
+Documents come from directories (searched recursively), glob patterns or
+JSONL manifests with one {"path": ..., "id": ...} object per line ("id"
+defaults to the path). The OCR stage runs in a pool of --workers processes,
+each with its own OCR engine; keep workers x ocr.cpu_threads at about the
+number of cores. The LLM stage runs in this process with at most
+--llm-concurrency calls in flight.
+
+Every finished document is appended to --out as one JSON line, which is
+also the checkpoint: running the same command again skips the ids already
+in it (and, with --retry-errors, redoes the ones that failed). If the OCR
+pool breaks (a worker was killed, e.g. out of memory, or failed to start),
+the documents in flight are recorded as errors and the run stops. --parquet
+writes the whole JSONL to a Parquet file at the end (needs pyarrow).
+
+Usage:
+    python -m dt_receipt_ocr.tools.bulk archive/2024/ --out pq7_2024.jsonl \\
+        --workers 8 --llm-concurrency 32 -o ocr.cpu_threads=2
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterator
+
+from dt_receipt_ocr.core import pq7_pipeline
+from dt_receipt_ocr.core.decode import UnsupportedDocument
+from dt_receipt_ocr.core.prescreen import PrescreenRejected
+from dt_receipt_ocr.main import create_container, load_config
+from dt_receipt_ocr.models.ocr import PQ7Response
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".pdf"}
+
+# The container of a pool worker, built once by _init_worker
+_worker_container = None
+
+
+def iter_documents(inputs: list[str]) -> Iterator[tuple[str, str]]:
+    """(id, path) of every document named by `inputs`, lazily, so huge archives start at once."""
+    for spec in inputs:
+        path = Path(spec)
+        if path.suffix == ".jsonl" and path.is_file():
+            with path.open() as manifest:
+                for line in manifest:
+                    if line.strip():
+                        entry = json.loads(line)
+                        yield str(entry.get("id", entry["path"])), entry["path"]
+        elif path.is_dir():
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if Path(name).suffix.lower() in IMAGE_SUFFIXES:
+                        yield os.path.join(root, name), os.path.join(root, name)
+        else:
+            for match in sorted(glob.iglob(spec, recursive=True)):
+                yield match, match
+
+
+def load_checkpoint(out: Path, retry_errors: bool) -> set[str]:
+    done = set()
+    if not out.exists():
+        return done
+    with out.open() as results:
+        for line in results:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run
+                continue
+            if record["status"] != "error" or not retry_errors:
+                done.add(record["id"])
+    return done
+
+
+def _init_worker(overrides: list[str]) -> None:
+    global _worker_container
+    _worker_container = create_container(overrides)
+    _worker_container.ocr()
+
+
+def _read_document(path: str) -> tuple[float, pq7_pipeline.PageText | PQ7Response | dict]:
+    """OCR stage in a pool worker; failures come back as a dict, they may not pickle as exceptions."""
+    start = time.perf_counter()
+    try:
+        img_np, *extra_pages = _worker_container.decoder().decode_pages(Path(path).read_bytes())
+        page = pq7_pipeline.read_page(img_np, extra_pages=extra_pages)
+    except (PrescreenRejected, UnsupportedDocument) as rejection:
+        page = {"status": "rejected", "error_code": rejection.error_code, "error": str(rejection)}
+    except Exception as error:
+        page = {"status": "error", "error": f"{type(error).__name__}: {error}"}
+    return time.perf_counter() - start, page
+
+
+async def _process(doc_id, path, pool, llm_slots: asyncio.Semaphore) -> dict:
+    loop = asyncio.get_running_loop()
+    record = {"id": doc_id, "path": path}
+    try:
+        ocr_seconds, page = await loop.run_in_executor(pool, _read_document, path)
+    except BrokenProcessPool:
+        raise
+    except Exception as error:
+        # E.g. a result that does not pickle; the pool itself still works
+        return record | {"status": "error", "error": f"{type(error).__name__}: {error}"}
+    record["ocr_seconds"] = round(ocr_seconds, 3)
+
+    if isinstance(page, dict):
+        return record | page
+    if isinstance(page, pq7_pipeline.PageText):
+        start = time.perf_counter()
+        try:
+            async with llm_slots:
+                page = await pq7_pipeline.complete_page(page)
+        except Exception as error:
+            return record | {"status": "error", "error": f"{type(error).__name__}: {error}"}
+        record["llm_seconds"] = round(time.perf_counter() - start, 3)
+    return record | {"status": "ok", "result": page.model_dump()}
+
+
+async def run(args, overrides: list[str]) -> dict[str, int]:
+    done = load_checkpoint(args.out, args.retry_errors)
+    if done:
+        print(f"Resuming: {len(done)} documents already in {args.out}")
+
+    # The main process only needs the OpenAI client for the LLM stage
+    container = create_container(overrides)
+    llm_slots = asyncio.Semaphore(args.llm_concurrency)
+    # Bounds documents between the OCR and LLM stages, and memory with them
+    pending = asyncio.Semaphore(args.workers * 2 + args.llm_concurrency)
+    counts = {"ok": 0, "rejected": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+    broken = []
+    crashed = []
+
+    context = multiprocessing.get_context("spawn")
+    with (
+        ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker, initargs=(overrides,)) as pool,
+        args.out.open("a") as out,
+    ):
+        async def process(doc_id, path):
+            try:
+                record = await _process(doc_id, path, pool, llm_slots)
+            except BrokenProcessPool as error:
+                broken.append(error)
+                record = {"id": doc_id, "path": path, "status": "error", "error": f"BrokenProcessPool: {error}"}
+            finally:
+                pending.release()
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            finished = counts["ok"] + counts["rejected"] + counts["error"]
+            if finished % args.progress_every == 0:
+                rate = finished / (time.perf_counter() - start)
+                print(f"{finished} documents, {rate:.1f}/s: {counts}", flush=True)
+
+        def collect(task):
+            # Done tasks leave `tasks`, so their exceptions are retrieved here
+            tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                crashed.append(task.exception())
+
+        tasks = set()
+        for doc_id, path in iter_documents(args.inputs):
+            if doc_id in done:
+                counts["skipped"] += 1
+                continue
+            done.add(doc_id)
+            await pending.acquire()
+            if broken or crashed:
+                break
+            task = asyncio.create_task(process(doc_id, path))
+            tasks.add(task)
+            task.add_done_callback(collect)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    container.unwire()
+    if crashed:
+        # E.g. the results file could not be written
+        raise crashed[0]
+    if broken:
+        print(f"OCR pool broken ({broken[0]}), stopped early; rerun with --retry-errors", flush=True)
+    return counts
+
+
+def write_parquet(jsonl: Path, parquet: Path) -> None:
+    try:
+        import pyarrow.json
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("--parquet needs pyarrow")
+    pyarrow.parquet.write_table(pyarrow.json.read_json(jsonl), parquet)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="directories, glob patterns or JSONL manifests")
+    parser.add_argument("--out", type=Path, required=True, help="JSONL results, appended to and resumed from")
+    parser.add_argument("--parquet", type=Path, help="also write all results to this Parquet file at the end")
+    parser.add_argument("--workers", type=int, help="OCR processes, defaults to cores / ocr.cpu_threads")
+    parser.add_argument("--llm-concurrency", type=int, default=16)
+    parser.add_argument("--retry-errors", action="store_true", help="redo documents recorded with status error")
+    parser.add_argument("--progress-every", type=int, default=100)
+    parser.add_argument("-o", "--override", action="append", default=[], help="Hydra override, e.g. ocr=onnx")
+    args = parser.parse_args(argv)
+
+    overrides = args.override
+    if args.workers is None:
+        threads = load_config(overrides).ocr.get("cpu_threads") or 1
+        args.workers = max(1, len(os.sched_getaffinity(0)) // threads)
+
+    counts = asyncio.run(run(args, overrides))
+    print("Done:", counts)
+    if args.parquet:
+        write_parquet(args.out, args.parquet)
+        print("Wrote", args.parquet)
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Fit the layout ROIs of a form template to sample documents.
+
+Every sample is turned upright, registered to the template and OCR'd in full
+at template resolution. Each ROI becomes the union, over all samples, of the
+lines that carry its fields: label keywords, pattern values and the lines
+right of or just below each label. A margin is added and the template is
+written with `enabled: true` to conf/layout/<layout>_calibrated.yaml; select
+it with DT_RECEIPT_OCR_OVERRIDES="layout=<layout>_calibrated".
+
+Usage:
+    python -m dt_receipt_ocr.tools.layout_calibrate --samples test_image/
+"""
+
+import argparse
+import datetime
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.core import pq7_pipeline
+from dt_receipt_ocr.core.decode import PageDecoder
+from dt_receipt_ocr.core.field_patterns import KEYWORD
+from dt_receipt_ocr.core.spatial_index import SpatialIndex
+from dt_receipt_ocr.main import create_container
+from dt_receipt_ocr.tools.autotune import IMAGE_SUFFIXES, load_page
+
+CONF_DIR = Path(__file__).parents[1] / "conf" / "layout"
+
+
+def field_lines(index: SpatialIndex, matches, fields: set[str]) -> set[int]:
+    lines = set()
+    for match in matches:
+        if match.field not in fields:
+            continue
+        lines.add(match.line)
+        if match.kind == KEYWORD:
+            lines.update(index.right_of(match.line).tolist())
+            lines.update(index.below(match.line)[:3].tolist())
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, required=True, help="directory of sample documents")
+    parser.add_argument("--layout", default="pq7", help="template under conf/layout/ to start from")
+    parser.add_argument("--limit", type=int, default=20, help="max sample documents to use")
+    parser.add_argument("--margin", type=float, default=0.02, help="added around each ROI, fraction of the template")
+    parser.add_argument("--out", type=Path, help="defaults to conf/layout/<layout>_calibrated.yaml")
+    args = parser.parse_args(argv)
+
+    paths = sorted(p for p in args.samples.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)[: args.limit]
+    if not paths:
+        parser.error(f"no sample documents in {args.samples}")
+
+    container = create_container([f"layout={args.layout}"])
+    layout = container.layout()
+    matcher = container.field_matcher()
+    decoder = PageDecoder(**container.cfg.decode())
+
+    # Union of the field lines per ROI, in template pixels
+    found = {name: None for name in layout.rois}
+    for path in paths:
+        page, _ = pq7_pipeline._orient_page(load_page(path, decoder))
+        homography = layout.register(page)
+        if homography is None:
+            print(f"{path.name}: no form outline found, skipped", flush=True)
+            continue
+        template = cv2.warpPerspective(
+            page, homography, (layout.width, layout.height), flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP
+        )
+        index = SpatialIndex(pq7_pipeline._extract_text_from_region(template, (0, 0), cls=False))
+        matches = matcher.scan(index.lines.texts.tolist())
+
+        for name, fields in layout.fields.items():
+            lines = sorted(field_lines(index, matches, fields))
+            if not lines:
+                print(f"{path.name}: nothing found for {name}", flush=True)
+                continue
+            box = np.concatenate([index.mins[lines].min(axis=0), index.maxs[lines].max(axis=0)])
+            if found[name] is not None:
+                box = np.concatenate([np.minimum(found[name][:2], box[:2]), np.maximum(found[name][2:], box[2:])])
+            found[name] = box
+
+    template_cfg = container.cfg.layout()
+    size = np.float64([layout.width, layout.height, layout.width, layout.height])
+    for name, box in found.items():
+        if box is None:
+            print(f"{name}: kept the configured box", flush=True)
+            continue
+        fractions = box / size + np.float64([-1, -1, 1, 1]) * args.margin
+        template_cfg["rois"][name]["box"] = [round(float(v), 3) for v in np.clip(fractions, 0, 1)]
+        print(f"{name}: {template_cfg['rois'][name]['box']}", flush=True)
+    template_cfg["enabled"] = True
+
+    out = args.out or CONF_DIR / f"{args.layout}_calibrated.yaml"
+    header = f"# Written by dt_receipt_ocr.tools.layout_calibrate on {datetime.date.today()} from {len(paths)} samples\n\n"
+    out.write_text(header + OmegaConf.to_yaml(OmegaConf.create(template_cfg)))
+    print(f"wrote {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Convert the PaddleOCR det/cls/rec inference models to ONNX for `ocr=onnx`.
+
+The Paddle models are the ones PaddleOCR downloads for the configured `ocr`
+parameters (lang, model versions). Conversion needs paddle2onnx
+(`pip install paddle2onnx`); --int8 additionally writes dynamically
+INT8-quantized copies (*.int8.onnx) for `ocr=onnx_int8`.
+
+Usage:
+    python -m dt_receipt_ocr.tools.onnx_export [--int8]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.deps.container import PACKAGE_DIR, init_paddle_ocr
+from dt_receipt_ocr.main import load_config
+
+MODEL_DIR_ARGS = {"det": "det_model_dir", "rec": "rec_model_dir", "cls": "cls_model_dir"}
+
+
+def paddle_model_file(model_dir: Path) -> str:
+    # Paddle 3 saves inference programs as JSON, Paddle 2 as protobuf
+    for name in ("inference.json", "inference.pdmodel"):
+        if (model_dir / name).exists():
+            return name
+    raise FileNotFoundError(f"no inference model in {model_dir}")
+
+
+def convert(model_dir: Path, out: Path, opset: int) -> None:
+    subprocess.run(
+        [
+            "paddle2onnx",
+            "--model_dir", str(model_dir),
+            "--model_filename", paddle_model_file(model_dir),
+            "--params_filename", "inference.pdiparams",
+            "--save_file", str(out),
+            "--opset_version", str(opset),
+            "--enable_onnx_checker", "True",
+        ],
+        check=True,
+    )
+
+
+def quantize(model: Path, out: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(model, out, weight_type=QuantType.QInt8)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=PACKAGE_DIR / "weights" / "onnx")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--int8", action="store_true", help="also write INT8-quantized models")
+    args = parser.parse_args(argv)
+
+    # Building the Paddle engine downloads any missing models
+    params = dict(OmegaConf.to_object(load_config(["ocr=default"]).ocr), use_gpu=False)
+    engine_args = init_paddle_ocr(params).args
+    args.out.mkdir(parents=True, exist_ok=True)
+
+    for name, arg in MODEL_DIR_ARGS.items():
+        out = args.out / f"{name}.onnx"
+        convert(Path(getattr(engine_args, arg)), out, args.opset)
+        print(f"wrote {out}", flush=True)
+        if args.int8:
+            quantized = args.out / f"{name}.int8.onnx"
+            quantize(out, quantized)
+            print(f"wrote {quantized}", flush=True)
+
+    shutil.copyfile(engine_args.rec_char_dict_path, args.out / "rec_dict.txt")
+    print(f"wrote {args.out / 'rec_dict.txt'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Replay captured traffic against a running instance.
+
+Reads the JSONL written with `capture.enabled=true` and sends every
+request at its original offset from the first one, divided by --speed
+(2 replays twice as fast), without waiting for earlier responses, so the
+arrival pattern and concurrency match production. Uploads, and with
+--as-upload also URL requests, are sent from the documents stored with
+`capture.store_documents=true`.
+
+Reports latency percentiles, status counts and the requests whose
+response differs from the captured one.
+
+Usage:
+    python -m dt_receipt_ocr.tools.replay captures/requests.jsonl \\
+        --base-url http://localhost:8000 --speed 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+
+def load_trace(path: Path, limit: int | None = None) -> list[dict]:
+    trace = []
+    with path.open() as captured:
+        for line in captured:
+            if line.strip():
+                trace.append(json.loads(line))
+    trace.sort(key=lambda entry: entry["ts"])
+    return trace[:limit] if limit else trace
+
+
+def diff(expected, actual, prefix: str = "") -> list[str]:
+    """Paths of the JSON values that differ, e.g. ["receipt_number: 'NP1' != 'NP2'"]."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return [
+            change
+            for key in sorted(expected.keys() | actual.keys())
+            for change in diff(expected.get(key), actual.get(key), f"{prefix}{key}.")
+        ]
+    if expected != actual:
+        return [f"{prefix.rstrip('.') or 'body'}: {expected!r} != {actual!r}"]
+    return []
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    if len(latencies) < 2:
+        return {"p50": latencies[0]} if latencies else {}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p95": cuts[94], "p99": cuts[98], "max": max(latencies)}
+
+
+def build_request(entry: dict, as_upload: bool, documents_dir: Path | None) -> tuple[str, dict] | None:
+    """Path and httpx keyword arguments for one captured request, None when it cannot be replayed."""
+    document = entry.get("document_path")
+    if document and documents_dir:
+        document = documents_dir / Path(document).name
+    upload = entry["path"].endswith("/upload") or (as_upload and entry.get("document_sha256"))
+    if upload:
+        if not document or not Path(document).exists():
+            return None
+        path = entry["path"] if entry["path"].endswith("/upload") else entry["path"] + "/upload"
+        content = Path(document).read_bytes()
+        return path, {"content": content, "headers": {"content-type": "application/octet-stream"}}
+    if entry.get("request") is None:
+        return None
+    return entry["path"], {"json": entry["request"]}
+
+
+async def replay(args) -> int:
+    trace = load_trace(args.trace, args.limit)
+    if not trace:
+        print("Nothing to replay")
+        return 1
+
+    results = []
+    skipped = 0
+    headers = {"X-API-Key": args.api_key} if args.api_key else {}
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.keepalive)
+
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, timeout=args.timeout, limits=limits) as client:
+        async def send(entry, path, kwargs):
+            start = time.perf_counter()
+            try:
+                response = await client.request(entry["method"], path, **kwargs)
+                status = response.status_code
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = None
+            except httpx.HTTPError as error:
+                status, body = f"error: {type(error).__name__}", None
+            results.append(
+                {
+                    "entry": entry,
+                    "latency_ms": (time.perf_counter() - start) * 1000,
+                    "status": status,
+                    "diff": ([f"status: {entry['status']} != {status}"] if status != entry["status"] else [])
+                    + diff(entry.get("response"), body),
+                }
+            )
+
+        tasks = []
+        first = trace[0]["ts"]
+        start = time.perf_counter()
+        for entry in trace:
+            request = build_request(entry, args.as_upload, args.documents_dir)
+            if request is None:
+                skipped += 1
+                continue
+            delay = (entry["ts"] - first) / args.speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(entry, *request)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    latencies = [result["latency_ms"] for result in results]
+    captured = [result["entry"]["latency_ms"] for result in results if result["entry"].get("latency_ms") is not None]
+    differing = [result for result in results if result["diff"]]
+    print(f"Replayed {len(results)} requests in {elapsed:.1f}s at {args.speed:g}x, skipped {skipped}")
+    print("Status:", dict(Counter(str(result["status"]) for result in results)))
+    print("Latency ms:    ", {key: round(value, 1) for key, value in percentiles(latencies).items()})
+    print("Captured ms:   ", {key: round(value, 1) for key, value in percentiles(captured).items()})
+    print(f"Responses differing from the capture: {len(differing)}")
+    for result in differing[: args.show_diffs]:
+        entry = result["entry"]
+        print(f"  {entry['path']} {entry.get('request') or entry.get('document_sha256')}")
+        for change in result["diff"]:
+            print(f"    {change}")
+
+    if args.out:
+        with args.out.open("w") as out:
+            for result in results:
+                entry = result["entry"]
+                record = {
+                    "ts": entry["ts"],
+                    "path": entry["path"],
+                    "request_sha256": entry.get("request_sha256"),
+                    "document_sha256": entry.get("document_sha256"),
+                    "status": result["status"],
+                    "latency_ms": round(result["latency_ms"], 1),
+                    "captured_latency_ms": entry.get("latency_ms"),
+                    "diff": result["diff"],
+                }
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 1 if differing and args.fail_on_diff else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", type=Path, help="capture JSONL")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--api-key", default=os.environ.get("DT_RECEIPT_OCR_API_KEY"))
+    parser.add_argument("--speed", type=float, default=1.0, help="N replays N times faster than captured")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--as-upload", action="store_true", help="send URL requests as uploads of their stored document")
+    parser.add_argument("--documents-dir", type=Path, help="where the stored documents are, if moved since capture")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--keepalive", type=int, default=32)
+    parser.add_argument("--show-diffs", type=int, default=10)
+    parser.add_argument("--fail-on-diff", action="store_true", help="exit 1 when any response differs")
+    parser.add_argument("--out", type=Path, help="per-request results as JSONL")
+    args = parser.parse_args(argv)
+    return asyncio.run(replay(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
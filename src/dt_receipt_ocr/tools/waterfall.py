@@ -0,0 +1,103 @@
+"""
+Print recorded traces as waterfalls.
+
+Reads the JSONL written with `tracing.enabled=true tracing.exporter=jsonl`
+and draws one trace per block: every span's start offset and duration
+from the root, a bar on the root's time scale, the span name indented
+under its parent, and its attributes and error. Without --trace-id, the
+--slowest N traces are shown, by root duration.
+
+Usage:
+    python -m dt_receipt_ocr.tools.waterfall traces/spans.jsonl --slowest 5
+    python -m dt_receipt_ocr.tools.waterfall traces/spans.jsonl \\
+        --trace-id 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def load_traces(path: Path) -> list[dict]:
+    # Queue workers export their spans of a request's trace separately
+    traces = {}
+    with path.open() as recorded:
+        for line in recorded:
+            if line.strip():
+                record = json.loads(line)
+                trace = traces.setdefault(record["trace_id"], {"trace_id": record["trace_id"], "spans": []})
+                trace["spans"].extend(record["spans"])
+    return list(traces.values())
+
+
+def duration_ms(span: dict) -> float:
+    return (span["end_ns"] - span["start_ns"]) / 1e6
+
+
+def _root(trace: dict) -> dict:
+    ids = {span["span_id"] for span in trace["spans"]}
+    # The span whose parent is not in the trace: none, or one in the API process
+    roots = [span for span in trace["spans"] if span["parent_id"] not in ids]
+    return min(roots, key=lambda span: span["start_ns"])
+
+
+def _ordered(trace: dict) -> list[tuple[int, dict]]:
+    """(depth, span) in depth-first order, children by start time."""
+    children = {}
+    for span in sorted(trace["spans"], key=lambda span: span["start_ns"]):
+        children.setdefault(span["parent_id"], []).append(span)
+    ordered = []
+    stack = [(0, _root(trace))]
+    while stack:
+        depth, span = stack.pop()
+        ordered.append((depth, span))
+        stack.extend((depth + 1, child) for child in reversed(children.get(span["span_id"], [])))
+    return ordered
+
+
+def render(trace: dict, width: int = 40) -> str:
+    root = _root(trace)
+    total_ns = max(root["end_ns"] - root["start_ns"], 1)
+    lines = [f"trace {trace['trace_id']}  {root['name']}  {duration_ms(root):.1f} ms"]
+    for depth, span in _ordered(trace):
+        offset = span["start_ns"] - root["start_ns"]
+        start = min(int(offset / total_ns * width), width - 1)
+        length = max(round((span["end_ns"] - span["start_ns"]) / total_ns * width), 1)
+        bar = " " * start + "#" * min(length, width - start)
+        attributes = " ".join(f"{key}={value}" for key, value in span["attributes"].items())
+        line = f"{offset / 1e6:9.1f} {duration_ms(span):9.1f}  |{bar:<{width}}|  {'  ' * depth}{span['name']}"
+        if attributes:
+            line += f"  {attributes}"
+        if span.get("error"):
+            line += f"  ERROR {span['error']}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("spans", type=Path, help="trace JSONL")
+    parser.add_argument("--trace-id", help="show this trace, e.g. from the X-Trace-Id header")
+    parser.add_argument("--slowest", type=int, default=1, help="show the N slowest traces")
+    parser.add_argument("--width", type=int, default=40, help="bar width in characters")
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.spans)
+    if args.trace_id:
+        selected = [trace for trace in traces if trace["trace_id"] == args.trace_id]
+        if not selected:
+            print(f"No trace {args.trace_id} in {args.spans}", file=sys.stderr)
+            return 1
+    else:
+        selected = sorted(traces, key=lambda trace: duration_ms(_root(trace)), reverse=True)[: args.slowest]
+
+    print("offset ms  dur ms")
+    for trace in selected:
+        print()
+        print(render(trace, args.width))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Queue worker: runs P.Q.7 jobs enqueued by API front-ends in queue mode.
+
+Start the API with DT_RECEIPT_OCR_OVERRIDES="dispatch.mode=queue" and any
+number of these, on any node that reaches the same broker. Each worker
+keeps up to --prefetch jobs claimed: while one waits for the LLM the next
+one's OCR runs. A job is acked with its result once done; server errors
+release it for another attempt, and a worker that dies simply lets its
+leases expire. SIGTERM stops claiming and finishes the claimed jobs.
+
+Usage:
+    python -m dt_receipt_ocr.worker --prefetch 4 -o dispatch.broker=redis
+"""
+
+import argparse
+import asyncio
+import signal
+import sys
+import time
+
+from dt_receipt_ocr import main as app_main
+from dt_receipt_ocr.core.broker import Broker, Job
+from dt_receipt_ocr.core.tracing import Tracer, parse_traceparent
+from dt_receipt_ocr.routers.v1 import ocr
+
+
+async def handle(broker: Broker, tracer: Tracer, job: Job) -> None:
+    start = time.perf_counter()
+    traceparent, document = job.unpack()
+    trace_id, parent_id, sampled = parse_traceparent(traceparent)
+    try:
+        # In the API request's trace, under its queue_wait span, when that was traced
+        with tracer.trace("pq7_job", trace_id, parent_id, sampled, job_id=job.id, attempt=job.attempts):
+            result = await ocr.run_job(document)
+    except Exception as error:
+        print(f"Job {job.id} attempt {job.attempts} failed: {error}", flush=True)
+        await asyncio.to_thread(broker.release, job, f"{type(error).__name__}: {error}")
+        return
+    await asyncio.to_thread(broker.complete, job, result)
+    print(f"Job {job.id} done in {time.perf_counter() - start:.2f}s", flush=True)
+
+
+async def work(broker: Broker, tracer: Tracer, prefetch: int, poll_interval: float) -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    running: set[asyncio.Task] = set()
+    while not stopping.is_set():
+        jobs = []
+        if len(running) < prefetch:
+            jobs = await asyncio.to_thread(broker.claim, prefetch - len(running))
+            for job in jobs:
+                task = asyncio.create_task(handle(broker, tracer, job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+
+        if len(running) >= prefetch:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        elif not jobs:
+            # Queue empty: back off, but wake up at once to stop
+            try:
+                await asyncio.wait_for(stopping.wait(), poll_interval)
+            except TimeoutError:
+                pass
+        else:
+            # Let the new jobs start before claiming more
+            await asyncio.sleep(0)
+
+    print(f"Stopping, finishing {len(running)} claimed jobs", flush=True)
+    if running:
+        await asyncio.wait(running)
+
+
+async def run(args) -> None:
+    container = app_main.create_container(args.override)
+    await container.init_resources()
+    try:
+        start = time.perf_counter()
+        await asyncio.to_thread(container.ocr)
+        container.llm_extractor()
+        prefetch = args.prefetch or container.cfg.dispatch.prefetch()
+        print(f"Models loaded in {time.perf_counter() - start:.1f}s, claiming up to {prefetch} jobs", flush=True)
+        await work(container.broker(), container.tracer(), prefetch, args.poll_interval)
+    finally:
+        container.tracer().flush()
+        await container.shutdown_resources()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefetch", type=int, help="jobs claimed at a time, defaults to dispatch.prefetch")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="seconds between claims while the queue is empty")
+    parser.add_argument("-o", "--override", action="append", help="Hydra override, e.g. dispatch.broker=redis")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+
+class FakeOCR:
+    """
+    Stand-in for PaddleOCR: `ocr()` returns the given lines, in the
+    `[[box, (text, score)], ...]` format, for every image.
+    """
+
+    def __init__(self, lines=()):
+        self.lines = [list(line) for line in lines]
+        self.calls = []
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        self.calls.append({"shape": img.shape, "det": det, "cls": cls})
+        return [self.lines or None]
+
+
+def line(text: str, x: float, y: float, width: float = 100, height: float = 20, score: float = 0.99):
+    """A PaddleOCR result line with an axis-aligned box at (x, y)."""
+    box = [[x, y], [x + width, y], [x + width, y + height], [x, y + height]]
+    return [box, (text, score)]
+
+
+@pytest.fixture
+def page():
+    # White A4-ish page with some dark text-like strokes, in BGR
+    img = np.full((1400, 1000, 3), 255, dtype=np.uint8)
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        x, y = rng.integers(50, 900), rng.integers(50, 1300)
+        img[y : y + 4, x : x + 80] = 0
+    return img
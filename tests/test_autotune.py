@@ -0,0 +1,31 @@
+import pytest
+
+from dt_receipt_ocr.main import load_config
+from dt_receipt_ocr.tools import autotune
+
+
+def test_default_engine_runs_on_cpu(monkeypatch):
+    monkeypatch.delenv("DT_RECEIPT_OCR_OVERRIDES", raising=False)
+    ocr = load_config().ocr
+    assert ocr.engine == "paddle"
+    assert ocr.use_gpu is False
+
+
+def test_other_engines_are_rejected(monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv("DT_RECEIPT_OCR_OVERRIDES", "ocr=onnx")
+    with pytest.raises(SystemExit) as exit:
+        autotune.main(["--samples", str(tmp_path)])
+    assert exit.value.code == 2
+    assert "'onnx'" in capsys.readouterr().err
+
+
+def test_search_space_stays_within_the_cores():
+    space = autotune.search_space(6)
+    assert space["cpu_threads"] == [1, 2, 3, 4, 6]
+    assert space["enable_mkldnn"] == [False, True]
+
+
+def test_recall_of_recognized_lines():
+    reference = [{"Form P.Q.7", "NP60046795"}, set()]
+    assert autotune.recall(reference, [{"Form P.Q.7"}, {"noise"}]) == 0.5
+    assert autotune.recall([set()], [set()]) == 1.0
@@ -0,0 +1,185 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+
+import pytest
+
+from dt_receipt_ocr import worker
+from dt_receipt_ocr.core import broker as broker_module
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.broker import Dispatcher, RedisBroker, SQLiteBroker
+from dt_receipt_ocr.core.tracing import Tracer
+from dt_receipt_ocr.main import create_container
+from dt_receipt_ocr.routers.v1 import ocr
+
+
+class Clock:
+    """Stands in for time.time in the broker module."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(broker_module.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def broker(request, tmp_path, monkeypatch, clock):
+    options = {"lease_seconds": 10, "max_attempts": 2, "result_ttl": 300}
+    if request.param == "sqlite":
+        return SQLiteBroker(path=str(tmp_path / "queue.sqlite"), **options)
+    fakeredis = pytest.importorskip("fakeredis")
+    # Claims are Lua scripts, which fakeredis runs with lupa
+    pytest.importorskip("lupa")
+    import redis
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, url: fakeredis.FakeRedis(server=server)))
+    return RedisBroker(**options)
+
+
+def test_jobs_are_claimed_once_and_answered(broker):
+    broker.put("a", b"payload")
+    [job] = broker.claim(5)
+    assert (job.id, job.payload, job.attempts) == ("a", b"payload", 1)
+    assert broker.claim(5) == []
+    assert broker.take_result("a") is None
+    broker.complete(job, b"result")
+    assert broker.take_result("a") == b"result"
+    assert broker.take_result("a") is None
+
+
+def test_released_job_is_retried_then_failed(broker):
+    broker.put("a", b"payload")
+    [first] = broker.claim(1)
+    broker.release(first, "RuntimeError: boom")
+    [second] = broker.claim(1)
+    assert second.attempts == 2
+    broker.release(second, "RuntimeError: boom")
+    assert broker.claim(1) == []
+    assert json.loads(broker.take_result("a")) == {"status": 500, "detail": "RuntimeError: boom"}
+
+
+def test_expired_lease_is_handed_out_again(broker, clock):
+    broker.put("a", b"payload")
+    [stale] = broker.claim(1)
+    clock.now += 11
+    [current] = broker.claim(1)
+    assert current.attempts == 2
+
+    # The first worker finally gives up or finishes: neither touches the new lease
+    broker.release(stale, "TimeoutError")
+    broker.complete(stale, b"stale result")
+    assert broker.claim(1) == []
+    assert broker.take_result("a") is None
+    broker.complete(current, b"result")
+    assert broker.take_result("a") == b"result"
+
+
+def test_lease_expiring_max_attempts_times_fails_the_job(broker, clock):
+    broker.put("a", b"payload")
+    for _ in range(2):
+        broker.claim(1)
+        clock.now += 11
+    assert broker.claim(1) == []
+    assert json.loads(broker.take_result("a"))["status"] == 500
+
+
+def test_uncollected_results_are_deleted(tmp_path, clock):
+    broker = SQLiteBroker(path=str(tmp_path / "queue.sqlite"), result_ttl=300)
+    broker.put("a", b"payload")
+    [job] = broker.claim(1)
+    broker.complete(job, b"result")
+    clock.now += 301
+    # Cleanup runs with the workers' claims
+    broker.claim(1)
+    assert broker.take_result("a") is None
+
+
+def test_results_are_kept_for_result_ttl_after_the_job_finishes(broker, clock):
+    broker.put("a", b"payload")
+    # Queued for longer than result_ttl before a worker got to it
+    clock.now += 400
+    [job] = broker.claim(1)
+    broker.complete(job, b"result")
+    clock.now += 200
+    broker.claim(1)
+    assert broker.take_result("a") == b"result"
+
+
+def test_dispatcher_waits_for_the_worker(tmp_path):
+    broker = SQLiteBroker(path=str(tmp_path / "queue.sqlite"))
+    dispatcher = Dispatcher(mode="queue", broker=lambda: broker, result_timeout=5, max_poll_interval=0.05)
+
+    def worker():
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            for job in broker.claim(1):
+                broker.complete(job, job.unpack()[1].upper())
+                return
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert asyncio.run(dispatcher.submit(b"document")) == b"DOCUMENT"
+    thread.join()
+
+
+def test_worker_spans_join_the_request_trace(tmp_path, monkeypatch):
+    class ListExporter:
+        def __init__(self):
+            self.traces = []
+
+        def export(self, spans):
+            self.traces.append(spans)
+
+    async def run_job(document):
+        with tracing.span("extract"):
+            return document.upper()
+
+    monkeypatch.setattr(ocr, "run_job", run_job)
+    broker = SQLiteBroker(path=str(tmp_path / "queue.sqlite"))
+    dispatcher = Dispatcher(mode="queue", broker=lambda: broker, result_timeout=5, max_poll_interval=0.05)
+    exporter = ListExporter()
+    tracer = Tracer(enabled=True, exporter=exporter)
+
+    async def request():
+        with tracer.trace("POST /dt/ocr_pq7"), tracing.span("queue_wait"):
+            submitted = asyncio.create_task(dispatcher.submit(b"document"))
+            while not (jobs := await asyncio.to_thread(broker.claim, 1)):
+                await asyncio.sleep(0.01)
+            # The worker is another process: none of the request's context
+            await asyncio.create_task(worker.handle(broker, tracer, jobs[0]), context=contextvars.Context())
+            return await submitted
+
+    assert asyncio.run(request()) == b"DOCUMENT"
+    tracer.flush()
+    (extract, job), (wait, root) = exporter.traces
+    assert {span.trace_id for span in (extract, job, wait)} == {root.trace_id}
+    assert (extract.parent_id, job.parent_id, wait.parent_id) == (job.span_id, wait.span_id, root.span_id)
+
+
+def test_dispatcher_times_out(tmp_path):
+    broker = SQLiteBroker(path=str(tmp_path / "queue.sqlite"))
+    dispatcher = Dispatcher(mode="queue", broker=lambda: broker, result_timeout=0.1)
+    with pytest.raises(TimeoutError):
+        asyncio.run(dispatcher.submit(b"document"))
+
+
+def test_undecodable_document_is_a_final_result():
+    container = create_container(["near_duplicates.enabled=false"])
+    try:
+        result = json.loads(asyncio.run(ocr.run_job(b"plain text, not a document")))
+    finally:
+        container.unwire()
+    assert result["status"] == 415
+    assert result["detail"]["error_code"] == "UNSUPPORTED_DOCUMENT"
@@ -0,0 +1,37 @@
+import json
+
+from dt_receipt_ocr.tools import bulk
+
+
+def failing_init(overrides):
+    raise RuntimeError("no OCR engine")
+
+
+def test_broken_pool_records_errors_and_fails(tmp_path, monkeypatch):
+    # Spawned workers import this module, so the initializer is found by name
+    monkeypatch.setattr(bulk, "_init_worker", failing_init)
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    for name in ("a.jpg", "b.jpg"):
+        (archive / name).write_bytes(b"jpeg bytes")
+    out = tmp_path / "results.jsonl"
+
+    status = bulk.main([str(archive), "--out", str(out), "--workers", "1", "--llm-concurrency", "1"])
+
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert status == 1
+    assert sorted(record["id"] for record in records) == sorted(str(archive / name) for name in ("a.jpg", "b.jpg"))
+    assert all(record["status"] == "error" and "BrokenProcessPool" in record["error"] for record in records)
+    # Recorded as errors, so --retry-errors redoes them
+    assert bulk.load_checkpoint(out, retry_errors=True) == set()
+
+
+def test_checkpoint_skips_finished_documents(tmp_path):
+    out = tmp_path / "results.jsonl"
+    out.write_text(
+        json.dumps({"id": "a", "status": "ok"}) + "\n"
+        + json.dumps({"id": "b", "status": "error"}) + "\n"
+        + '{"id": "c", "sta'
+    )
+    assert bulk.load_checkpoint(out, retry_errors=False) == {"a", "b"}
+    assert bulk.load_checkpoint(out, retry_errors=True) == {"a"}
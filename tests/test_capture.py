@@ -0,0 +1,101 @@
+import hashlib
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from dt_receipt_ocr.core import capture
+from dt_receipt_ocr.core.capture import CaptureMiddleware, TrafficRecorder
+from dt_receipt_ocr.tools import replay
+
+
+def captured_app(recorder):
+    app = FastAPI()
+    app.state.capture = recorder
+    app.add_middleware(CaptureMiddleware, prefix="/dt")
+
+    @app.post("/dt/ocr_pq7")
+    async def by_url(body: dict):
+        capture.note_document(b"document", hashlib.sha256(b"document").hexdigest())
+        return {"receipt_number": "NP1"}
+
+    @app.post("/dt/ocr_pq7/upload")
+    async def upload(request: Request):
+        file_bytes = await request.body()
+        capture.note_document(file_bytes, hashlib.sha256(file_bytes).hexdigest())
+        return {"receipt_number": "NP2"}
+
+    @app.get("/health/live")
+    async def live():
+        return {"status": "ok"}
+
+    return app
+
+
+def read_entries(recorder):
+    return [json.loads(line) for line in recorder.path.read_text().splitlines()]
+
+
+def test_requests_are_recorded_without_api_keys(tmp_path):
+    recorder = TrafficRecorder(enabled=True, path=str(tmp_path / "requests.jsonl"))
+    client = TestClient(captured_app(recorder))
+    client.post("/dt/ocr_pq7", json={"file_url": "https://example.com/a.jpg"}, headers={"X-API-Key": "secret"})
+    client.get("/health/live")
+
+    [entry] = read_entries(recorder)
+    assert entry["path"] == "/dt/ocr_pq7" and entry["status"] == 200
+    assert entry["request"] == {"file_url": "https://example.com/a.jpg"}
+    assert entry["response"] == {"receipt_number": "NP1"}
+    assert entry["document_sha256"] == hashlib.sha256(b"document").hexdigest()
+    assert "secret" not in recorder.path.read_text()
+
+
+def test_uploads_are_stored_by_hash(tmp_path):
+    recorder = TrafficRecorder(
+        enabled=True,
+        path=str(tmp_path / "requests.jsonl"),
+        store_documents=True,
+        documents_dir=str(tmp_path / "documents"),
+    )
+    client = TestClient(captured_app(recorder))
+    client.post("/dt/ocr_pq7/upload", content=b"jpeg bytes", headers={"content-type": "image/jpeg"})
+
+    [entry] = read_entries(recorder)
+    digest = hashlib.sha256(b"jpeg bytes").hexdigest()
+    assert entry["request"] is None
+    assert entry["request_sha256"] == digest and entry["request_bytes"] == 10
+    assert (tmp_path / "documents" / digest).read_bytes() == b"jpeg bytes"
+
+
+def test_disabled_recorder_writes_nothing(tmp_path):
+    recorder = TrafficRecorder(enabled=False, path=str(tmp_path / "requests.jsonl"))
+    TestClient(captured_app(recorder)).post("/dt/ocr_pq7", json={"file_url": "https://example.com/a.jpg"})
+    assert not recorder.path.exists()
+
+
+def test_replay_diff_names_the_changed_fields():
+    expected = {"receipt_number": "NP1", "detail": {"error_code": "A"}}
+    actual = {"receipt_number": "NP2", "detail": {"error_code": "A"}}
+    assert replay.diff(expected, actual) == ["receipt_number: 'NP1' != 'NP2'"]
+    assert replay.diff(None, {"a": 1}) == ["body: None != {'a': 1}"]
+
+
+def test_replay_requests(tmp_path):
+    document = tmp_path / "abc"
+    document.write_bytes(b"jpeg bytes")
+    by_url = {"path": "/dt/ocr_pq7", "request": {"file_url": "https://x"}, "document_sha256": "abc"}
+    upload = {"path": "/dt/ocr_pq7/upload", "request": None, "document_path": "/elsewhere/abc"}
+
+    assert replay.build_request(by_url, as_upload=False, documents_dir=None) == ("/dt/ocr_pq7", {"json": {"file_url": "https://x"}})
+    # Stored documents are found in a moved directory by name
+    path, kwargs = replay.build_request(upload, as_upload=False, documents_dir=tmp_path)
+    assert path == "/dt/ocr_pq7/upload" and kwargs["content"] == b"jpeg bytes"
+    # Without the document an upload cannot be replayed
+    assert replay.build_request(upload, as_upload=False, documents_dir=None) is None
+
+
+def test_replay_percentiles():
+    assert replay.percentiles([]) == {}
+    assert replay.percentiles([5.0]) == {"p50": 5.0}
+    cuts = replay.percentiles([float(ms) for ms in range(1, 101)])
+    assert cuts["max"] == 100.0 and 50 <= cuts["p50"] <= 51
@@ -0,0 +1,79 @@
+import numpy as np
+
+from dt_receipt_ocr.core import coarse_to_fine
+from dt_receipt_ocr.core.coarse_to_fine import CoarseToFine
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER
+
+from .conftest import line
+
+
+class SizedOCR:
+    """Returns `results[width]` for an image of that width; re-recognizes every crop as `reread`."""
+
+    def __init__(self, results, reread=("", 0.0)):
+        self.results = results
+        self.reread = reread
+        self.widths = []
+
+    def ocr(self, img, cls=True):
+        self.widths.append(img.shape[1])
+        return [self.results.get(img.shape[1])]
+
+    def text_recognizer(self, crops):
+        return [self.reread] * len(crops), 0.0
+
+
+def region(width=1280, height=320):
+    return np.full((height, width, 3), 255, dtype=np.uint8)
+
+
+def test_small_region_is_read_once_at_full_size():
+    ocr = SizedOCR({400: [line("By Truck", 10, 10)]})
+    lines = CoarseToFine(max_side=640).read(region(400, 100), ocr, DEFAULT_MATCHER)
+    assert ocr.widths == [400]
+    assert lines.texts.tolist() == ["By Truck"]
+
+
+def test_coarse_lines_are_scaled_to_region_pixels():
+    ocr = SizedOCR({640: [line("By Truck", 10, 20, width=50, height=10)]})
+    lines = CoarseToFine(max_side=640).read(region(), ocr, DEFAULT_MATCHER)
+    assert ocr.widths == [640]
+    assert lines.boxes[0].tolist() == [[20, 40], [120, 40], [120, 60], [20, 60]]
+
+
+def test_label_without_value_escalates_the_region():
+    before = coarse_to_fine.REGION_ESCALATIONS.value(field="receipt_number")
+    ocr = SizedOCR({
+        640: [line("Receipt No.", 10, 10), line("NPGOO4", 120, 10)],
+        1280: [line("Receipt No.", 20, 20), line("NP60046795", 240, 20)],
+    })
+    reader = CoarseToFine(max_side=640, fields=["receipt_number"])
+    lines = reader.read(region(), ocr, DEFAULT_MATCHER)
+    assert ocr.widths == [640, 1280]
+    assert "NP60046795" in lines.texts.tolist()
+    assert coarse_to_fine.REGION_ESCALATIONS.value(field="receipt_number") == before + 1
+
+
+def test_expected_field_escalates_without_a_label():
+    ocr = SizedOCR({640: [line("illegible", 10, 10)], 1280: []})
+    reader = CoarseToFine(max_side=640, fields=["receipt_number"])
+    reader.read(region(), ocr, DEFAULT_MATCHER, expected=["receipt_number"])
+    assert ocr.widths == [640, 1280]
+
+
+def test_low_scores_are_recognized_again_and_the_better_reading_kept():
+    ocr = SizedOCR(
+        {640: [line("By Truck", 10, 10, score=0.99), line("8y Tnuck", 10, 40, score=0.6), line("??", 10, 70, score=0.5)]},
+        reread=(" By Truck ", 0.97),
+    )
+    lines = CoarseToFine(max_side=640, min_score=0.85).read(region(), ocr, DEFAULT_MATCHER)
+    assert ocr.widths == [640]
+    assert lines.texts.tolist() == ["By Truck", "By Truck", "By Truck"]
+    assert np.allclose(lines.scores, [0.99, 0.97, 0.97])
+
+
+def test_worse_rereading_keeps_the_coarse_line():
+    ocr = SizedOCR({640: [line("By Truck", 10, 10, score=0.7)]}, reread=("junk", 0.3))
+    lines = CoarseToFine(max_side=640).read(region(), ocr, DEFAULT_MATCHER)
+    assert lines.texts.tolist() == ["By Truck"]
+    assert np.isclose(lines.scores[0], 0.7)
@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from dt_receipt_ocr.core.decode import PageDecoder, UnsupportedDocument
+
+
+def encode(img: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale():
+    data = encode(Image.new("RGB", (4000, 3000), (200, 200, 200)), "JPEG")
+    decoder = PageDecoder(target_side=2000)
+    page = decoder.decode(data)
+    assert page.shape == (1500, 2000, 3)
+    assert page.dtype == np.uint8 and page.flags.c_contiguous
+    assert decoder.pixels(data) == 2000 * 1500
+
+
+def test_small_jpeg_keeps_its_size():
+    data = encode(Image.new("RGB", (1200, 900)), "JPEG")
+    assert PageDecoder(target_side=2000).decode(data).shape == (900, 1200, 3)
+
+
+def test_pages_are_bgr():
+    data = encode(Image.new("RGB", (40, 30), (255, 0, 0)), "PNG")
+    page = PageDecoder().decode(data)
+    assert page[0, 0].tolist() == [0, 0, 255]
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise to display
+    data = encode(Image.new("RGB", (400, 300)), "JPEG", exif=exif)
+    assert PageDecoder().decode(data).shape == (400, 300, 3)
+
+
+def test_formats_opencv_cannot_read_fall_back_to_pillow():
+    data = encode(Image.new("RGB", (40, 30), (0, 0, 255)), "GIF")
+    page = PageDecoder().decode(data)
+    assert page.shape == (30, 40, 3)
+    assert page[0, 0].tolist() == [255, 0, 0]
+
+
+def test_unreadable_header_is_unsupported():
+    with pytest.raises(UnsupportedDocument):
+        PageDecoder().pixels(b"\xff\xd8\xff not really a jpeg")
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "TIFF", "JPEG"])
+def test_images_over_pillows_bomb_limit_are_sized(fmt, monkeypatch):
+    data = encode(Image.new("RGB", (400, 300)), fmt)
+    # Image.open refuses images over twice this
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    assert PageDecoder(target_side=2000).pixels(data) == 400 * 300
+
+
+@pytest.mark.parametrize("target_side, expected", [(2000, 2), (1000, 4), (500, 8), (5000, 1)])
+def test_reduction_keeps_the_target_side(target_side, expected):
+    assert PageDecoder(target_side=target_side).reduction(4032, 3024) == expected
+
+
+@pytest.mark.parametrize("data", [b"", b"plain text", b"\xff\xd8\xff\xe0 truncated", b"\x89PNG\r\n\x1a\n truncated"])
+def test_unreadable_bytes_are_unsupported(data):
+    decoder = PageDecoder(max_pages=2)
+    with pytest.raises(UnsupportedDocument):
+        decoder.pixels(data)
+    with pytest.raises(UnsupportedDocument):
+        decoder.decode_pages(data)
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+
+import numpy as np
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.core.field_decoding import DECODES, ConstrainedDecoder, FieldDecoding
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER, DEFAULT_PATTERNS_PATH
+
+CHARACTER = ["blank", *"NP0123456789/ ODSIabcdeiptx"]
+
+
+class GreedyDecoder:
+    """Plain greedy CTC decoding over CHARACTER, like PaddleOCR's CTCLabelDecode."""
+
+    character = CHARACTER
+
+    def __call__(self, preds, label=None):
+        results = []
+        for prob in preds:
+            index = prob.argmax(axis=1)
+            keep = index != 0
+            keep[1:] &= index[1:] != index[:-1]
+            results.append(("".join(CHARACTER[i] for i in index[keep]), float(prob[keep].max(axis=1).mean())))
+        return results
+
+
+def logits(readings):
+    """
+    One frame per character, then a blank frame. A reading is the character
+    the model prefers, optionally followed by its runner-up, e.g. "O0".
+    """
+    frames = []
+    for reading in readings:
+        frame = np.full(len(CHARACTER), 0.001, dtype=np.float32)
+        # Blank just above the rest, so a masked frame without a runner-up decodes as blank
+        frame[0] = 0.002
+        frame[CHARACTER.index(reading[0])] = 0.6
+        if len(reading) > 1:
+            frame[CHARACTER.index(reading[1])] = 0.3
+        blank = np.full(len(CHARACTER), 0.001, dtype=np.float32)
+        blank[0] = 0.99
+        frames += [frame, blank]
+    return np.stack(frames)[None]
+
+
+def field_decoding(enabled=True):
+    patterns = OmegaConf.to_object(OmegaConf.load(DEFAULT_PATTERNS_PATH))
+    return FieldDecoding(enabled=enabled, patterns=patterns, matcher=DEFAULT_MATCHER)
+
+
+def engine():
+    return SimpleNamespace(text_recognizer=SimpleNamespace(postprocess_op=GreedyDecoder()))
+
+
+def decoder():
+    return field_decoding().install(engine()).text_recognizer.postprocess_op
+
+
+NP_NUMBER = ["N", "P", "6", "O0", "O0", "4", "6", "7", "9", "S5"]
+
+
+def test_receipt_number_is_reread_with_its_charset():
+    [(text, score)] = decoder()(logits(NP_NUMBER))
+    assert text == "NP60046795"
+    # The corrected characters score as their runner-up reading
+    assert np.isclose(score, (7 * 0.6 + 3 * 0.3) / 10)
+
+
+def test_rest_of_the_line_is_left_alone():
+    [(text, _)] = decoder()(logits([*"tax ID ", *NP_NUMBER]))
+    assert text == "tax ID NP60046795"
+
+
+def test_date_separators_survive():
+    [(text, _)] = decoder()(logits(["1", "2", "/", "O0", "5", "/", "2", "O0", "2", "5"]))
+    assert text == "12/05/2025"
+
+
+def test_span_without_a_plausible_reading_is_kept_as_read():
+    # No digit is even second best for the "I": the constrained value would be a digit short
+    readings = [*NP_NUMBER[:-2], "Ia", "S5"]
+    before = DECODES.value(field="receipt_number", result="rejected")
+    [(text, _)] = decoder()(logits(readings))
+    assert text == "NP6OO467IS"
+    assert DECODES.value(field="receipt_number", result="rejected") == before + 1
+
+
+def test_correct_reading_is_unchanged():
+    before = DECODES.value(field="receipt_number", result="unchanged")
+    [(text, score)] = decoder()(logits([*"NP60046795"]))
+    assert text == "NP60046795" and np.isclose(score, 0.6)
+    assert DECODES.value(field="receipt_number", result="unchanged") == before + 1
+
+
+def test_only_limits_the_fields_in_this_thread():
+    decoding = field_decoding()
+    constrained = decoding.install(engine()).text_recognizer.postprocess_op
+    with decoding.only(["export_date"]):
+        assert constrained(logits(NP_NUMBER))[0][0] == "NP6OO4679S"
+    assert constrained(logits(NP_NUMBER))[0][0] == "NP60046795"
+
+
+def test_install_wraps_only_when_enabled():
+    assert isinstance(field_decoding().install(engine()).text_recognizer.postprocess_op, ConstrainedDecoder)
+    assert isinstance(field_decoding(enabled=False).install(engine()).text_recognizer.postprocess_op, GreedyDecoder)
+    # Engines without a CTC decoder are returned as they are
+    bare = SimpleNamespace()
+    assert field_decoding().install(bare) is bare
+
+
+def test_decoder_attributes_pass_through():
+    assert decoder().character is CHARACTER
@@ -0,0 +1,78 @@
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER, KEYWORD, PATTERN, FieldMatcher
+
+
+def test_keywords_do_not_match_inside_words():
+    matches = DEFAULT_MATCHER.scan(["Information form", "Platform B", "FORM P.Q.7"])
+    assert [match.line for match in matches.of("form_number", KEYWORD)] == [0, 2]
+
+
+def test_keyword_occurs_once_per_label():
+    matches = DEFAULT_MATCHER.scan(["Information form"])
+    assert len(matches.of("form_number", KEYWORD)) == 1
+
+
+def test_spaced_receipt_number_is_joined():
+    matches = DEFAULT_MATCHER.scan(["Receipt No. NP 6004 6795"])
+    assert matches.first("receipt_number") == "NP60046795"
+    assert DEFAULT_MATCHER.search("receipt_number", "NP 6004 6795") == "NP60046795"
+
+
+def test_date_after_the_receipt_number_is_not_part_of_it():
+    matches = DEFAULT_MATCHER.scan(["NP 6004 6795 12/05/2025"])
+    assert matches.first("receipt_number") == "NP60046795"
+    assert matches.first("export_date") == "12/05/2025"
+
+
+def test_value_is_the_first_group():
+    matches = DEFAULT_MATCHER.scan(["Gross 22,500.0000 KGS"])
+    assert matches.first("total_weight") == "22,500.0000"
+    assert matches.first("form_number") == ""
+
+
+def test_matches_are_in_line_then_position_order():
+    matches = DEFAULT_MATCHER.scan(["Date of exportation 15/05/2025", "Form P.Q.7"])
+    assert [(match.field, match.kind, match.line) for match in matches] == [
+        ("export_date", KEYWORD, 0),
+        ("export_date", PATTERN, 0),
+        ("form_number", KEYWORD, 1),
+        ("form_number", PATTERN, 1),
+    ]
+    assert len(matches) == 4
+
+
+def test_value_at_reads_one_line():
+    matches = DEFAULT_MATCHER.scan(["by truck", "01/02/2025", "03/04/2025"])
+    assert matches.value_at("export_date", 2) == "03/04/2025"
+    assert matches.value_at("export_date", 0) == ""
+    # Same answers once the field has been scanned
+    assert matches.first("export_date") == "01/02/2025"
+    assert matches.value_at("export_date", 2) == "03/04/2025"
+
+
+def test_fields_are_scanned_on_first_use():
+    scanned = []
+
+    class Recording(FieldMatcher):
+        def _scan(self, field, kind, scan):
+            scanned.append((field, kind))
+            return super()._scan(field, kind, scan)
+
+    matcher = Recording({"a": {"patterns": ["a+"]}, "b": {"patterns": ["b+"]}})
+    matches = matcher.scan(["aa bb"])
+    assert scanned == []
+    assert matches.first("a") == "aa"
+    assert matches.first("a") == "aa"
+    assert scanned == [("a", PATTERN)]
+
+
+def test_regex_keywords_without_a_plain_literal():
+    matcher = FieldMatcher({"weight": {"patterns": [], "keywords": [r"\bgross\s+weight\b"]}})
+    matches = matcher.scan(["Gross  Weight", "grossweight"])
+    assert [match.line for match in matches.of("weight", KEYWORD)] == [0]
+
+
+def test_keyword_lines_survive_lowercasing_that_changes_length():
+    # "İ".lower() is two code points, so positions in the lowered text run ahead
+    texts = ["İ" * 30, "Date of exportation", "x", "y", "z", "w", "v"]
+    [match] = DEFAULT_MATCHER.scan(texts).of("export_date", KEYWORD)
+    assert match.line == 1
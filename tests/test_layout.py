@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.core import layout as layout_module
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER
+from dt_receipt_ocr.core.layout import REGISTRATIONS, LayoutRegistrar, order_corners
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+
+from .conftest import line
+
+ROIS = {"header": {"box": [0.1, 0.1, 0.5, 0.2], "fields": ["receipt_number"]}, "notes": {"box": [0.5, 0.8, 0.9, 0.9]}}
+
+
+def photographed_form(corners):
+    """A template-sized form, with a black ROI square, warped onto a dark desk."""
+    template = np.full((566, 400, 3), 255, dtype=np.uint8)
+    template[57:113, 40:200] = 0
+    desk = np.full((1000, 800, 3), 40, dtype=np.uint8)
+    src = np.float32([[0, 0], [400, 0], [400, 566], [0, 566]])
+    matrix = cv2.getPerspectiveTransform(src, np.float32(corners))
+    return cv2.warpPerspective(template, matrix, (800, 1000), dst=desk, borderMode=cv2.BORDER_TRANSPARENT)
+
+
+def test_order_corners():
+    shuffled = [[300, 420], [20, 30], [10, 400], [310, 20]]
+    assert order_corners(shuffled).tolist() == [[20, 30], [310, 20], [300, 420], [10, 400]]
+
+
+def test_tilted_form_is_registered_and_cropped_in_template_pixels():
+    registrar = LayoutRegistrar(ROIS, width=400, height=566)
+    img = photographed_form([[120, 100], [680, 130], [660, 900], [90, 870]])
+    regions = registrar.regions(img)
+    assert set(regions) == {"header", "notes"}
+
+    roi, origin = regions["header"]
+    assert origin == (40, 57)
+    assert roi.shape == (56, 160, 3)
+    # The ROI is the black square, give or take the edge pixels of the frame fit
+    assert np.mean(roi[4:-4, 4:-4] < 100) > 0.95
+    assert np.mean(regions["notes"][0] > 200) > 0.95
+
+
+def test_no_frame_means_no_regions():
+    registrar = LayoutRegistrar(ROIS, width=400, height=566)
+    before = REGISTRATIONS.value(result="no_frame")
+    assert registrar.regions(np.full((1000, 800, 3), 255, dtype=np.uint8)) is None
+    assert REGISTRATIONS.value(result="no_frame") == before + 1
+
+
+def test_frame_of_the_wrong_shape_is_rejected():
+    registrar = LayoutRegistrar(ROIS, width=400, height=566)
+    # A landscape quad where a portrait form is expected
+    img = photographed_form([[50, 200], [750, 200], [750, 700], [50, 700]])
+    assert registrar.register(img) is None
+
+
+def test_verify_needs_a_field_in_every_roi_that_lists_one():
+    registrar = LayoutRegistrar(ROIS, width=400, height=566)
+    found = OCRLines.from_paddle([line("Receipt No. NP60046795", 0, 0)])
+    missing = OCRLines.from_paddle([line("Gross weight", 0, 0)])
+    empty = OCRLines.from_paddle([])
+    before = REGISTRATIONS.value(result="unverified")
+    assert registrar.verify({"header": found, "notes": empty}, DEFAULT_MATCHER)
+    assert not registrar.verify({"header": missing, "notes": empty}, DEFAULT_MATCHER)
+    assert REGISTRATIONS.value(result="unverified") == before + 1
+
+
+def test_shipped_rois_do_not_overlap():
+    layout = OmegaConf.load(Path(layout_module.__file__).parents[1] / "conf" / "layout" / "pq7.yaml")
+    boxes = [roi.box for roi in layout.rois.values()]
+    for i, (ax0, ay0, ax1, ay1) in enumerate(boxes):
+        for bx0, by0, bx1, by1 in boxes[i + 1 :]:
+            assert min(ax1, bx1) <= max(ax0, bx0) or min(ay1, by1) <= max(ay0, by0)
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).parents[1] / "src"
+HEAVY = ["paddleocr", "paddle", "onnxruntime", "openai", "hydra", "sqlalchemy", "redis"]
+
+
+def loaded_after(statement: str) -> list[str]:
+    """Heavy libraries in sys.modules after running `statement` in a fresh interpreter."""
+    code = f"import json, sys\n{statement}\nprint(json.dumps([name for name in {HEAVY!r} if name in sys.modules]))"
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": str(SRC)},
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "module", ["dt_receipt_ocr.main", "dt_receipt_ocr.worker", "dt_receipt_ocr.server", "dt_receipt_ocr.core.utils"]
+)
+def test_entry_points_do_not_load_engines_or_clients(module):
+    assert loaded_after(f"import {module}") == []
+
+
+def test_config_is_composed_with_hydra_on_demand():
+    assert loaded_after("from dt_receipt_ocr.main import load_config\nload_config()") == ["hydra"]
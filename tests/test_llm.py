@@ -0,0 +1,86 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from dt_receipt_ocr.core import llm
+from dt_receipt_ocr.core.llm import INSTRUCTIONS, PQ7Extractor, response_schema
+
+FIELDS = {
+    "receipt_number": "NP60046795",
+    "destination_country": "CHINA",
+    "transportation_mode": "By Truck",
+    "total_weight": "",
+    "number_of_boxes": 1250,
+    "export_date": "12/05/2025",
+}
+
+
+class FakeCompletions:
+    """`client.chat.completions` of an AsyncOpenAI client returning `content`."""
+
+    def __init__(self, content: str, finish_reason: str = "stop", cached_tokens: int | None = 900):
+        self.content = content
+        self.finish_reason = finish_reason
+        self.cached_tokens = cached_tokens
+        self.requests = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        details = SimpleNamespace(cached_tokens=self.cached_tokens)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(finish_reason=self.finish_reason, message=SimpleNamespace(content=self.content))],
+            usage=SimpleNamespace(prompt_tokens=1000, completion_tokens=60, prompt_tokens_details=details),
+        )
+
+
+def extractor(completions, **kwargs):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return PQ7Extractor(client, **kwargs)
+
+
+def test_schema_requires_exactly_the_model_fields():
+    schema = response_schema()["json_schema"]["schema"]
+    assert sorted(schema["required"]) == sorted(FIELDS)
+    assert schema["additionalProperties"] is False
+
+
+def test_prompt_prefix_is_the_same_for_every_document():
+    pq7 = extractor(FakeCompletions("{}"), suffix="/no_think")
+    first, second = pq7.messages("Receipt No. NP1"), pq7.messages("Receipt No. NP2")
+    assert first[0] == second[0] == {"role": "system", "content": INSTRUCTIONS}
+    assert first[1]["content"] == "TEXT TO PROCESS:\nReceipt No. NP1\n/no_think"
+
+
+def test_extract_sends_a_capped_constrained_request_and_counts_tokens():
+    completions = FakeCompletions(json.dumps(FIELDS))
+    pq7 = extractor(completions, max_tokens=128)
+    cached_before = llm.CACHED_TOKENS.value()
+    result = asyncio.run(pq7.extract("Receipt No. NP60046795"))
+
+    assert result.model_dump() == FIELDS
+    [request] = completions.requests
+    assert request["max_tokens"] == 128
+    assert request["response_format"]["type"] == "json_schema"
+    assert llm.CACHED_TOKENS.value() == cached_before + 900
+
+
+def test_think_block_before_the_json_is_skipped():
+    completions = FakeCompletions("<think>\n</think>\n" + json.dumps(FIELDS), cached_tokens=None)
+    assert asyncio.run(extractor(completions).extract("text")).receipt_number == "NP60046795"
+
+
+def test_truncated_answer_is_counted_and_raises():
+    before = llm.REQUESTS.value(finish_reason="length")
+    completions = FakeCompletions(json.dumps(FIELDS)[:40], finish_reason="length")
+    with pytest.raises(ValueError):
+        asyncio.run(extractor(completions).extract("text"))
+    assert llm.REQUESTS.value(finish_reason="length") == before + 1
+
+
+def test_answer_missing_a_field_is_rejected():
+    completions = FakeCompletions(json.dumps({key: value for key, value in FIELDS.items() if key != "export_date"}))
+    with pytest.raises(ValidationError):
+        asyncio.run(extractor(completions).extract("text"))
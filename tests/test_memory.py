@@ -0,0 +1,105 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from dt_receipt_ocr.core import memory
+from dt_receipt_ocr.core.memory import MemoryBudget, MemoryBudgetExceeded
+
+
+def test_document_larger_than_the_budget_is_rejected_outright():
+    budget = MemoryBudget(max_bytes=1000, bytes_per_pixel=10)
+
+    async def scenario():
+        async with budget.admit(101):
+            pass
+
+    with pytest.raises(MemoryBudgetExceeded) as exceeded:
+        asyncio.run(scenario())
+    assert not exceeded.value.retryable
+    assert budget.admitted == 0
+
+
+def test_document_waits_for_room():
+    budget = MemoryBudget(max_bytes=1000, bytes_per_pixel=10, wait_seconds=5)
+    order = []
+
+    async def document(name, pixels, hold):
+        async with budget.admit(pixels):
+            order.append(f"{name} start")
+            await asyncio.sleep(hold)
+            order.append(f"{name} end")
+
+    async def scenario():
+        first = asyncio.create_task(document("first", 60, 0.05))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, document("second", 60, 0))
+
+    asyncio.run(scenario())
+    assert order == ["first start", "first end", "second start", "second end"]
+    assert budget.admitted == 0
+
+
+def test_wait_times_out_as_retryable():
+    budget = MemoryBudget(max_bytes=1000, bytes_per_pixel=10, wait_seconds=0.05)
+
+    async def scenario():
+        async with budget.admit(60):
+            async with budget.admit(60):
+                pass
+
+    with pytest.raises(MemoryBudgetExceeded) as exceeded:
+        asyncio.run(scenario())
+    assert exceeded.value.retryable
+    assert budget.admitted == 0
+
+
+def test_documents_that_fit_run_together():
+    budget = MemoryBudget(max_bytes=1000, bytes_per_pixel=10, wait_seconds=0)
+
+    async def scenario():
+        async with budget.admit(40):
+            async with budget.admit(40):
+                assert budget.admitted == 800
+
+    asyncio.run(scenario())
+
+
+def test_disabled_budget_admits_anything():
+    budget = MemoryBudget(enabled=False, max_bytes=1)
+
+    async def scenario():
+        async with budget.admit(10**9):
+            assert budget.admitted == 0
+
+    asyncio.run(scenario())
+
+
+def test_traced_document_reports_stage_peaks():
+    budget = MemoryBudget(trace_every_n=1)
+    before = memory.STAGE_PEAK.value(stage="decode")
+
+    async def scenario():
+        async with budget.admit(1000):
+            with budget.stage("decode"):
+                page = np.ones((1000, 1000), dtype=np.uint8)
+                del page
+
+    asyncio.run(scenario())
+    assert memory.STAGE_PEAK.value(stage="decode") - before >= 1_000_000
+    assert memory.BYTES_PER_PIXEL_MAX.value() >= 1000
+
+
+def test_untraced_stage_costs_nothing():
+    budget = MemoryBudget(trace_every_n=0)
+    before = memory.STAGE_PEAK.value(stage="untraced")
+    with budget.stage("untraced"):
+        np.ones(1000)
+    assert memory.STAGE_PEAK.value(stage="untraced") == before
+
+
+@pytest.mark.skipif(not memory.Path("/proc/self/smaps_rollup").exists(), reason="needs Linux /proc")
+def test_process_memory_breakdown():
+    usage = memory.process_memory()
+    assert usage["rss"] >= usage["uss"] > 0
+    assert memory.resident_bytes() > 0
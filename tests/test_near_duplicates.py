@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+from dt_receipt_ocr.core import near_duplicates
+from dt_receipt_ocr.core.near_duplicates import NearDuplicateIndex, page_hash
+from dt_receipt_ocr.models.ocr import PQ7Response
+
+
+def document(seed: int):
+    img = np.full((1400, 1000, 3), 245, dtype=np.uint8)
+    rng = np.random.default_rng(seed)
+    for _ in range(80):
+        x, y = rng.integers(60, 800), rng.integers(60, 1300)
+        img[y : y + 12, x : x + rng.integers(40, 180)] = 20
+    return img
+
+
+def rephotographed(img):
+    """Smaller, recompressed, darker and with a wider desk margin around the page."""
+    small = cv2.resize(img, None, fx=0.6, fy=0.6, interpolation=cv2.INTER_AREA)
+    small = cv2.imdecode(cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, 70])[1], cv2.IMREAD_COLOR)
+    darker = cv2.convertScaleAbs(small, alpha=0.85, beta=0)
+    return cv2.copyMakeBorder(darker, 40, 30, 25, 35, cv2.BORDER_CONSTANT, value=(208, 208, 208))
+
+
+def result(receipt_number: str) -> PQ7Response:
+    return PQ7Response(
+        receipt_number=receipt_number,
+        destination_country="CHINA",
+        transportation_mode="By Truck",
+        total_weight="",
+        number_of_boxes=1,
+        export_date="",
+    )
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def test_another_photo_of_a_page_hashes_close():
+    original = document(0)
+    assert distance(page_hash(original), page_hash(rephotographed(original))) <= 40
+
+
+def test_different_pages_hash_far_apart():
+    assert distance(page_hash(document(0)), page_hash(document(1))) > 40
+
+
+def test_lookup_returns_a_copy_of_the_closest_result():
+    index = NearDuplicateIndex(max_distance=3)
+    index.add(0b0000, result("NP1"))
+    index.add(0b1111_0000, result("NP2"))
+    found = index.lookup(0b0001)
+    assert found.receipt_number == "NP1"
+    found.receipt_number = "changed"
+    assert index.lookup(0b0001).receipt_number == "NP1"
+    assert index.lookup(0b1111_1111_0000_0000) is None
+
+
+def test_least_recently_used_is_evicted():
+    index = NearDuplicateIndex(max_distance=0, max_entries=2)
+    index.add(1, result("NP1"))
+    index.add(2, result("NP2"))
+    index.lookup(1)
+    index.add(4, result("NP4"))
+    assert index.lookup(2) is None
+    assert index.lookup(1).receipt_number == "NP1"
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(near_duplicates.time, "monotonic", lambda: now[0])
+    index = NearDuplicateIndex(max_distance=0, ttl_seconds=60)
+    index.add(1, result("NP1"))
+    now[0] += 59
+    assert index.lookup(1) is not None
+    now[0] += 2
+    assert index.lookup(1) is None
+    assert near_duplicates.ENTRIES.value() == 0
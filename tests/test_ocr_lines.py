@@ -0,0 +1,74 @@
+import numpy as np
+
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+
+from tests.conftest import line
+
+
+def test_from_paddle_strips_texts_and_reshapes_boxes():
+    lines = OCRLines.from_paddle([line("  Form P.Q.7 ", 10, 20, score=0.9)])
+    assert lines.texts.tolist() == ["Form P.Q.7"]
+    assert lines.boxes.shape == (1, 4, 2)
+    assert lines.boxes[0, 2].tolist() == [110, 40]
+    assert lines.scores.tolist() == [np.float32(0.9)]
+
+
+def test_from_paddle_of_an_empty_page():
+    assert len(OCRLines.from_paddle(None)) == 0
+    assert len(OCRLines.from_paddle([])) == 0
+
+
+def test_extents_and_centroids():
+    lines = OCRLines.from_paddle([line("a b", 10, 20, width=100, height=20)])
+    assert lines.mins.tolist() == [[10, 20]]
+    assert lines.maxs.tolist() == [[110, 40]]
+    assert lines.centroids.tolist() == [[60, 30]]
+
+
+def test_filter_drops_low_confidence_short_and_non_latin_lines():
+    lines = OCRLines.from_paddle([
+        line("kept", 0, 0),
+        line("unsure", 0, 30, score=0.5),
+        line("x", 0, 60),
+        line("植物检疫证书", 0, 90),
+        line("P.Q.7 检疫", 0, 120),
+    ])
+    assert lines.filter().texts.tolist() == ["kept", "P.Q.7 检疫"]
+
+
+def test_sort_reading_order_is_top_to_bottom_then_left_to_right():
+    lines = OCRLines.from_paddle([line("second", 300, 10), line("third", 0, 50), line("first", 0, 10)])
+    assert lines.sort_reading_order().texts.tolist() == ["first", "second", "third"]
+
+
+def test_sort_reading_order_with_a_mask_matches_filter_then_sort():
+    lines = OCRLines.from_paddle([
+        line("second", 300, 10), line("x", 0, 30), line("third", 0, 50), line("first", 0, 10, score=0.7),
+        line("dropped", 0, 0, score=0.1),
+    ])
+    fused = lines.sort_reading_order(keep=lines.filter_mask())
+    separate = lines.filter().sort_reading_order()
+    assert fused.texts.tolist() == separate.texts.tolist() == ["first", "second", "third"]
+    assert np.array_equal(fused.boxes, separate.boxes)
+
+
+def test_concat_offset_and_scale():
+    top = OCRLines.from_paddle([line("top", 0, 0)])
+    bottom = OCRLines.from_paddle([line("bottom", 0, 0)]).offset(5, 100)
+    lines = OCRLines.concat([top, OCRLines.empty(), bottom])
+    assert lines.texts.tolist() == ["top", "bottom"]
+    assert lines.mins.tolist() == [[0, 0], [5, 100]]
+    assert lines.scale(2).maxs.tolist() == [[200, 40], [210, 240]]
+
+
+def test_contains_and_records():
+    lines = OCRLines.from_paddle([line("Date of exportation", 0, 0), line("15/05/2025", 0, 30)])
+    assert lines.contains("date of", case_sensitive=False).tolist() == [True, False]
+    assert lines.contains("date of").tolist() == [False, False]
+    assert lines.to_records()[1] == {"text": "15/05/2025", "bbox": [[0, 30], [100, 30], [100, 50], [0, 50]]}
+
+
+def test_records_text_is_the_printed_records():
+    lines = OCRLines.from_paddle([line("Receipt No.", 10.4, 20.6), line("it's \"quoted\"", 0, 50)])
+    assert lines.records_text() == str(lines.to_records())
+    assert OCRLines.empty().records_text() == "[]"
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+
+from dt_receipt_ocr.core.onnx_ocr import CTCLabelDecode, TextClassifier, TextRecognizer, sorted_boxes  # noqa: E402
+
+
+class FakeSession:
+    """An `ort.InferenceSession` that returns `outputs(tensor)` for every run."""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.shapes = []
+
+    def get_inputs(self):
+        return [type("Input", (), {"name": "x"})()]
+
+    def run(self, names, feed):
+        self.shapes.append(feed["x"].shape)
+        return [self.outputs(feed["x"])]
+
+
+@pytest.fixture
+def decoder(tmp_path):
+    path = tmp_path / "dict.txt"
+    path.write_text("N\nP\n0\n1\n")
+    return CTCLabelDecode(str(path))
+
+
+def one_hot(indices, classes=6):
+    return np.eye(classes, dtype=np.float32)[indices]
+
+
+def test_ctc_collapses_repeats_and_drops_blanks(decoder):
+    # Characters: 1=N 2=P 3=0 4=1 5=space; a blank separates a real repeat
+    preds = one_hot([[1, 1, 2, 0, 3, 3, 0, 3, 5, 4]])
+    [(text, score)] = decoder(preds)
+    assert text == "NP00 1"
+    assert score == 1.0
+
+
+def test_ctc_all_blank_is_empty(decoder):
+    assert decoder(one_hot([[0, 0, 0]])) == [("", 0.0)]
+
+
+def test_sorted_boxes_reads_rows_left_to_right():
+    def box(x, y):
+        return np.float32([[x, y], [x + 50, y], [x + 50, y + 20], [x, y + 20]])
+
+    # Same row within 10px, the right box slightly higher
+    boxes = sorted_boxes([box(200, 100), box(10, 104), box(10, 50)])
+    assert [tuple(b[0]) for b in boxes] == [(10, 50), (10, 104), (200, 100)]
+
+
+def test_recognizer_keeps_input_order_across_batches(decoder):
+    def outputs(tensor):
+        # Encode each crop's width in the first column, as character 1..4
+        widths = (tensor[:, 0, 0] > 0.5).sum(axis=1)
+        return one_hot((widths // 48).clip(1, 4)[:, None])
+
+    session = FakeSession(outputs)
+    recognizer = TextRecognizer(session, decoder, batch_num=2)
+    crops = [np.full((48, width, 3), 255, np.uint8) for width in (96, 48, 192, 144)]
+    results, _ = recognizer(crops)
+    assert [text for text, _ in results] == ["P", "N", "1", "0"]
+    # Sorted by aspect ratio, two batches padded to the same width
+    assert len(session.shapes) == 2 and all(shape[0] == 2 for shape in session.shapes)
+
+
+def test_classifier_rotates_confident_180_crops():
+    # Black crops read upright, white ones upside down
+    probs = {False: [0.95, 0.05], True: [0.05, 0.95]}
+    session = FakeSession(lambda tensor: np.float32([probs[bool(t[0, 0, 50] > 0)] for t in tensor]))
+    crops = [np.zeros((48, 96, 3), np.uint8), np.full((48, 96, 3), 255, np.uint8)]
+    crops[1][:, :10] = 0
+    rotated, results, _ = TextClassifier(session)(crops)
+    assert [label for label, _ in results] == ["0", "180"]
+    # Dark columns moved from the left to the right edge
+    assert rotated[1][:, -10:].max() == 0 and rotated[1][:, :10].min() == 255
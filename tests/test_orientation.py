@@ -0,0 +1,61 @@
+import numpy as np
+
+from dt_receipt_ocr.core.orientation import PageOrientation, PageOrienter
+
+
+class FakeOrientationOCR:
+    """Detects `boxes` and labels the n-th classified crop `labels[n]`."""
+
+    def __init__(self, boxes, labels):
+        self.boxes = np.float32(boxes)
+        self.labels = labels
+        self.text_classifier = self.classify
+
+    def text_detector(self, img):
+        return self.boxes, 0.0
+
+    def classify(self, crops):
+        return crops, [(label, 0.99) for label in self.labels[: len(crops)]], 0.0
+
+
+def horizontal_lines(count):
+    return [[[50, y], [450, y], [450, y + 20], [50, y + 20]] for y in range(50, 50 + 40 * count, 40)]
+
+
+def page():
+    img = np.zeros((600, 500, 3), dtype=np.uint8)
+    img[:10] = 255
+    return img
+
+
+def test_upside_down_page_is_turned():
+    ocr = FakeOrientationOCR(horizontal_lines(8), ["180"] * 8)
+    img = page()
+    turned, orientation = PageOrienter().orient(img, img, ocr)
+    assert orientation == PageOrientation(angle=180, skew=0.0, confident=True)
+    assert turned[-10:].min() == 255 and turned[:10].max() == 0
+
+
+def test_ambiguous_vote_leaves_the_page_alone():
+    # 5 of 8 lines upside down: a majority, but below min_agreement
+    ocr = FakeOrientationOCR(horizontal_lines(8), ["180"] * 5 + ["0"] * 3)
+    img = page()
+    same, orientation = PageOrienter(min_agreement=0.8).orient(img, img, ocr)
+    assert orientation.angle == 180 and not orientation.confident
+    assert same is img
+
+
+def test_too_few_lines_is_not_confident():
+    ocr = FakeOrientationOCR(horizontal_lines(2), ["180"] * 2)
+    img = page()
+    same, orientation = PageOrienter(min_lines=3).orient(img, img, ocr)
+    assert orientation == PageOrientation()
+    assert same is img
+
+
+def test_vertical_lines_give_a_quarter_turn():
+    vertical = [[[x, 50], [x + 20, 50], [x + 20, 450], [x, 450]] for x in range(50, 370, 40)]
+    ocr = FakeOrientationOCR(vertical, ["0"] * 8)
+    orientation = PageOrienter().detect(page(), ocr)
+    assert orientation.angle == 90 and orientation.confident
+    assert orientation.skew == 0.0
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from dt_receipt_ocr.core import prescreen
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER
+from dt_receipt_ocr.core.prescreen import Prescreen, PrescreenRejected
+
+from .conftest import FakeOCR, line
+
+
+def test_printed_page_passes(page):
+    Prescreen().check_exposure(page)
+
+
+@pytest.mark.parametrize(
+    "img, error_code",
+    [
+        (np.full((1400, 1000, 3), 10, dtype=np.uint8), prescreen.UNDEREXPOSED),
+        (np.full((1400, 1000, 3), 230, dtype=np.uint8), prescreen.BLANK_PAGE),
+    ],
+)
+def test_unusable_exposure_is_rejected(img, error_code):
+    with pytest.raises(PrescreenRejected) as rejected:
+        Prescreen().check_exposure(img)
+    assert rejected.value.error_code == error_code
+
+
+def test_washed_out_page_is_overexposed():
+    # Mostly clipped white with a faint gradient, no ink
+    img = np.full((1400, 1000, 3), 255, dtype=np.uint8)
+    img[:500] = np.linspace(200, 250, 1000, dtype=np.uint8)[None, :, None]
+    with pytest.raises(PrescreenRejected) as rejected:
+        Prescreen().check_exposure(img)
+    assert rejected.value.error_code == prescreen.OVEREXPOSED
+
+
+def test_probe_finds_the_form_number(page):
+    ocr = FakeOCR([line("Form P.Q.7", 10, 10)])
+    lines = Prescreen(probe_side=960).probe_form(page, ocr, DEFAULT_MATCHER)
+    # The 500 x 420 corner is read at full size, so its lines are handed back
+    assert ocr.calls[0]["shape"] == (420, 500, 3)
+    assert lines.texts.tolist() == ["Form P.Q.7"]
+
+
+def test_downscaled_probe_lines_are_not_reused(page):
+    ocr = FakeOCR([line("Form P.Q.7", 10, 10)])
+    assert Prescreen(probe_side=250).probe_form(page, ocr, DEFAULT_MATCHER) is None
+    assert ocr.calls[0]["shape"] == (210, 250, 3)
+
+
+@pytest.mark.parametrize(
+    "lines, error_code", [([], prescreen.NO_TEXT), ([line("Invoice", 10, 10)], prescreen.NOT_PQ7)]
+)
+def test_probe_miss_falls_through_by_default(page, lines, error_code):
+    before = prescreen.PROBE_MISSES.value(error_code=error_code)
+    Prescreen().probe_form(page, FakeOCR(lines), DEFAULT_MATCHER)
+    assert prescreen.PROBE_MISSES.value(error_code=error_code) == before + 1
+
+
+def test_probe_miss_is_rejected_when_configured(page):
+    with pytest.raises(PrescreenRejected) as rejected:
+        Prescreen(reject_misses=True).probe_form(page, FakeOCR([line("Invoice", 10, 10)]), DEFAULT_MATCHER)
+    assert rejected.value.error_code == prescreen.NOT_PQ7
+
+
+def test_disabled_probe_does_not_ocr(page):
+    ocr = FakeOCR()
+    assert Prescreen(probe=False).probe_form(page, ocr, DEFAULT_MATCHER) is None
+    assert ocr.calls == []
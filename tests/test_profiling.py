@@ -0,0 +1,39 @@
+import pstats
+
+from dt_receipt_ocr.core.profiling import RequestProfiler
+
+
+def busy():
+    return sum(range(1000))
+
+
+def test_disabled_writes_nothing(tmp_path):
+    profiler = RequestProfiler(enabled=False, every_n=1, output_dir=str(tmp_path))
+    with profiler.profile("run"):
+        busy()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_samples_one_out_of_every_n(tmp_path):
+    profiler = RequestProfiler(enabled=True, every_n=3, output_dir=str(tmp_path))
+    for _ in range(6):
+        with profiler.profile("run"):
+            busy()
+    assert len(list(tmp_path.glob("run-*.prof"))) == 2
+
+
+def test_dump_holds_the_profiled_block(tmp_path):
+    profiler = RequestProfiler(enabled=True, every_n=1, output_dir=str(tmp_path))
+    with profiler.profile("run"):
+        busy()
+    (dump,) = tmp_path.glob("run-*.prof")
+    functions = {name for _, _, name in pstats.Stats(str(dump)).stats}
+    assert "busy" in functions
+
+
+def test_overlapping_runs_are_not_profiled(tmp_path):
+    profiler = RequestProfiler(enabled=True, every_n=1, output_dir=str(tmp_path))
+    with profiler.profile("outer"):
+        with profiler.profile("inner"):
+            busy()
+    assert [dump.name.split("-")[0] for dump in tmp_path.iterdir()] == ["outer"]
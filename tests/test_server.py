@@ -0,0 +1,31 @@
+from dt_receipt_ocr.server import RestartPolicy, cpu_overrides
+
+
+def test_workers_that_ran_a_while_restart_at_once():
+    policy = RestartPolicy(min_uptime=30)
+    assert policy.exited(uptime=3600) == 0
+    assert policy.exited(uptime=31) == 0
+
+
+def test_crash_loop_backs_off_then_gives_up():
+    policy = RestartPolicy(min_uptime=30, max_crashes=4, max_delay=5)
+    assert [policy.exited(uptime=1) for _ in range(4)] == [1, 2, 4, 5]
+    assert policy.exited(uptime=1) is None
+
+
+def test_a_healthy_run_resets_the_crash_count():
+    policy = RestartPolicy(min_uptime=30, max_crashes=2)
+    policy.exited(uptime=1)
+    policy.exited(uptime=1)
+    assert policy.exited(uptime=60) == 0
+    assert policy.exited(uptime=1) == 1
+
+
+def test_gpu_engine_is_loaded_on_cpu(monkeypatch):
+    monkeypatch.setenv("DT_RECEIPT_OCR_OVERRIDES", "ocr.use_gpu=true")
+    assert cpu_overrides() == ["ocr.use_gpu=true", "ocr.use_gpu=false"]
+
+
+def test_cpu_only_engines_are_left_alone(monkeypatch):
+    monkeypatch.setenv("DT_RECEIPT_OCR_OVERRIDES", "ocr=onnx")
+    assert cpu_overrides() == ["ocr=onnx"]
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from dt_receipt_ocr.core.singleflight import SingleFlight
+
+
+class Work:
+    """A factory that counts its executions and finishes when `release` is set."""
+
+    def __init__(self, result="done", error=None):
+        self.result = result
+        self.error = error
+        self.runs = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.in_flight() == 1
+        work.release.set()
+        assert await asyncio.gather(*callers) == ["done"] * 3
+        assert work.runs == 1
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight, first, second = SingleFlight("test"), Work("a"), Work("b")
+        callers = [asyncio.create_task(flight.do(1, first)), asyncio.create_task(flight.do(2, second))]
+        await asyncio.sleep(0)
+        first.release.set()
+        second.release.set()
+        assert await asyncio.gather(*callers) == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller_and_are_not_remembered():
+    async def scenario():
+        flight, failing = SingleFlight("test"), Work(error=ValueError("bad page"))
+        callers = [asyncio.create_task(flight.do("key", failing)) for _ in range(2)]
+        await asyncio.sleep(0)
+        failing.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+
+        retry = Work("ok")
+        retry.release.set()
+        assert await flight.do("key", retry) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        leaving = asyncio.create_task(flight.do("key", work))
+        staying = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        assert not work.cancelled
+        work.release.set()
+        assert await staying == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+
+    asyncio.run(scenario())
+
+
+def test_execution_is_cancelled_when_every_caller_left():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert work.cancelled
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.spatial_index import SpatialIndex
+
+from tests.conftest import line
+
+
+@pytest.fixture
+def table():
+    # Two columns of a form: labels on the left, values under and beside them
+    return OCRLines.from_paddle([
+        line("Quantity", 0, 0),
+        line("Declared", 200, 0),
+        line("22,500", 0, 40),
+        line("1,250", 200, 40),
+        line("22,500.0000 KGS", 0, 80),
+        line("Footer", 0, 400, width=400),
+    ])
+
+
+def test_below_is_nearest_first_in_the_same_column(table):
+    index = SpatialIndex(table)
+    assert index.below(0).tolist() == [2, 4, 5]
+    assert index.below(0, max_distance=50).tolist() == [2]
+
+
+def test_right_of_and_row_of(table):
+    index = SpatialIndex(table)
+    assert index.right_of(0).tolist() == [1]
+    assert index.right_of(0, max_distance=50).tolist() == []
+    assert index.row_of(3).tolist() == [2, 3]
+
+
+def test_within_intersecting_and_fully_inside(table):
+    index = SpatialIndex(table)
+    assert index.within((50, 0, 250, 30)).tolist() == [0, 1]
+    assert index.within((0, 0, 150, 70), fully=True).tolist() == [0, 2]
+    assert index.within((10, 10, 0, 0)).tolist() == []
+
+
+def test_find_is_case_insensitive(table):
+    assert SpatialIndex(table).find("KGS").tolist() == [4]
+
+
+def test_empty_lines():
+    index = SpatialIndex(OCRLines.empty(), min_grid_lines=0)
+    assert len(index) == 0
+    assert index.within((0, 0, 100, 100)).tolist() == []
+
+
+def test_grid_answers_like_the_scan_of_every_line():
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(0, 2000, (300, 2))
+    sizes = rng.uniform(10, 300, (300, 2))
+    lines = OCRLines.from_paddle(
+        [line(f"line {i}", x, y, width=w, height=h) for i, ((x, y), (w, h)) in enumerate(zip(corners, sizes))]
+    )
+    scan, grid = SpatialIndex(lines, min_grid_lines=1000), SpatialIndex(lines, min_grid_lines=0)
+    assert scan._grid is None and grid._grid is not None
+    for i in range(0, 300, 7):
+        assert grid.below(i).tolist() == scan.below(i).tolist()
+        assert grid.right_of(i, max_distance=400).tolist() == scan.right_of(i, max_distance=400).tolist()
+        assert grid.row_of(i).tolist() == scan.row_of(i).tolist()
+    for x, y in rng.uniform(-100, 2000, (30, 2)):
+        rect = (x, y, x + 500, y + 250)
+        assert grid.within(rect).tolist() == scan.within(rect).tolist()
+        assert grid.within(rect, fully=True).tolist() == scan.within(rect, fully=True).tolist()
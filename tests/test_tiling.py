@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+import pytest
+
+from dt_receipt_ocr.core.field_patterns import DEFAULT_MATCHER
+from dt_receipt_ocr.core.ocr_lines import OCRLines
+from dt_receipt_ocr.core.tiling import OCRPool, TiledReader, dedupe_seams, tile_grid
+
+from .conftest import FakeOCR, line
+
+
+@pytest.mark.parametrize("height, width", [(3000, 2200), (1280, 1280), (5000, 700)])
+def test_tiles_cover_the_page_with_overlap(height, width):
+    tiles = tile_grid(height, width, tile_side=1280, overlap=96)
+    covered = np.zeros((height, width), dtype=np.uint8)
+    for x0, y0, x1, y1 in tiles:
+        assert x1 - x0 <= 1280 and y1 - y0 <= 1280
+        covered[y0:y1, x0:x1] += 1
+    assert covered.min() >= 1
+    # Neighbours share at least `overlap` pixels, so no line is cut in both
+    xs = sorted({x0 for x0, *_ in tiles})
+    assert all(prev + 1280 - start >= 96 for prev, start in zip(xs, xs[1:]))
+
+
+def test_tiles_are_in_reading_order():
+    tiles = tile_grid(3000, 2200, tile_side=1280, overlap=96)
+    assert tiles == sorted(tiles, key=lambda tile: (tile[1], tile[0]))
+
+
+def test_seam_fragment_is_dropped_for_the_whole_line():
+    lines = OCRLines.from_paddle([
+        line("Receipt No. NP60046795", 1200, 100, width=300),
+        # The same line cut by the seam of the left tile
+        line("Receipt No. NP600", 1200, 100, width=80),
+        line("By Truck", 1200, 300),
+    ])
+    assert dedupe_seams(lines).texts.tolist() == ["Receipt No. NP60046795", "By Truck"]
+
+
+def test_different_lines_side_by_side_are_kept():
+    lines = OCRLines.from_paddle([line("Gross", 100, 100, width=60), line("22,500 KGS", 150, 100, width=120)])
+    assert len(dedupe_seams(lines)) == 2
+
+
+class TileOCR(FakeOCR):
+    """Reads `lines` in the first tile it is given only."""
+
+    def __init__(self, lines=()):
+        super().__init__(lines)
+        self.lock = threading.Lock()
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        with self.lock:
+            self.calls.append({"shape": img.shape})
+            first = len(self.calls) == 1
+        return [self.lines if first else None]
+
+
+def test_every_page_is_read_tile_by_tile():
+    ocr = TileOCR([line("By Truck", 10, 10)])
+    pool = OCRPool(ocr, factory=lambda: ocr, size=2)
+    reader = TiledReader(enabled=True, tile_side=1000, overlap=50, workers=2)
+    pages = [np.zeros((1500, 1000, 3), np.uint8), np.zeros((800, 1000, 3), np.uint8)]
+    assert reader.wanted(pages)
+
+    first, second = reader.read(pages, pool, DEFAULT_MATCHER)
+    assert len(ocr.calls) == 3
+    assert first.texts.tolist() == ["By Truck"] and len(second) == 0
+
+
+def test_remaining_tiles_are_skipped_once_the_fields_are_found():
+    ocr = TileOCR([line("Receipt No. NP60046795", 10, 10, width=300)])
+    reader = TiledReader(enabled=True, tile_side=500, overlap=50, workers=1, required_fields=["receipt_number"])
+    [lines] = reader.read([np.zeros((2000, 1000, 3), np.uint8)], OCRPool(ocr, factory=None), DEFAULT_MATCHER)
+    assert len(ocr.calls) == 1
+    assert lines.texts.tolist() == ["Receipt No. NP60046795"]
+
+
+def test_small_single_pages_are_not_tiled():
+    reader = TiledReader(enabled=True, min_side=2400)
+    assert not reader.wanted([np.zeros((2000, 1500, 3), np.uint8)])
+    assert not TiledReader(enabled=False).wanted([np.zeros((2000, 1500, 3), np.uint8)] * 2)
+
+
+def test_pool_grows_up_to_its_size():
+    built = []
+    pool = OCRPool("primary", factory=lambda: built.append("extra") or f"extra{len(built)}", size=2)
+    with pool.engine() as first, pool.engine() as second:
+        assert {first, second} == {"primary", "extra1"}
+    with pool.engine() as again:
+        assert again in {"primary", "extra1"}
+    assert len(built) == 1
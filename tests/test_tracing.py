@@ -0,0 +1,193 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from dt_receipt_ocr.core import tracing
+from dt_receipt_ocr.core.tracing import JsonlExporter, OtlpExporter, Tracer, TracingMiddleware, parse_traceparent
+from dt_receipt_ocr.tools import waterfall
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+class ListExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+def record(tracer, name="job", **attributes):
+    with tracer.trace(name, **attributes) as root:
+        with tracing.span("decode", bytes=10) as decode:
+            decode.set(pages=1)
+        with pytest.raises(ValueError):
+            with tracing.span("extract"):
+                tracing.annotate(tokens=5)
+                raise ValueError("no fields")
+    tracer.flush()
+    return root
+
+
+def test_spans_nest_under_the_root():
+    exporter = ListExporter()
+    root = record(Tracer(enabled=True, exporter=exporter))
+
+    [spans] = exporter.traces
+    decode, extract, last = spans
+    assert last is root
+    assert {span.trace_id for span in spans} == {root.trace_id}
+    assert decode.parent_id == extract.parent_id == root.span_id
+    assert decode.attributes == {"bytes": 10, "pages": 1}
+    assert extract.attributes == {"tokens": 5} and extract.error == "ValueError: no fields"
+    assert all(span.end_ns >= span.start_ns for span in spans)
+
+
+def test_nothing_is_recorded_outside_a_trace():
+    with tracing.span("decode") as span:
+        span.set(pages=1)
+        tracing.annotate(tokens=5)
+    assert span is tracing.NO_SPAN
+    assert tracing.current_trace_id() is None
+
+
+def test_disabled_or_unsampled_tracer_yields_none():
+    exporter = ListExporter()
+    for tracer in (Tracer(enabled=False, exporter=exporter), Tracer(enabled=True, exporter=exporter, sample_rate=0)):
+        with tracer.trace("job") as root:
+            assert root is None and tracing.current_trace_id() is None
+    assert not exporter.traces
+    # An incoming trace id is always continued
+    with Tracer(enabled=True, exporter=exporter, sample_rate=0).trace("job", TRACE_ID) as root:
+        assert tracing.current_trace_id() == TRACE_ID
+
+
+def test_export_failures_are_counted():
+    class Failing:
+        def export(self, spans):
+            raise OSError("collector down")
+
+    before = tracing.TRACES.value(result="failed")
+    record(Tracer(enabled=True, exporter=Failing()))
+    assert tracing.TRACES.value(result="failed") == before + 1
+
+
+def test_otlp_payload_marks_the_root_and_errors():
+    exporter = ListExporter()
+    record(Tracer(enabled=True, exporter=exporter))
+    [spans] = exporter.traces
+
+    [resource] = OtlpExporter().payload(spans)["resourceSpans"]
+    decode, extract, root = resource["scopeSpans"][0]["spans"]
+    assert (decode["kind"], root["kind"]) == (1, 2)
+    assert "parentSpanId" not in root and decode["parentSpanId"] == root["spanId"]
+    assert {"key": "bytes", "value": {"intValue": "10"}} in decode["attributes"]
+    assert extract["status"] == {"code": 2, "message": "ValueError: no fields"}
+
+
+def test_waterfall_merges_the_exports_of_one_trace(tmp_path):
+    exporter = JsonlExporter(str(tmp_path / "spans.jsonl"))
+    tracer = Tracer(enabled=True, exporter=exporter)
+    with tracer.trace("POST /dt/ocr_pq7") as root, tracing.span("queue_wait"):
+        traceparent = tracing.current_traceparent()
+    # What a queue worker exports for the same request
+    with tracer.trace("pq7_job", *parse_traceparent(traceparent)):
+        pass
+    tracer.flush()
+
+    [trace] = waterfall.load_traces(exporter.path)
+    assert trace["trace_id"] == root.trace_id
+    assert [(depth, span["name"]) for depth, span in waterfall._ordered(trace)] == [
+        (0, "POST /dt/ocr_pq7"),
+        (1, "queue_wait"),
+        (2, "pq7_job"),
+    ]
+
+
+def test_parse_traceparent():
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") == (None, None, None)
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-zz") == (None, None, None)
+    assert parse_traceparent("garbage") == (None, None, None)
+
+
+def test_current_traceparent_names_the_innermost_span():
+    assert tracing.current_traceparent() == ""
+    with Tracer(enabled=True, exporter=ListExporter()).trace("job") as root:
+        with tracing.span("queue_wait") as wait:
+            traceparent = tracing.current_traceparent()
+    assert parse_traceparent(traceparent) == (root.trace_id, wait.span_id, True)
+
+
+def traced_app(tracer):
+    app = FastAPI()
+    app.state.tracer = tracer
+    app.add_middleware(TracingMiddleware, prefix="/dt")
+
+    @app.post("/dt/ocr_pq7")
+    async def ocr():
+        return {"trace_id": tracing.current_trace_id()}
+
+    @app.get("/health/live")
+    async def live():
+        return {"trace_id": tracing.current_trace_id()}
+
+    return app
+
+
+def test_middleware_traces_requests_under_prefix():
+    exporter = ListExporter()
+    tracer = Tracer(enabled=True, exporter=exporter)
+    client = TestClient(traced_app(tracer))
+
+    response = client.post("/dt/ocr_pq7", content=b"abc", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert response.headers["x-trace-id"] == TRACE_ID == response.json()["trace_id"]
+    assert client.get("/health/live").json() == {"trace_id": None}
+
+    tracer.flush()
+    [[root]] = exporter.traces
+    assert root.name == "POST /dt/ocr_pq7" and root.parent_id == PARENT_ID
+    assert root.attributes == {"content_length": 3, "status": 200}
+
+
+def test_unsampled_traceparent_is_not_recorded():
+    exporter = ListExporter()
+    tracer = Tracer(enabled=True, exporter=exporter)
+    client = TestClient(traced_app(tracer))
+    response = client.post("/dt/ocr_pq7", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"})
+    assert "x-trace-id" not in response.headers and response.json() == {"trace_id": None}
+    tracer.flush()
+    assert exporter.traces == []
+
+
+@pytest.mark.parametrize("content_length", [b"abc", b"-1", b""])
+def test_middleware_ignores_malformed_content_length(content_length):
+    exporter = ListExporter()
+    tracer = Tracer(enabled=True, exporter=exporter)
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/dt/ocr_pq7",
+        "headers": [(b"content-length", content_length)],
+        "app": SimpleNamespace(state=SimpleNamespace(tracer=tracer)),
+    }
+    asyncio.run(TracingMiddleware(app, prefix="/dt")(scope, None, send))
+
+    tracer.flush()
+    [[root]] = exporter.traces
+    assert root.attributes == {"content_length": 0, "status": 204}
+    assert (b"x-trace-id", root.trace_id.encode()) in sent[0]["headers"]
@@ -0,0 +1,101 @@
+import io
+
+import cv2
+import pytest
+from dependency_injector import providers
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from dt_receipt_ocr.main import create_container
+from dt_receipt_ocr.models import PQ7ModelResponse
+from dt_receipt_ocr.routers.v1 import ocr
+
+from .conftest import FakeOCR, line
+
+OVERRIDES = ["orientation.enabled=false", "near_duplicates.enabled=false", "upload.max_bytes=1000000"]
+
+
+class FakeExtractor:
+    async def extract(self, document_text: str) -> PQ7ModelResponse:
+        return PQ7ModelResponse(
+            receipt_number="NP60046795",
+            destination_country="CHINA",
+            transportation_mode="By Truck",
+            total_weight="",
+            number_of_boxes=1250,
+            export_date="",
+        )
+
+
+@pytest.fixture
+def client(request):
+    # Extra overrides via @pytest.mark.parametrize("client", [[...]], indirect=True)
+    container = create_container(OVERRIDES + getattr(request, "param", []))
+    container.ocr.override(providers.Object(FakeOCR([
+        line("Form P.Q.7", 10, 10),
+        line("Receipt No. NP60046795", 10, 40, width=300),
+        line("Gross weight 22,500.0000 KGS", 10, 70, width=300),
+        line("Date of exportation 12/05/2025", 10, 100, width=300),
+    ])))
+    container.llm_extractor.override(providers.Object(FakeExtractor()))
+    app = FastAPI()
+    app.include_router(ocr.router, prefix="/dt")
+    yield TestClient(app)
+    container.unwire()
+
+
+def png(img) -> bytes:
+    return cv2.imencode(".png", img)[1].tobytes()
+
+
+def test_raw_upload_is_processed(client, page):
+    response = client.post("/dt/ocr_pq7/upload", content=png(page), headers={"content-type": "image/png"})
+    assert response.status_code == 200
+    assert response.json()["receipt_number"] == "NP60046795"
+
+
+def test_multipart_upload_is_processed(client, page):
+    response = client.post("/dt/ocr_pq7/upload", files={"file": ("page.png", png(page), "image/png")})
+    assert response.status_code == 200
+
+
+def test_multipart_without_a_file_part(client):
+    response = client.post("/dt/ocr_pq7/upload", files={"other": ("page.png", b"x", "image/png")})
+    assert response.status_code == 422
+
+
+def test_empty_upload(client):
+    assert client.post("/dt/ocr_pq7/upload", content=b"").status_code == 422
+
+
+def test_oversized_upload(client):
+    assert client.post("/dt/ocr_pq7/upload", content=b"x" * 1_000_001).status_code == 413
+
+
+@pytest.mark.parametrize(
+    "content",
+    [b"plain text, not a document", b"\xff\xd8\xff\xe0 truncated jpeg", b"\x89PNG\r\n\x1a\n truncated png"],
+)
+def test_undecodable_upload_is_unsupported(client, content):
+    response = client.post("/dt/ocr_pq7/upload", content=content)
+    assert response.status_code == 415
+    assert response.json()["detail"]["error_code"] == "UNSUPPORTED_DOCUMENT"
+
+
+def test_blank_page_is_rejected(client):
+    buffer = io.BytesIO()
+    Image.new("RGB", (1000, 1400), (230, 230, 230)).save(buffer, "JPEG")
+    response = client.post("/dt/ocr_pq7/upload", content=buffer.getvalue())
+    assert response.status_code == 422
+    assert response.json()["detail"]["error_code"] == "PQ7_BLANK_PAGE"
+
+
+
+@pytest.mark.parametrize("client", [["memory.max_bytes=1000000"]], indirect=True)
+def test_image_over_pillows_bomb_limit_is_too_large(client, page, monkeypatch):
+    # Sized from its header, not refused by Pillow and then decoded by OpenCV outside the budget
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    response = client.post("/dt/ocr_pq7/upload", content=png(page), headers={"content-type": "image/png"})
+    assert response.status_code == 413
+    assert response.json()["detail"]["error_code"] == "DOCUMENT_TOO_LARGE"
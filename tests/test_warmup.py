@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+from omegaconf import OmegaConf
+
+from dt_receipt_ocr.core.decode import PageDecoder
+from dt_receipt_ocr.core.warmup import synthetic_page
+from dt_receipt_ocr.routers import health
+
+MAIN_YAML = Path(__file__).parents[1] / "src" / "dt_receipt_ocr" / "conf" / "main.yaml"
+
+
+def test_synthetic_page_has_the_requested_size():
+    page = synthetic_page(1512, 2016)
+    assert page.shape == (2016, 1512, 3)
+    assert page.min() == 0 and page.max() == 255
+
+
+def test_warmup_sizes_are_decoded_page_sizes():
+    cfg = OmegaConf.load(MAIN_YAML)
+    decoder = PageDecoder(target_side=cfg.decode.target_side, pdf_size=cfg.decode.pdf_size)
+    for width, height in cfg.warmup.sizes:
+        # A page the decoder would still shrink is not one the engine ever sees
+        assert decoder.reduction(width, height) == 1
+
+
+def app_with_readiness(status):
+    app = FastAPI()
+    app.state.readiness = {"status": status}
+    router = APIRouter()
+
+    @router.get("/work")
+    async def work():
+        return {"done": True}
+
+    app.include_router(router, dependencies=[Depends(health.require_ready)])
+    app.include_router(health.router, prefix="/health")
+    return app
+
+
+def test_requests_wait_for_the_warmup():
+    client = TestClient(app_with_readiness("warming_up"))
+    response = client.get("/work")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert client.get("/health/live").status_code == 200
+
+
+def test_requests_run_once_ready():
+    client = TestClient(app_with_readiness("ready"))
+    assert client.get("/work").json() == {"done": True}
+    assert client.get("/health/ready").status_code == 200